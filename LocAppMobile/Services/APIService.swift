@@ -16,24 +16,34 @@ class APIService {
     static let serverURL = "https://your-production-url.com"
     #endif
 
+    /// Image variant generated by the server (`?size=`), resized and encoded as WebP
+    enum ImageSize: String {
+        case thumb, medium, full
+    }
+
+    private static func imageURL(_ path: String, size: ImageSize?) -> URL? {
+        guard let size = size else { return URL(string: "\(serverURL)\(path)") }
+        return URL(string: "\(serverURL)\(path)?size=\(size.rawValue)")
+    }
+
     /// Get the full URL for a property photo
-    static func photoURL(propertySlug: String, filename: String) -> URL? {
-        return URL(string: "\(serverURL)/uploads/properties/\(propertySlug)/photos/\(filename)")
+    static func photoURL(propertySlug: String, filename: String, size: ImageSize? = .medium) -> URL? {
+        return imageURL("/uploads/properties/\(propertySlug)/photos/\(filename)", size: size)
     }
 
     /// Get the full URL for an access photo
-    static func accessPhotoURL(propertySlug: String, filename: String) -> URL? {
-        return URL(string: "\(serverURL)/uploads/properties/\(propertySlug)/access/\(filename)")
+    static func accessPhotoURL(propertySlug: String, filename: String, size: ImageSize? = .medium) -> URL? {
+        return imageURL("/uploads/properties/\(propertySlug)/access/\(filename)", size: size)
     }
 
     /// Get the full URL for a contact avatar
-    static func avatarURL(filename: String) -> URL? {
-        return URL(string: "\(serverURL)/uploads/avatars/\(filename)")
+    static func avatarURL(filename: String, size: ImageSize? = .thumb) -> URL? {
+        return imageURL("/uploads/avatars/\(filename)", size: size)
     }
 
     /// Get the full URL for a header image
-    static func headerImageURL(filename: String) -> URL? {
-        return URL(string: "\(serverURL)/uploads/headers/\(filename)")
+    static func headerImageURL(filename: String, size: ImageSize? = .medium) -> URL? {
+        return imageURL("/uploads/headers/\(filename)", size: size)
     }
 
     private var authToken: String? {
@@ -4,8 +4,12 @@ Handles OpenAI API calls and Google Places API for property generation
 """
 
 import os
+import json
 import requests
-from math import radians, cos, sin, sqrt, atan2
+import geo_service
+
+# Places found by locate_place farther than this from the property are ignored (homonyms)
+AI_LOCATE_MAX_KM = float(os.environ.get('AI_LOCATE_MAX_KM', 150))
 
 
 class AIService:
@@ -172,8 +176,9 @@ Le message doit :
                 response = requests.get(url, params=params, timeout=10)
                 data = response.json()
 
-                if data.get('results'):
-                    place = data['results'][0]  # Get nearest
+                ranked = geo_service.nearest_places(latitude, longitude, data.get('results', []), k=1)
+                if ranked:
+                    place, _ = ranked[0]  # Get nearest
 
                     # Get place details for phone number
                     place_id = place.get('place_id')
@@ -223,15 +228,43 @@ Le message doit :
         # Return first 3 days as sample
         return '\n'.join(opening_hours['weekday_text'][:3])
 
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two points in kilometers using Haversine formula"""
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    def locate_place(self, query, latitude, longitude):
+        """Coordinates of a named place near the property, using Google Places text search
+
+        Args:
+            query: Place name (e.g. an activity or a nearby town)
+            latitude: Property latitude
+            longitude: Property longitude
+
+        Returns:
+            (latitude, longitude) of the closest match within AI_LOCATE_MAX_KM, or None
+        """
+        if not self.google_maps_key:
+            return None
+
+        try:
+            url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+            params = {
+                'query': query,
+                'location': f"{latitude},{longitude}",
+                'radius': 50000,
+                'key': self.google_maps_key,
+                'language': 'fr'
+            }
+
+            response = requests.get(url, params=params, timeout=10)
+            data = response.json()
+
+            ranked = geo_service.nearest_places(latitude, longitude, data.get('results', []), k=1)
+            if not ranked or ranked[0][1] > AI_LOCATE_MAX_KM:
+                print(f"[AI Service] No place found for {query!r}")
+                return None
+            location = ranked[0][0]['geometry']['location']
+            return location['lat'], location['lng']
 
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return 6371 * c  # Earth radius in km
+        except Exception as e:
+            print(f"[AI Service] Error locating {query!r}: {e}")
+            return None
 
     def find_nearest_parking(self, latitude, longitude, city, region):
         """Find nearest parking and determine if it's free
@@ -262,26 +295,18 @@ Le message doit :
             response = requests.get(url, params=params, timeout=10)
             data = response.json()
 
-            if not data.get('results'):
+            ranked = geo_service.nearest_places(latitude, longitude, data.get('results', []), k=1)
+            if not ranked:
                 print("[AI Service] No parking found nearby")
                 return None
 
-            parking = data['results'][0]
-
-            # Calculate distance
-            parking_lat = parking['geometry']['location']['lat']
-            parking_lng = parking['geometry']['location']['lng']
-            distance_km = self._calculate_distance(latitude, longitude, parking_lat, parking_lng)
+            parking, distance_km = ranked[0]
 
             # Determine if parking appears to be free (heuristic based on name)
             name_lower = parking.get('name', '').lower()
             is_free = any(word in name_lower for word in ['gratuit', 'free', 'public', 'municipal'])
 
-            # Format distance
-            if distance_km < 1:
-                distance_text = f"{int(distance_km * 1000)} m"
-            else:
-                distance_text = f"{distance_km:.1f} km"
+            distance_text = geo_service.format_distance(distance_km)
 
             # Generate AI description for parking with price estimation if paid
             parking_description = self._generate_parking_description(
@@ -364,9 +389,80 @@ Varie les formulations. Sois {chosen_tone}. Réponds uniquement avec la descript
         - Restaurant: 5 best restaurants
         - Visite: 2 nearby cities to visit
         """
-        import random
         client = self._get_openai_client()
         model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+        prompt = self._build_activities_prompt(address, city, region, latitude, longitude)
+
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=1500,
+                temperature=0.95  # Higher temperature for more variation
+            )
+
+            content = response.choices[0].message.content.strip()
+            # Remove markdown code blocks if present
+            if content.startswith('```'):
+                content = content.split('```')[1]
+                if content.startswith('json'):
+                    content = content[4:]
+            content = content.strip()
+
+            activities = json.loads(content)
+            print(f"[AI Service] Generated activities for {city}")
+            return activities
+
+        except Exception as e:
+            print(f"[AI Service] Error generating activities: {e}")
+            # Return empty structure on error
+            return {
+                "incontournables": [],
+                "sports": [],
+                "restaurants": [],
+                "visites": []
+            }
+
+    def stream_activities(self, address, city, region, latitude, longitude):
+        """Stream activities for the property location as the completion arrives
+
+        Same prompt as generate_activities, but the completion is requested with
+        stream=True and each activity is yielded as soon as its JSON object closes,
+        instead of waiting for the full completion.
+
+        Yields:
+            Tuples (category_key, activity) where category_key is one of
+            "incontournables", "sports", "restaurants", "visites"
+        """
+        client = self._get_openai_client()
+        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+        prompt = self._build_activities_prompt(address, city, region, latitude, longitude)
+
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=1500,
+            temperature=0.95,
+            stream=True
+        )
+
+        parser = ActivityStreamParser()
+        count = 0
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for category_key, activity in parser.feed(delta):
+                count += 1
+                yield category_key, activity
+
+        print(f"[AI Service] Streamed {count} activities for {city}")
+
+    def _build_activities_prompt(self, address, city, region, latitude, longitude):
+        """Build the activities prompt (shared by generate_activities and stream_activities)"""
+        import random
 
         # Add variation elements
         activity_focus = random.choice(["culture et patrimoine", "nature et plein air", "détente et bien-être", "aventure et découverte", "traditions locales"])
@@ -425,36 +521,7 @@ IMPORTANT :
 
 Utilise les emojis fournis et varie les descriptions."""
 
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1500,
-                temperature=0.95  # Higher temperature for more variation
-            )
-
-            import json
-            content = response.choices[0].message.content.strip()
-            # Remove markdown code blocks if present
-            if content.startswith('```'):
-                content = content.split('```')[1]
-                if content.startswith('json'):
-                    content = content[4:]
-            content = content.strip()
-
-            activities = json.loads(content)
-            print(f"[AI Service] Generated activities for {city}")
-            return activities
-
-        except Exception as e:
-            print(f"[AI Service] Error generating activities: {e}")
-            # Return empty structure on error
-            return {
-                "incontournables": [],
-                "sports": [],
-                "restaurants": [],
-                "visites": []
-            }
+        return prompt
 
     def find_restaurants(self, latitude, longitude, limit=5):
         """Find nearby restaurants using Google Places API"""
@@ -476,23 +543,26 @@ Utilise les emojis fournis et varie les descriptions."""
             data = response.json()
 
             results = []
-            if data.get('results'):
-                for place in data['results'][:limit]:
-                    place_id = place.get('place_id')
-                    details = self._get_place_details(place_id) if place_id else {}
-
-                    phone = details.get('formatted_phone_number', '')
-                    address = place.get('vicinity', '')
-                    description = f"{address}"
-                    if phone:
-                        description += f" - Tél: {phone}"
-
-                    results.append({
-                        'name': place.get('name'),
-                        'description': description,
-                        'emoji': '🍽️',
-                        'rating': place.get('rating', 0)
-                    })
+            # Keep the `limit` closest restaurants before fetching details
+            for place, distance_km in geo_service.nearest_places(latitude, longitude, data.get('results', []), k=limit):
+                place_id = place.get('place_id')
+                details = self._get_place_details(place_id) if place_id else {}
+
+                phone = details.get('formatted_phone_number', '')
+                address = place.get('vicinity', '')
+                description = f"{address}"
+                if phone:
+                    description += f" - Tél: {phone}"
+
+                results.append({
+                    'name': place.get('name'),
+                    'description': description,
+                    'emoji': '🍽️',
+                    'rating': place.get('rating', 0),
+                    'distance': geo_service.format_distance(distance_km),
+                    'latitude': place['geometry']['location']['lat'],
+                    'longitude': place['geometry']['location']['lng']
+                })
 
             # Sort by rating
             results.sort(key=lambda x: x.get('rating', 0), reverse=True)
@@ -635,26 +705,21 @@ IMPORTANT:
             response = requests.get(url, params=params, timeout=10)
             data = response.json()
 
-            if not data.get('results'):
+            ranked = geo_service.nearest_places(latitude, longitude, data.get('results', []), k=1)
+            if not ranked:
                 print(f"[AI Service] No {category} found nearby")
                 return None
 
-            place = data['results'][0]  # Get nearest
+            place, distance_km = ranked[0]  # Get nearest
 
             # Get place details for phone number and opening hours
             place_id = place.get('place_id')
             details = self._get_place_details(place_id) if place_id else {}
 
-            # Calculate distance
             place_lat = place['geometry']['location']['lat']
             place_lng = place['geometry']['location']['lng']
-            distance_km = self._calculate_distance(latitude, longitude, place_lat, place_lng)
 
-            # Format distance
-            if distance_km < 1:
-                distance_text = f"{int(distance_km * 1000)} m"
-            else:
-                distance_text = f"{distance_km:.1f} km"
+            distance_text = geo_service.format_distance(distance_km)
 
             result = {
                 'name': place.get('name'),
@@ -673,3 +738,60 @@ IMPORTANT:
         except Exception as e:
             print(f"[AI Service] Error finding {category}: {e}")
             return None
+
+
+class ActivityStreamParser:
+    """Incremental parser for the activities JSON produced by OpenAI
+
+    The expected document is {"category": [{...}, {...}], ...}. Text is fed chunk
+    by chunk; every object nested in a category array is decoded and returned as
+    soon as its closing brace arrives. Anything outside the top-level object
+    (markdown code fences, stray text) is ignored.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_string = None
+        self._category = None
+        self._object = None
+
+    def feed(self, text):
+        """Consume a chunk of text, yielding (category_key, activity) for each completed object"""
+        for char in text:
+            if self._object is not None:
+                self._object.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = ''.join(self._string)
+                elif self._depth == 1:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char == ':' and self._depth == 1:
+                self._category = self._last_string
+            elif char in '{[':
+                self._depth += 1
+                if char == '{' and self._depth == 3:
+                    self._object = ['{']
+            elif char in '}]':
+                if char == '}' and self._depth == 3 and self._object is not None:
+                    raw = ''.join(self._object)
+                    self._object = None
+                    try:
+                        yield self._category, json.loads(raw)
+                    except ValueError as e:
+                        print(f"[AI Service] Skipping malformed streamed activity: {e}")
+                self._depth = max(self._depth - 1, 0)
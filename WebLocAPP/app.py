@@ -1,27 +1,98 @@
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, redirect, url_for, session
+import time
+_IMPORT_STARTED = time.perf_counter()  # Reported as the "import" startup phase
+
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, session, Response, stream_with_context
 from flask_cors import CORS
-from authlib.integrations.flask_client import OAuth
-from database import Database
+from database import Database, ADMIN_LISTS
+from startup import StartupTimer, Lazy
+from scheduler import Scheduler
+from mailer import Mailer
+from guest_views import GuestViewCounter
+from sql_console import SQLConsole, QueryError, DEFAULT_PAGE_ROWS, FORMAT_CSV
+from importer import BulkImporter, parse_documents, IMPORT_MAX_SIZE, IMPORT_MAX_DOCUMENTS
+from export_stream import export_etag, export_response, property_chunks, multi_property_chunks
+from rate_limit import RateLimiter, Rule, create_backend, client_ip, json_field, bearer_token
+import image_pipeline
+from image_worker import ImageWorker, STATE_PENDING, STATE_READY
+from blob_store import BlobStore, is_blob, is_blob_filename
+from metrics import Metrics
+import query_tracker
+import profiling
+from upload_stream import StreamingRequest, ResumableUploads, uploaded_image, parse_content_range
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.exceptions import Conflict, RequestEntityTooLarge, UnsupportedMediaType
 import json
 import hashlib
+import mimetypes
 import secrets
 import os
 import re
-import time
-import smtplib
 import uuid
 from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from functools import wraps
 
 # Load environment variables from .env-weblocapp file
 load_dotenv('.env-weblocapp')
 
+startup = StartupTimer()
+
 app = Flask(__name__)
+app.request_class = StreamingRequest
 CORS(app)
+
+# Per-route latency / status / in-flight metrics, see metrics.py (added up over
+# the worker processes through METRICS_DIR, set by gunicorn.conf.py)
+metrics = Metrics(os.environ.get('METRICS_DIR') or None)
+metrics.init_app(app)
+
+# Throttling of the login and access code endpoints, see rate_limit.py. The
+# 'sqlite' backend shares the counters between the worker processes of the host;
+# behind a reverse proxy, request.remote_addr must be the client's address
+# (TRUSTED_PROXIES, applied by create_app).
+rate_limiter = RateLimiter(
+    create_backend(os.environ.get('RATE_LIMIT_BACKEND', 'sqlite'), os.environ.get('RATE_LIMIT_DB', 'ratelimit.db')),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+)
+
+def _lower(value):
+    return value.lower()
+
+def _code_prefix(value):
+    return value.upper()[:3]
+
+LOGIN_RATE_LIMITS = (
+    Rule('login_ip', 20, 60, client_ip),
+    Rule('login_ip', 100, 3600, client_ip),
+    Rule('login_email', 5, 60, json_field('email', _lower)),
+)
+MOBILE_LOGIN_RATE_LIMITS = (
+    Rule('mobile_login_ip', 20, 60, client_ip),
+    Rule('mobile_login_ip', 100, 3600, client_ip),
+    Rule('mobile_login_email', 5, 60, json_field('email', _lower)),
+)
+# 6 hex characters: without limits the 16.7M codes could be scanned. The code
+# prefix rule also bounds a scan spread over many IPs and accounts; it counts
+# wrong codes only, so guests entering their valid code never add to it.
+TOKEN_PREFIX_RATE_LIMIT = Rule('token_prefix', 30, 60, json_field('token', _code_prefix), failures_only=True)
+TOKEN_RATE_LIMITS = (
+    Rule('token_ip', 10, 60, client_ip),
+    Rule('token_ip', 60, 3600, client_ip),
+    Rule('token_user', 10, 60, bearer_token),
+    TOKEN_PREFIX_RATE_LIMIT,
+)
+SUPERADMIN_LOGIN_RATE_LIMITS = (
+    Rule('superadmin_login_ip', 5, 60, client_ip),
+    Rule('superadmin_login_ip', 20, 3600, client_ip),
+)
+
+# Number of reverse proxies in front of the app (nginx: 1) whose X-Forwarded-For /
+# X-Forwarded-Proto are trusted; 0 (default) uses the socket address, as when
+# the app is reached directly
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'locapp-secret-key-change-in-production')
 
 # Configuration pour les uploads de photos
@@ -32,8 +103,27 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# Créer le dossier d'upload s'il n'existe pas
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Uploaded files are streamed to this folder, checked (content type, size) as
+# they arrive, see upload_stream.py
+app.config['UPLOAD_TMP_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'tmp')
+app.config['MAX_IMAGE_SIZE'] = int(os.environ.get('MAX_IMAGE_SIZE', MAX_CONTENT_LENGTH))
+
+# Batch photo uploads: files per request and total request size
+MAX_BATCH_PHOTOS = int(os.environ.get('MAX_BATCH_PHOTOS', 60))
+app.config['MAX_CONTENT_LENGTH_BY_ENDPOINT'] = {
+    'upload_photos_batch': int(os.environ.get('MAX_BATCH_UPLOAD_SIZE', 256 * 1024 * 1024)),
+    'import_properties': IMPORT_MAX_SIZE,
+}
+app.config['LENIENT_UPLOAD_ENDPOINTS'] = ('upload_photos_batch',)
+
+# Photo delivery: '' (Flask streams the file), 'x-accel' (nginx X-Accel-Redirect)
+# or 'x-sendfile' (Apache/lighttpd X-Sendfile). Upload filenames are unique, so
+# responses are cached as immutable.
+UPLOADS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+PHOTO_SEND_MODE = os.environ.get('PHOTO_SEND_MODE', '').lower()
+PHOTO_ACCEL_PREFIX = os.environ.get('PHOTO_ACCEL_PREFIX', '/protected-uploads')
+PHOTO_CACHE_MAX_AGE = 365 * 24 * 3600
+app.config['USE_X_SENDFILE'] = PHOTO_SEND_MODE == 'x-sendfile'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -50,24 +140,170 @@ app.config['GOOGLE_MAPS_API_KEY'] = GOOGLE_MAPS_API_KEY
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
 
-# Initialize OAuth
-oauth = OAuth(app)
-
-# Only register Google OAuth if credentials are configured
-if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
-    google = oauth.register(
-        name='google',
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-        client_kwargs={
-            'scope': 'openid email profile'
-        }
-    )
-else:
-    google = None
+# Google OAuth client, registered by create_app() when credentials are configured
+google = None
+
+app.config['DATABASE_NAME'] = os.environ.get('DATABASE_NAME', 'locapp.db')
+
+# Heavy subsystems are built on first use (or by create_app with PRELOAD_SUBSYSTEMS),
+# see startup.py: the database runs its migrations, AIService, geo_service and
+# CalendarService import requests, numpy and icalendar
+db = Lazy('database', lambda: Database(app.config['DATABASE_NAME']), startup)
+
+def _load_ai_service():
+    from ai_service import AIService
+    return AIService()
+
+ai_service = Lazy('ai_service', _load_ai_service, startup)
+geo_service = Lazy('geo_service', lambda: __import__('geo_service'), startup)
+
+def _load_calendar_service():
+    from calendar_service import CalendarService
+    return CalendarService(db)
+
+# Shared by the requests (iCal sync and export)
+calendar_service = Lazy('calendar_service', _load_calendar_service, startup)
+
+# On-demand profiling of live requests (superadmin only), see profiling.py
+def profiling_authorized():
+    """X-Profile header accepted from a superadmin session or with the PROFILE_TOKEN"""
+    token = os.environ.get('PROFILE_TOKEN', '')
+    if token and secrets.compare_digest(request.headers.get('X-Profile-Token', ''), token):
+        return True
+    return check_superadmin()
+
+profiler = profiling.Profiler(db)
+profiler.init_app(app, authorize=profiling_authorized)
+
+# Background image processing (resized variants), see image_worker.py
+image_worker = ImageWorker(db)
+
+# Views of the guest pages, buffered per process, see guest_views.py
+guest_views = GuestViewCounter(db)
+
+# Bulk property imports from export documents, see importer.py
+bulk_importer = BulkImporter(db)
+
+# Content-addressed storage for uploaded images, see blob_store.py
+blob_store = BlobStore(db, UPLOAD_FOLDER)
+HEADERS_FOLDER = os.path.join(app.static_folder, 'uploads', 'headers')
+
+# Resumable (chunked) header image uploads, see upload_stream.py
+resumable_uploads = ResumableUploads(
+    os.path.join(app.config['UPLOAD_TMP_FOLDER'], 'resumable'),
+    max_size=app.config['MAX_IMAGE_SIZE']
+)
+
+def upload_ext(file, default='jpg'):
+    """Extension to store an upload with: the sniffed image type, else the file name's"""
+    streamed = uploaded_image(file)
+    if streamed and streamed.image_type:
+        return streamed.image_type
+    filename = secure_filename(file.filename or '')
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else default
+
+def save_upload_to_blob(file, ext):
+    """Save an uploaded file into the blob store
+
+    Returns:
+        Tuple (name, ready): ready is True when identical content was already
+        stored and its variants exist (no processing needed)
+    """
+    streamed = uploaded_image(file)
+    if streamed:
+        # Already on disk and hashed by the request parser
+        tmp_path, sha256, size = streamed.claim()
+        if image_pipeline.strip_metadata(tmp_path):
+            sha256 = size = None  # Hashed again without the metadata
+        name, created = blob_store.ingest(tmp_path, ext, sha256=sha256, size=size)
+    else:
+        tmp_folder = app.config['UPLOAD_TMP_FOLDER']
+        os.makedirs(tmp_folder, exist_ok=True)
+        tmp_path = os.path.join(tmp_folder, f"{uuid.uuid4().hex}.{ext}")
+        file.save(tmp_path)
+        image_pipeline.strip_metadata(tmp_path)
+        name, created = blob_store.ingest(tmp_path, ext)
+    return name, not created and blob_store.has_variants(name)
+
+def release_upload(name, legacy_dir):
+    """Drop a reference to an upload, after the row pointing to it was updated or deleted"""
+    if not name:
+        return
+    if is_blob(name):
+        blob_store.release(name)
+    else:
+        image_pipeline.delete_with_variants(os.path.join(legacy_dir, name))
+
+
+# Report likely N+1 query patterns (always on in debug mode)
+SQL_N_PLUS_ONE_DETECTION = os.environ.get('SQL_N_PLUS_ONE_DETECTION', '').lower() in ('1', 'true', 'yes')
 
-db = Database()
+# Send the request's query count and database time in a Server-Timing header to
+# every client (otherwise only in debug mode and to superadmin sessions)
+SQL_SERVER_TIMING = os.environ.get('SQL_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_query_tracking():
+    query_tracker.start_request()
+
+def _server_timing_allowed():
+    if app.debug or SQL_SERVER_TIMING:
+        return True
+    # Only look at the session when there is one (reading it adds Vary: Cookie)
+    return app.config['SESSION_COOKIE_NAME'] in request.cookies and check_superadmin()
+
+@app.after_request
+def add_query_timing(response):
+    """Expose the request's query count and database time as a Server-Timing header"""
+    queries = query_tracker.end_request()
+    if queries is None:
+        return response
+    if _server_timing_allowed():
+        response.headers.add('Server-Timing', f'db;dur={queries.total * 1000:.1f};desc="{queries.count} queries"')
+    if app.debug or SQL_N_PLUS_ONE_DETECTION:
+        for sql, count in queries.repeated():
+            print(f"[SQL] Possible N+1 in {request.endpoint}: {count}x {sql[:200]}")
+    return response
+
+@app.before_request
+def requeue_pending_images():
+    """Resume photos left pending by a previous process (runs once per worker process)"""
+    image_worker.requeue_pending(app.config['UPLOAD_FOLDER'])
+
+# Periodic jobs, see scheduler.py (SCHEDULER_ENABLED=0 to run none in this process)
+scheduler = Scheduler(db, enabled=os.environ.get('SCHEDULER_ENABLED', '1').lower() in ('1', 'true', 'yes'))
+RESERVATION_EXPIRY_INTERVAL = int(os.environ.get('RESERVATION_EXPIRY_INTERVAL', 300))
+
+def expire_mobile_reservations():
+    """Scheduled job: move the expired mobile reservations to history"""
+    result = db.expire_reservations()
+    if result['expired']:
+        print(f"[Scheduler] {result['expired']} reservation(s) expired in {result['duration_ms']} ms")
+    return result
+
+scheduler.add_job('expire_reservations', RESERVATION_EXPIRY_INTERVAL, expire_mobile_reservations)
+
+def purge_sessions():
+    """Scheduled job: drop expired web sessions, end expired mobile sessions"""
+    return db.purge_sessions()
+
+scheduler.add_job('purge_sessions', 3600, purge_sessions)
+
+@app.before_request
+def start_scheduler():
+    """Start the scheduler thread (runs once per worker process)"""
+    scheduler.start()
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Uploads over MAX_CONTENT_LENGTH / MAX_IMAGE_SIZE, rejected while being received"""
+    description = e.description if e.description != RequestEntityTooLarge.description else 'Fichier trop volumineux'
+    return jsonify({'error': description}), 413
+
+@app.errorhandler(UnsupportedMediaType)
+def upload_unsupported_type(e):
+    """Uploads whose first bytes are not a supported image"""
+    return jsonify({'error': e.description}), 415
 
 # Simple authentication (in production, use proper authentication)
 USERNAME = 'admin'
@@ -82,9 +318,25 @@ EMAIL_CONFIG = {
     'notification_email': os.environ.get('NOTIFICATION_EMAIL', 'abonard@gmail.com')
 }
 
-# Session storage (sessions are temporary, users are in database)
-# Structure: {token: {'email': str, 'login_time': datetime, 'last_activity': datetime, 'user_agent': str, 'ip_address': str}}
-sessions_db = {}
+# Emails are queued in the outbox and sent by a background thread, see mailer.py
+# (MAIL_ENABLED=0 only queues them; sending is on by default when SMTP credentials are set)
+mailer = Mailer(db, EMAIL_CONFIG, enabled=os.environ.get(
+    'MAIL_ENABLED', '1' if EMAIL_CONFIG['sender_password'] else '0').lower() in ('1', 'true', 'yes'))
+MAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('MAIL_OUTBOX_RETENTION_DAYS', 7))
+
+@app.before_request
+def start_mailer():
+    """Start the email sender thread (runs once per worker process)"""
+    mailer.start()
+
+def purge_email_outbox():
+    """Scheduled job: drop the sent / failed emails older than MAIL_OUTBOX_RETENTION_DAYS"""
+    return {'deleted': db.purge_email_outbox(MAIL_OUTBOX_RETENTION_DAYS)}
+
+scheduler.add_job('purge_email_outbox', 3600, purge_email_outbox)
+
+# Web sessions are stored in the web_sessions table, so that every worker
+# process sees them (the token is kept in the Flask session cookie)
 
 class User:
     def __init__(self, id, email, firstname, lastname, password_hash=None):
@@ -119,17 +371,8 @@ class User:
 def get_current_user():
     """Get current user from session (stored in database)"""
     token = session.get('auth_token')
-    if token and token in sessions_db:
-        session_data = sessions_db[token]
-        # Handle both old (string) and new (dict) session formats
-        if isinstance(session_data, dict):
-            email = session_data['email']
-            # Update last activity
-            session_data['last_activity'] = datetime.now()
-        else:
-            email = session_data
-        user_data = db.get_user_by_email(email)
-        return User.from_db(user_data)
+    if token:
+        return User.from_db(db.get_web_session_user(token))
     return None
 
 def login_required(f):
@@ -145,47 +388,26 @@ def login_required(f):
 def create_session(email, request_obj=None):
     """Create a new session with detailed tracking"""
     token = secrets.token_urlsafe(32)
-    sessions_db[token] = {
-        'email': email,
-        'login_time': datetime.now(),
-        'last_activity': datetime.now(),
-        'user_agent': request_obj.headers.get('User-Agent', 'Unknown') if request_obj else 'Unknown',
-        'ip_address': request_obj.remote_addr if request_obj else 'Unknown'
-    }
+    db.create_web_session(
+        token,
+        email,
+        user_agent=request_obj.headers.get('User-Agent', 'Unknown') if request_obj else 'Unknown',
+        ip_address=request_obj.remote_addr if request_obj else 'Unknown'
+    )
     return token
 
 def get_active_sessions():
     """Get list of all active sessions with user details"""
-    active_sessions = []
-    for token, session_data in sessions_db.items():
-        # Handle both old (string) and new (dict) session formats
-        if isinstance(session_data, dict):
-            email = session_data['email']
-            login_time = session_data.get('login_time')
-            last_activity = session_data.get('last_activity')
-            user_agent = session_data.get('user_agent', 'Unknown')
-            ip_address = session_data.get('ip_address', 'Unknown')
-        else:
-            email = session_data
-            login_time = None
-            last_activity = None
-            user_agent = 'Unknown'
-            ip_address = 'Unknown'
-
-        # Get user details from database
-        user_data = db.get_user_by_email(email)
-        if user_data:
-            active_sessions.append({
-                'email': email,
-                'firstname': user_data.get('firstname', ''),
-                'lastname': user_data.get('lastname', ''),
-                'login_time': login_time.isoformat() if login_time else None,
-                'last_activity': last_activity.isoformat() if last_activity else None,
-                'user_agent': user_agent,
-                'ip_address': ip_address,
-                'token_preview': token[:8] + '...'  # Show only first 8 chars for security
-            })
-    return active_sessions
+    return [{
+        'email': session_data['email'],
+        'firstname': session_data['firstname'] or '',
+        'lastname': session_data['lastname'] or '',
+        'login_time': session_data['login_time'],
+        'last_activity': session_data['last_activity'],
+        'user_agent': session_data['user_agent'] or 'Unknown',
+        'ip_address': session_data['ip_address'] or 'Unknown',
+        'token_preview': session_data['token'][:8] + '...'  # Show only first 8 chars for security
+    } for session_data in db.get_web_sessions()]
 
 def hash_password(password):
     """Simple password hashing"""
@@ -197,19 +419,10 @@ def send_notification_email(user):
         subject = "Nouveau compte sur LocAPP"
         body = f"Mr {user.lastname} {user.firstname} vient de créer un compte sur LocAPP."
 
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_CONFIG['sender_email']
-        msg['To'] = EMAIL_CONFIG['notification_email']
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
+        # Sent in the background by the mailer
+        mailer.enqueue(EMAIL_CONFIG['notification_email'], subject, body, kind='new_user')
 
-        # Send email via SMTP
-        with smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port']) as server:
-            server.starttls()
-            server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-            server.send_message(msg)
-
-        print(f"[EMAIL NOTIFICATION] Email envoyé à {EMAIL_CONFIG['notification_email']}")
+        print(f"[EMAIL NOTIFICATION] Email mis en file pour {EMAIL_CONFIG['notification_email']}")
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
@@ -313,8 +526,8 @@ def login():
 def logout():
     """Logout user"""
     token = session.get('auth_token')
-    if token and token in sessions_db:
-        del sessions_db[token]
+    if token:
+        db.delete_web_session(token)
     session.pop('auth_token', None)
     return redirect(url_for('commercial_home'))
 
@@ -388,6 +601,7 @@ def api_register():
     })
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limiter.limit(*LOGIN_RATE_LIMITS)
 def api_login():
     """Login user"""
     data = request.json
@@ -416,8 +630,8 @@ def api_login():
 def api_logout():
     """Logout user"""
     token = session.get('auth_token')
-    if token and token in sessions_db:
-        del sessions_db[token]
+    if token:
+        db.delete_web_session(token)
     session.pop('auth_token', None)
     return jsonify({'success': True, 'message': 'Déconnexion réussie'})
 
@@ -643,26 +857,15 @@ Cordialement,
 L'équipe LocAPP
 """
 
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_CONFIG['sender_email']
-        msg['To'] = user_data['email']
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
         # Log the email (for development)
         print(f"[PASSWORD RESET EMAIL] To: {user_data['email']}")
         print(f"[PASSWORD RESET EMAIL] Subject: {subject}")
         print(f"[PASSWORD RESET EMAIL] Reset URL: {reset_url}")
 
-        # Send email if SMTP is configured
-        if EMAIL_CONFIG['sender_password']:
-            with smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port']) as server:
-                server.starttls()
-                server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-                server.send_message(msg)
-                print(f"[PASSWORD RESET EMAIL] Email sent successfully to {user_data['email']}")
-        else:
-            print(f"[PASSWORD RESET EMAIL] SMTP not configured, email not sent")
+        # Sent in the background by the mailer
+        mailer.enqueue(user_data['email'], subject, body, kind='password_reset')
+        if not mailer.enabled:
+            print(f"[PASSWORD RESET EMAIL] Sending disabled in this process (MAIL_ENABLED), email queued")
 
         return True
     except Exception as e:
@@ -896,11 +1099,76 @@ def create_property():
         'message': message
     })
 
+# Properties created by one batch request
+MAX_BATCH_PROPERTIES = int(os.environ.get('MAX_BATCH_PROPERTIES', 100))
+
+@app.route('/api/properties/batch', methods=['POST'])
+def create_properties_batch():
+    """Create several properties from the template in one transaction (portfolio migration)
+
+    Body: {"properties": [{"name", "address", "icon", "latitude", "longitude", "display_name", "region"}, ...]}
+    All properties are created, or none.
+    """
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({'error': 'Vous devez être connecté pour créer une propriété'}), 401
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('properties')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Liste de propriétés requise'}), 400
+    if len(items) > MAX_BATCH_PROPERTIES:
+        return jsonify({'error': f'{MAX_BATCH_PROPERTIES} propriétés maximum par requête'}), 400
+
+    # Check property limit based on subscription, for the whole batch
+    subscription = db.get_user_subscription(current_user.id)
+    max_props = subscription.get('max_properties', 1) if subscription else 0
+    if max_props != -1 and db.count_user_properties(current_user.id) + len(items) > max_props:
+        return jsonify({
+            'error': f'Vous avez atteint la limite de {max_props} propriété(s) pour votre abonnement. Passez à un plan supérieur pour créer plus de propriétés.'
+        }), 403
+
+    template_id = db.get_template_property_id()
+    if not template_id:
+        return jsonify({'error': 'Propriété modèle introuvable'}), 500
+
+    properties_data = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        name = str(item.get('name') or '').strip()
+        address = str(item.get('address') or '').strip()
+        slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+        if not slug or not address:
+            return jsonify({'error': f'Propriété {index + 1} : le nom et l\'adresse sont requis'}), 400
+        properties_data.append({
+            'name': name,
+            'slug': slug,
+            'icon': item.get('icon', '🏠'),
+            'address': str(item.get('display_name') or '').strip() or address,
+            'latitude': item.get('latitude'),
+            'longitude': item.get('longitude'),
+            'region': str(item.get('region') or '').strip()
+        })
+
+    slugs = [p['slug'] for p in properties_data]
+    duplicates = sorted({slug for slug in slugs if slugs.count(slug) > 1})
+    if duplicates:
+        return jsonify({'error': f"Noms en double dans la liste : {', '.join(duplicates)}"}), 400
+
+    try:
+        property_ids = db.duplicate_properties_from_template(template_id, properties_data, user_id=current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+
+    return jsonify({
+        'success': True,
+        'properties': [{'id': property_id, 'slug': p['slug']} for property_id, p in zip(property_ids, properties_data)],
+        'message': f'{len(property_ids)} propriété(s) créée(s) à partir du modèle'
+    })
+
 @app.route('/api/properties/generate-ai', methods=['POST'])
 def generate_property_with_ai():
     """Generate property content using AI based on address"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not current_user:
         return jsonify({'error': 'Vous devez être connecté'}), 401
@@ -932,7 +1200,6 @@ def generate_property_with_ai():
         return jsonify({'error': 'L\'adresse et les coordonnées sont requises'}), 400
 
     try:
-        ai_service = AIService()
 
         # Extract city from address
         address_parts = address.split(',')
@@ -996,7 +1263,6 @@ def generate_property_with_ai():
         # Ensure slug is unique
         existing = db.get_property_by_slug(slug)
         if existing:
-            import time
             slug = f"{slug}-{int(time.time())}"
 
         # 6. Create property in database
@@ -1080,14 +1346,7 @@ def generate_property_with_ai():
 
                 # Create activities for this category
                 for idx, activity in enumerate(activities_data[key]):
-                    db.create_activity(property_id, {
-                        'name': activity.get('name', 'Sans nom'),
-                        'category': cat_name,
-                        'description': activity.get('description', ''),
-                        'emoji': activity.get('emoji', '📍'),
-                        'distance': '',
-                        'display_order': idx
-                    })
+                    db.create_activity(property_id, build_ai_activity(activity, cat_name, idx))
                     activities_created += 1
 
         print(f"[AI Generate] Created {activities_created} activities")
@@ -1150,8 +1409,6 @@ def get_property_address_info(property_id):
 @requires_auth
 def ai_regenerate_general():
     """Regenerate welcome message with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1161,7 +1418,6 @@ def ai_regenerate_general():
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
     try:
-        ai_service = AIService()
 
         # Get property info
         general_info = db.get_general_info(property_id)
@@ -1195,8 +1451,6 @@ def ai_regenerate_general():
 @requires_auth
 def ai_regenerate_address():
     """Regenerate address description with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1206,7 +1460,6 @@ def ai_regenerate_address():
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
     try:
-        ai_service = AIService()
 
         full_address, city, region, _, _ = get_property_address_info(property_id)
         if not full_address:
@@ -1227,12 +1480,35 @@ def ai_regenerate_address():
         print(f"[AI Regenerate Address] Error: {e}")
         return jsonify({'error': 'Erreur lors de la régénération'}), 500
 
+# AI category keys -> (category name, icon) used when saving generated activities
+AI_ACTIVITY_CATEGORIES = {
+    'incontournables': ('Incontournables', '⭐'),
+    'sports': ('Sport', '🏃'),
+    'restaurants': ('Restaurant', '🍽️'),
+    'visites': ('Visite', '🗺️')
+}
+
+def build_ai_activity(activity, category_name, display_order):
+    """Turn an AI-generated activity into a create_activity payload
+
+    The model has no reliable positions: coordinates it may return are ignored and
+    the distance is left empty (only geocoded or Places coordinates give distances).
+    """
+    return {
+        'name': activity.get('name', 'Sans nom'),
+        'category': category_name,
+        'description': activity.get('description', ''),
+        'emoji': activity.get('emoji', '📍'),
+        'distance': '',
+        'latitude': None,
+        'longitude': None,
+        'display_order': display_order
+    }
+
 @app.route('/api/ai/regenerate/activities', methods=['POST'])
 @requires_auth
 def ai_regenerate_activities():
     """Regenerate activities with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1242,7 +1518,6 @@ def ai_regenerate_activities():
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
     try:
-        ai_service = AIService()
 
         full_address, city, region, latitude, longitude = get_property_address_info(property_id)
         if not latitude or not longitude:
@@ -1259,25 +1534,11 @@ def ai_regenerate_activities():
 
         # Create new activities
         activities_created = 0
-        category_mapping = {
-            'incontournables': ('Incontournables', '⭐'),
-            'sports': ('Sport', '🏃'),
-            'restaurants': ('Restaurant', '🍽️'),
-            'visites': ('Visite', '🗺️')
-        }
-
-        for key, (cat_name, cat_icon) in category_mapping.items():
+        for key, (cat_name, cat_icon) in AI_ACTIVITY_CATEGORIES.items():
             if key in activities_data and activities_data[key]:
                 db.create_activity_category(property_id, {'name': cat_name, 'icon': cat_icon})
                 for idx, activity in enumerate(activities_data[key]):
-                    db.create_activity(property_id, {
-                        'name': activity.get('name', 'Sans nom'),
-                        'category': cat_name,
-                        'description': activity.get('description', ''),
-                        'emoji': activity.get('emoji', '📍'),
-                        'distance': '',
-                        'display_order': idx
-                    })
+                    db.create_activity(property_id, build_ai_activity(activity, cat_name, idx))
                     activities_created += 1
 
         return jsonify({
@@ -1290,12 +1551,87 @@ def ai_regenerate_activities():
         return jsonify({'error': 'Erreur lors de la régénération'}), 500
 
 
+def _sse_event(event, data):
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route('/api/ai/regenerate/activities/stream', methods=['POST'])
+@requires_auth
+def ai_regenerate_activities_stream():
+    """Regenerate activities with AI, streaming each activity over SSE as it is generated
+
+    Events: `category` (new category created), `activity` (activity saved),
+    `done` (final count) and `error`. Existing activities are only deleted once
+    the first generated activity arrives, so a failed call leaves them untouched.
+    """
+    current_user = get_current_user()
+    if not check_ai_access(current_user):
+        return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
+
+    property_id = get_verified_property_id()
+    if not property_id:
+        return jsonify({'error': 'Propriété non trouvée'}), 404
+
+    full_address, city, region, latitude, longitude = get_property_address_info(property_id)
+    if not latitude or not longitude:
+        return jsonify({'error': 'Coordonnées GPS non configurées'}), 400
+
+    def generate():
+        activities_created = 0
+        categories_created = set()
+        display_orders = {}
+        try:
+            for key, activity in ai_service.stream_activities(
+                full_address or '', city or '', region or '',
+                float(latitude), float(longitude)
+            ):
+                if key not in AI_ACTIVITY_CATEGORIES or not isinstance(activity, dict):
+                    continue
+                cat_name, cat_icon = AI_ACTIVITY_CATEGORIES[key]
+
+                if activities_created == 0:
+                    # First result: replace existing activities and categories
+                    db.delete_all_activities(property_id)
+
+                if key not in categories_created:
+                    db.create_activity_category(property_id, {'name': cat_name, 'icon': cat_icon})
+                    categories_created.add(key)
+                    yield _sse_event('category', {'name': cat_name, 'icon': cat_icon})
+
+                idx = display_orders.get(key, 0)
+                display_orders[key] = idx + 1
+                activity_data = build_ai_activity(activity, cat_name, idx)
+                activity_data['id'] = db.create_activity(property_id, activity_data)
+                activities_created += 1
+                yield _sse_event('activity', activity_data)
+
+            if activities_created == 0:
+                yield _sse_event('error', {'error': 'Aucune activité générée'})
+                return
+
+            yield _sse_event('done', {
+                'success': True,
+                'activities_count': activities_created,
+                'message': f'{activities_created} activités régénérées avec succès'
+            })
+        except Exception as e:
+            print(f"[AI Regenerate Activities Stream] Error: {e}")
+            yield _sse_event('error', {
+                'error': 'Erreur lors de la régénération',
+                'activities_count': activities_created
+            })
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @app.route('/api/ai/regenerate/activity/<int:activity_id>', methods=['POST'])
 @requires_auth
 def ai_regenerate_single_activity(activity_id):
     """Regenerate a single activity with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1317,7 +1653,6 @@ def ai_regenerate_single_activity(activity_id):
         if not region:
             region = 'France'
 
-        ai_service = AIService()
         new_activity = ai_service.regenerate_single_activity(
             activity['name'],
             activity['category'],
@@ -1360,8 +1695,6 @@ def ai_regenerate_single_activity(activity_id):
 @requires_auth
 def ai_regenerate_services():
     """Regenerate nearby services with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1371,7 +1704,6 @@ def ai_regenerate_services():
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
     try:
-        ai_service = AIService()
 
         _, _, _, latitude, longitude = get_property_address_info(property_id)
         if not latitude or not longitude:
@@ -1403,8 +1735,6 @@ def ai_regenerate_services():
 @requires_auth
 def ai_regenerate_parking():
     """Regenerate parking info with AI"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1414,7 +1744,6 @@ def ai_regenerate_parking():
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
     try:
-        ai_service = AIService()
 
         full_address, city, region, latitude, longitude = get_property_address_info(property_id)
         if not latitude or not longitude:
@@ -1443,8 +1772,6 @@ def ai_regenerate_parking():
 @requires_auth
 def ai_find_service():
     """Find nearest service of a specific category using AI/Google Places"""
-    from ai_service import AIService
-
     current_user = get_current_user()
     if not check_ai_access(current_user):
         return jsonify({'error': 'Fonctionnalité réservée aux abonnés'}), 403
@@ -1459,7 +1786,6 @@ def ai_find_service():
         return jsonify({'error': 'Catégorie non spécifiée'}), 400
 
     try:
-        ai_service = AIService()
 
         full_address, city, region, latitude, longitude = get_property_address_info(property_id)
         if not latitude or not longitude:
@@ -1518,38 +1844,31 @@ def upload_header_image():
     if file.filename == '':
         return jsonify({'error': 'Aucun fichier sélectionné'}), 400
 
-    # Validate file type
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
-    if ext not in allowed_extensions:
+    # Validate file type (the content itself was checked while it was received)
+    if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé. Utilisez PNG, JPG, GIF ou WebP'}), 400
 
-    # Create uploads directory if it doesn't exist
-    upload_dir = os.path.join(app.static_folder, 'uploads', 'headers')
-    os.makedirs(upload_dir, exist_ok=True)
-
-    # Generate unique filename
-    filename = f"header_{property_id}_{int(datetime.now().timestamp())}.{ext}"
-    filepath = os.path.join(upload_dir, filename)
+    # Store the image by content (identical images are stored once)
+    filename, ready = save_upload_to_blob(file, upload_ext(file))
+    return set_header_image(property_id, filename, ready)
 
-    # Delete old header image if exists
+def set_header_image(property_id, filename, ready):
+    """Point the property at a stored header image and release the previous one"""
     general_info = db.get_general_info(property_id)
-    if general_info and general_info.get('header_image'):
-        old_filepath = os.path.join(upload_dir, general_info['header_image'])
-        if os.path.exists(old_filepath):
-            os.remove(old_filepath)
-
-    # Save the new file
-    file.save(filepath)
-
-    # Update database
+    old_header = general_info.get('header_image') if general_info else None
     db.update_header_image(property_id, filename)
+    blob_store.add_refs([filename])
+    if old_header and old_header != filename:
+        release_upload(old_header, HEADERS_FOLDER)
+
+    if not ready:
+        image_worker.submit(blob_store.path(filename))
 
     return jsonify({
         'success': True,
         'message': 'Image d\'en-tête mise à jour',
         'filename': filename,
-        'url': f'/static/uploads/headers/{filename}'
+        'url': f"/uploads/headers/{filename.split('/')[-1]}"
     })
 
 @app.route('/api/general/header-image', methods=['DELETE'])
@@ -1562,18 +1881,103 @@ def delete_header_image():
 
     # Get current header image
     general_info = db.get_general_info(property_id)
-    if general_info and general_info.get('header_image'):
-        # Delete the file
-        upload_dir = os.path.join(app.static_folder, 'uploads', 'headers')
-        filepath = os.path.join(upload_dir, general_info['header_image'])
-        if os.path.exists(filepath):
-            os.remove(filepath)
 
-    # Update database
+    # Update database, then release the file
     db.delete_header_image(property_id)
+    if general_info and general_info.get('header_image'):
+        release_upload(general_info['header_image'], HEADERS_FOLDER)
 
     return jsonify({'success': True, 'message': 'Image d\'en-tête supprimée'})
 
+# Resumable header image uploads: POST creates the upload, PUT sends chunks with a
+# Content-Range header, GET returns the offset to resume from after a dropped connection
+@app.route('/api/uploads/header-image', methods=['POST'])
+@requires_auth
+def create_header_image_upload():
+    property_id = get_verified_property_id()
+    if not property_id:
+        return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
+
+    data = request.json or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not allowed_file(filename):
+        return jsonify({'error': 'Type de fichier non autorisé. Utilisez PNG, JPG, GIF ou WebP'}), 400
+    try:
+        size = int(data.get('size', 0))
+        upload = resumable_uploads.create(
+            size,
+            kind='header_image',
+            property_id=property_id,
+            user_id=get_current_user().id,
+            filename=filename
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Taille de fichier invalide'}), 400
+
+    return jsonify({
+        'upload_id': upload['id'],
+        'offset': 0,
+        'size': upload['size'],
+        'url': url_for('send_upload_chunk', upload_id=upload['id'])
+    }), 201
+
+def get_owned_upload(upload_id):
+    """Resumable upload started by the current user for the current property, or None"""
+    upload = resumable_uploads.get(upload_id)
+    current_user = get_current_user()
+    if (not upload or not current_user or upload['user_id'] != current_user.id
+            or upload['property_id'] != get_verified_property_id()):
+        return None
+    return upload
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@requires_auth
+def get_upload_status(upload_id):
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Envoi introuvable ou expiré'}), 404
+    return jsonify({'upload_id': upload_id, 'offset': upload['offset'], 'size': upload['size']})
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@requires_auth
+def send_upload_chunk(upload_id):
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Envoi introuvable ou expiré'}), 404
+
+    content_range = parse_content_range(request.headers.get('Content-Range'))
+    if not content_range or content_range[2] != upload['size']:
+        return jsonify({'error': 'En-tête Content-Range invalide'}), 400
+
+    try:
+        offset = resumable_uploads.append(upload, content_range[0], request.stream)
+    except Conflict as e:
+        return jsonify({'error': e.description, 'offset': upload['offset'], 'size': upload['size']}), 409
+    if offset is None:
+        # Chunk does not follow the bytes already received: resume from the offset
+        return jsonify({'error': 'Position incorrecte', 'offset': upload['offset'], 'size': upload['size']}), 409
+
+    if offset < upload['size']:
+        if offset != content_range[1] + 1:
+            # Body shorter (or longer) than the range it declared: the bytes received
+            # are kept, the client resumes from the offset
+            return jsonify({'error': 'Morceau incomplet', 'offset': offset, 'size': upload['size']}), 400
+        return jsonify({'upload_id': upload_id, 'offset': offset, 'size': upload['size']})
+
+    part_path, ext = resumable_uploads.complete(upload)
+    image_pipeline.strip_metadata(part_path)
+    filename, created = blob_store.ingest(part_path, ext)
+    return set_header_image(upload['property_id'], filename, not created and blob_store.has_variants(filename))
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@requires_auth
+def cancel_upload(upload_id):
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Envoi introuvable ou expiré'}), 404
+    resumable_uploads.discard(upload_id)
+    return jsonify({'success': True})
+
 # API Routes - WiFi
 @app.route('/api/wifi', methods=['GET'])
 def get_wifi():
@@ -1686,25 +2090,25 @@ def upload_contact_avatar():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé. Utilisez: png, jpg, jpeg, gif, webp'}), 400
 
-    # Generate unique filename for avatar
-    original_name = secure_filename(file.filename)
-    ext = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else 'jpg'
-    unique_filename = f"avatar_{property_id}_{uuid.uuid4().hex}.{ext}"
+    ext = upload_ext(file)
 
-    # Create avatars subfolder
-    avatars_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'avatars')
-    os.makedirs(avatars_folder, exist_ok=True)
+    # Store the avatar by content (identical images are stored once)
+    avatar, ready = save_upload_to_blob(file, ext)
 
-    # Save file
-    filepath = os.path.join(avatars_folder, unique_filename)
-    file.save(filepath)
+    # Update database with avatar name, then release the previous one
+    contact = db.get_contact_info(property_id)
+    old_avatar = contact.get('avatar') if contact else None
+    db.update_contact_avatar(property_id, avatar)
+    blob_store.add_refs([avatar])
+    if old_avatar and old_avatar != avatar:
+        release_upload(old_avatar, app.config['UPLOAD_FOLDER'])
 
-    # Update database with avatar filename
-    db.update_contact_avatar(property_id, f"avatars/{unique_filename}")
+    if not ready:
+        image_worker.submit(blob_store.path(avatar))
 
     return jsonify({
         'success': True,
-        'avatar': f"avatars/{unique_filename}",
+        'avatar': avatar,
         'message': 'Avatar mis à jour avec succès'
     })
 
@@ -1717,14 +2121,11 @@ def delete_contact_avatar():
 
     # Get current avatar
     contact = db.get_contact_info(property_id)
-    if contact and contact.get('avatar'):
-        # Delete file from disk
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], contact['avatar'])
-        if os.path.exists(filepath):
-            os.remove(filepath)
 
-    # Update database to remove avatar
+    # Update database to remove avatar, then release the file
     db.update_contact_avatar(property_id, None)
+    if contact and contact.get('avatar'):
+        release_upload(contact['avatar'], app.config['UPLOAD_FOLDER'])
 
     return jsonify({'success': True, 'message': 'Avatar supprimé'})
 
@@ -1744,20 +2145,47 @@ def get_activity(activity_id):
         return jsonify(data)
     return jsonify({'error': 'Activity not found'}), 404
 
+def activity_coordinates(data):
+    """Normalize the optional 'latitude' / 'longitude' of an activity payload in place
+
+    Empty values become None (no coordinates). Raises ValueError when they are not
+    both valid GPS coordinates.
+    """
+    if 'latitude' not in data and 'longitude' not in data:
+        return data
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if latitude in (None, '') and longitude in (None, ''):
+        data['latitude'] = data['longitude'] = None
+        return data
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError('Coordonnées GPS invalides')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Coordonnées GPS invalides')
+    data['latitude'], data['longitude'] = latitude, longitude
+    return data
+
 @app.route('/api/activities', methods=['POST'])
 @requires_auth
 def create_activity():
     property_id = get_verified_property_id()
     if not property_id:
         return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
-    data = request.json
+    try:
+        data = activity_coordinates(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     activity_id = db.create_activity(property_id, data)
     return jsonify({'success': True, 'id': activity_id, 'message': 'Activité créée'})
 
 @app.route('/api/activities/<int:activity_id>', methods=['PUT'])
 @requires_auth
 def update_activity(activity_id):
-    data = request.json
+    try:
+        data = activity_coordinates(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     db.update_activity(activity_id, data)
     return jsonify({'success': True, 'message': 'Activité mise à jour'})
 
@@ -1814,6 +2242,67 @@ def reorder_activities():
     db.reorder_activities(data.get('category'), data.get('activity_ids', []))
     return jsonify({'success': True, 'message': 'Ordre mis à jour'})
 
+# Activities located with Google Places by one POST /api/distances
+DISTANCE_LOCATE_LIMIT = int(os.environ.get('DISTANCE_LOCATE_LIMIT', 20))
+
+@app.route('/api/distances', methods=['POST'])
+@requires_auth
+def compute_property_distances():
+    """Compute distances from the property to all its services and activities
+
+    Activities with an empty distance get it filled in. Those without coordinates
+    are first located by name with Google Places (subscribers, at most
+    DISTANCE_LOCATE_LIMIT per call); the others keep an empty distance.
+    """
+    current_user = get_current_user()
+    property_id = get_verified_property_id()
+    if not property_id:
+        return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
+
+    _, city, _, latitude, longitude = get_property_address_info(property_id)
+    if not latitude or not longitude:
+        return jsonify({'error': 'Coordonnées GPS non configurées'}), 400
+
+    services = db.get_all_nearby_services(property_id)
+    activities = db.get_all_activities(property_id)
+
+    located = []
+    if check_ai_access(current_user):
+        missing = [a for a in activities
+                   if not a.get('distance') and (a.get('latitude') is None or a.get('longitude') is None)]
+        for activity in missing[:DISTANCE_LOCATE_LIMIT]:
+            query = f"{activity['name']}, {city}" if city else activity['name']
+            position = ai_service.locate_place(query, float(latitude), float(longitude))
+            if position:
+                activity['latitude'], activity['longitude'] = position
+                located.append((position[0], position[1], activity['id']))
+        db.update_activity_coordinates(located)
+
+    def ranked(items):
+        return [{
+            'id': item['id'],
+            'name': item['name'],
+            'category': item['category'],
+            'distance_km': round(distance_km, 3),
+            'distance': geo_service.format_distance(distance_km)
+        } for item, distance_km in geo_service.nearest_items(float(latitude), float(longitude), items)]
+
+    services_ranked = ranked(services)
+    activities_ranked = ranked(activities)
+
+    empty_ids = {a['id'] for a in activities if not a.get('distance')}
+    updates = [(a['distance'], a['id']) for a in activities_ranked if a['id'] in empty_ids]
+    updated = db.update_activity_distances(updates)
+
+    return jsonify({
+        'success': True,
+        'services': services_ranked,
+        'activities': activities_ranked,
+        'activities_updated': updated,
+        'activities_located': len(located),
+        'missing_coordinates': (len(services) - len(services_ranked)) + (len(activities) - len(activities_ranked))
+    })
+
 # API Routes - Nearby Services
 @app.route('/api/services', methods=['GET'])
 def get_services():
@@ -1971,55 +2460,143 @@ def download_export():
     property_id = get_verified_property_id()
     if not property_id:
         return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
-    data = db.export_all_data(property_id)
 
     # Get property info for filename
     property_info = db.get_property(property_id)
     filename = f'locapp_{property_info["slug"] if property_info else "export"}.json'
 
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    return send_file(filename, as_attachment=True, download_name=filename)
+    export = db.iter_export([property_id])
+    etag = export_etag(next(export))
+    return export_response(export, property_chunks, filename, etag)
+
+@app.route('/api/export/download/all', methods=['GET'])
+@requires_auth
+def download_export_all():
+    """Export of all the user's properties, streamed one property at a time"""
+    current_user = get_current_user()
+    property_ids = [p['id'] for p in db.get_properties_by_user(current_user.id)]
+
+    export = db.iter_export(property_ids, with_property=True)
+    etag = export_etag(next(export), scope=f'user:{current_user.id}')
+    return export_response(export, multi_property_chunks, 'locapp_proprietes.json', etag)
+
+@app.route('/api/import', methods=['POST'])
+@requires_auth
+def import_properties():
+    """Start a bulk import of export documents (JSON or NDJSON request body)
+
+    Properties are matched by slug: importing a document again updates its property.
+    Returns 202 with the job id; progress and results at GET /api/import/<job_id>.
+    """
+    current_user = get_current_user()
+    if request.content_length and request.content_length > IMPORT_MAX_SIZE:
+        return jsonify({'error': f'Import trop volumineux (max {IMPORT_MAX_SIZE // (1024 * 1024)} Mo)'}), 413
+
+    raw = request.stream.read(IMPORT_MAX_SIZE + 1)
+    if len(raw) > IMPORT_MAX_SIZE:
+        return jsonify({'error': f'Import trop volumineux (max {IMPORT_MAX_SIZE // (1024 * 1024)} Mo)'}), 413
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Le fichier doit être encodé en UTF-8'}), 400
+
+    documents = parse_documents(text) if text.strip() else []
+    if not documents:
+        return jsonify({'error': 'Aucun document à importer'}), 400
+    if len(documents) > IMPORT_MAX_DOCUMENTS:
+        return jsonify({'error': f'Trop de documents ({len(documents)}, max {IMPORT_MAX_DOCUMENTS})'}), 413
+    if all(document is None for document, _ in documents):
+        return jsonify({'error': 'Aucun document valide', 'details': [error for _, error in documents][:20]}), 400
+
+    subscription = db.get_user_subscription(current_user.id)
+    max_properties = subscription['max_properties'] if subscription else 0
+    job_id = bulk_importer.start(current_user.id, documents, max_properties)
+    return jsonify({
+        'job_id': job_id,
+        'total': len(documents),
+        'status_url': url_for('get_import_job', job_id=job_id)
+    }), 202
+
+@app.route('/api/import/<job_id>', methods=['GET'])
+@requires_auth
+def get_import_job(job_id):
+    """Progress of an import ('done' of 'total' documents) and the result of each document"""
+    current_user = get_current_user()
+    job = bulk_importer.get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'error': 'Import introuvable'}), 404
+    return jsonify(job)
 
 # ============================================
 # Routes pour servir les photos par slug (pour l'app mobile)
 # ============================================
 
+def send_image(directory, filename):
+    """Serve an uploaded image, or its resized WebP variant when `?size=thumb|medium|full` is given
+
+    In 'x-accel' mode only headers are returned and the front proxy streams the
+    file from PHOTO_ACCEL_PREFIX (an internal location mapped to static/uploads).
+    """
+    size = request.args.get('size')
+    name, mimetype = image_pipeline.resolve(directory, filename, size)
+
+    if PHOTO_SEND_MODE == 'x-accel':
+        path = safe_join(directory, name)
+        if not path or not os.path.isfile(path):
+            return jsonify({'error': 'File not found'}), 404
+        relative_path = os.path.relpath(path, UPLOADS_ROOT).replace(os.sep, '/')
+        response = Response(mimetype=mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{PHOTO_ACCEL_PREFIX.rstrip('/')}/{relative_path}"
+    else:
+        response = send_from_directory(directory, name, mimetype=mimetype)
+
+    if size in image_pipeline.VARIANTS and name == filename:
+        # Variant not generated yet: don't let clients keep the original under this URL
+        response.headers['Cache-Control'] = 'public, max-age=60'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={PHOTO_CACHE_MAX_AGE}, immutable'
+    return response
+
 @app.route('/uploads/properties/<slug>/photos/<filename>')
 def serve_property_photo(slug, filename):
     """Serve property photos by slug for mobile app"""
-    # Get property by slug to find its ID
-    property_info = db.get_property_by_slug(slug)
-    if not property_info:
+    # Map slug to property ID (cached, no JOIN per image)
+    property_id = db.get_property_id_by_slug(slug)
+    if not property_id:
         return jsonify({'error': 'Property not found'}), 404
 
-    property_id = property_info['id']
+    if is_blob_filename(filename):
+        return send_image(blob_store.directory_for(filename), filename)
     photo_path = os.path.join(app.config['UPLOAD_FOLDER'], str(property_id))
-    return send_from_directory(photo_path, filename)
+    return send_image(photo_path, filename)
 
 @app.route('/uploads/properties/<slug>/access/<filename>')
 def serve_access_photo(slug, filename):
     """Serve access photos by slug for mobile app"""
-    # Get property by slug to find its ID
-    property_info = db.get_property_by_slug(slug)
-    if not property_info:
+    # Map slug to property ID (cached, no JOIN per image)
+    property_id = db.get_property_id_by_slug(slug)
+    if not property_id:
         return jsonify({'error': 'Property not found'}), 404
 
-    property_id = property_info['id']
+    if is_blob_filename(filename):
+        return send_image(blob_store.directory_for(filename), filename)
     photo_path = os.path.join(app.config['UPLOAD_FOLDER'], 'access', str(property_id))
-    return send_from_directory(photo_path, filename)
+    return send_image(photo_path, filename)
 
 @app.route('/uploads/avatars/<filename>')
 def serve_avatar(filename):
     """Serve contact avatars for mobile app"""
+    if is_blob_filename(filename):
+        return send_image(blob_store.directory_for(filename), filename)
     avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], 'avatars')
-    return send_from_directory(avatar_path, filename)
+    return send_image(avatar_path, filename)
 
 @app.route('/uploads/headers/<filename>')
 def serve_header_image(filename):
     """Serve header images for mobile app"""
-    headers_path = os.path.join(app.static_folder, 'uploads', 'headers')
-    return send_from_directory(headers_path, filename)
+    if is_blob_filename(filename):
+        return send_image(blob_store.directory_for(filename), filename)
+    return send_image(HEADERS_FOLDER, filename)
 
 # API Routes - Photos
 @app.route('/api/photos', methods=['GET'])
@@ -2047,18 +2624,11 @@ def upload_photo():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé. Utilisez: png, jpg, jpeg, gif, webp'}), 400
 
-    # Generate unique filename
     original_name = secure_filename(file.filename)
-    ext = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else 'jpg'
-    unique_filename = f"{property_id}_{uuid.uuid4().hex}.{ext}"
+    ext = upload_ext(file)
 
-    # Create property subfolder
-    property_folder = os.path.join(app.config['UPLOAD_FOLDER'], str(property_id))
-    os.makedirs(property_folder, exist_ok=True)
-
-    # Save file
-    filepath = os.path.join(property_folder, unique_filename)
-    file.save(filepath)
+    # Store the file by content (re-uploading the same image reuses the stored blob)
+    filename, ready = save_upload_to_blob(file, ext)
 
     # Get optional metadata
     title = request.form.get('title', '')
@@ -2066,19 +2636,90 @@ def upload_photo():
 
     # Save to database
     photo_id = db.create_photo({
-        'filename': f"{property_id}/{unique_filename}",
+        'filename': filename,
         'original_name': original_name,
         'title': title,
-        'description': description
+        'description': description,
+        'processing_state': STATE_READY if ready else STATE_PENDING
     }, property_id)
+    blob_store.add_refs([filename])
+
+    # Variants are generated in the background; the original is served until they exist
+    if not ready:
+        image_worker.submit(blob_store.path(filename), 'photos', photo_id)
 
     return jsonify({
         'success': True,
         'id': photo_id,
-        'filename': f"{property_id}/{unique_filename}",
+        'filename': filename,
         'message': 'Photo uploadée avec succès'
     })
 
+@app.route('/api/photos/batch', methods=['POST'])
+@requires_auth
+def upload_photos_batch():
+    """Upload many photos in one request (form field "photos", repeated)
+
+    Rows are inserted in one transaction, after the existing photos and in the
+    order the files were sent; variants of all the files are then generated in
+    parallel by the image worker pool. Refused files (name, content or size) are
+    reported in "errors" and skipped.
+    """
+    property_id = get_verified_property_id()
+    if not property_id:
+        return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
+
+    files = [f for f in request.files.getlist('photos') if f.filename]
+    if not files:
+        return jsonify({'error': 'Aucun fichier fourni'}), 400
+    if len(files) > MAX_BATCH_PHOTOS:
+        return jsonify({'error': f'Maximum {MAX_BATCH_PHOTOS} photos par envoi'}), 400
+
+    accepted = []
+    errors = []
+    for file in files:
+        streamed = uploaded_image(file)
+        if not allowed_file(file.filename):
+            errors.append({'filename': file.filename, 'error': 'Type de fichier non autorisé'})
+        elif streamed and streamed.error is not None:
+            errors.append({'filename': file.filename, 'error': streamed.error.description})
+        else:
+            accepted.append(file)
+
+    # Files were hashed while the request was received: storing them is a rename
+    stored = [save_upload_to_blob(file, upload_ext(file)) for file in accepted]
+
+    photos = [{
+        'filename': filename,
+        'original_name': secure_filename(file.filename),
+        'processing_state': STATE_READY if ready else STATE_PENDING
+    } for file, (filename, ready) in zip(accepted, stored)]
+    photo_ids = db.create_photos(photos, property_id)
+    blob_store.add_refs([photo['filename'] for photo in photos])
+
+    for photo_id, (filename, ready) in zip(photo_ids, stored):
+        if not ready:
+            image_worker.submit(blob_store.path(filename), 'photos', photo_id)
+
+    return jsonify({
+        'success': True,
+        'photos': [{'id': photo_id, 'filename': photo['filename'], 'original_name': photo['original_name']}
+                   for photo_id, photo in zip(photo_ids, photos)],
+        'errors': errors,
+        'message': f'{len(photo_ids)} photo(s) uploadée(s)'
+    })
+
+@app.route('/api/photos/reorder', methods=['POST'])
+@requires_auth
+def reorder_photos():
+    property_id = get_verified_property_id()
+    if not property_id:
+        return jsonify({'error': 'Accès non autorisé à cette propriété'}), 403
+    data = request.json
+    photo_ids = data.get('photo_ids', [])
+    db.reorder_photos(property_id, photo_ids)
+    return jsonify({'success': True, 'message': 'Ordre mis à jour'})
+
 @app.route('/api/photos/<int:photo_id>', methods=['PUT'])
 @requires_auth
 def update_photo(photo_id):
@@ -2107,13 +2748,9 @@ def delete_photo(photo_id):
     if not property_id or photo['property_id'] != property_id:
         return jsonify({'error': 'Accès non autorisé'}), 403
 
-    # Delete file from disk
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], photo['filename'])
-    if os.path.exists(filepath):
-        os.remove(filepath)
-
-    # Delete from database
+    # Delete from database, then release the file
     db.delete_photo(photo_id)
+    release_upload(photo['filename'], app.config['UPLOAD_FOLDER'])
     return jsonify({'success': True, 'message': 'Photo supprimée'})
 
 # ============================================
@@ -2151,18 +2788,11 @@ def upload_access_photo():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé. Utilisez: png, jpg, jpeg, gif, webp'}), 400
 
-    # Generate unique filename
     original_name = secure_filename(file.filename)
-    ext = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else 'jpg'
-    unique_filename = f"access_{property_id}_{uuid.uuid4().hex}.{ext}"
+    ext = upload_ext(file)
 
-    # Create access photos subfolder
-    access_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'access', str(property_id))
-    os.makedirs(access_folder, exist_ok=True)
-
-    # Save file
-    filepath = os.path.join(access_folder, unique_filename)
-    file.save(filepath)
+    # Store the file by content (re-uploading the same image reuses the stored blob)
+    filename, ready = save_upload_to_blob(file, ext)
 
     # Get optional metadata
     title = request.form.get('title', '')
@@ -2170,16 +2800,22 @@ def upload_access_photo():
 
     # Save to database
     photo_id = db.create_access_photo({
-        'filename': f"access/{property_id}/{unique_filename}",
+        'filename': filename,
         'original_name': original_name,
         'title': title,
-        'description': description
+        'description': description,
+        'processing_state': STATE_READY if ready else STATE_PENDING
     }, property_id)
+    blob_store.add_refs([filename])
+
+    # Variants are generated in the background; the original is served until they exist
+    if not ready:
+        image_worker.submit(blob_store.path(filename), 'access_photos', photo_id)
 
     return jsonify({
         'success': True,
         'id': photo_id,
-        'filename': f"access/{property_id}/{unique_filename}",
+        'filename': filename,
         'message': 'Photo uploadée avec succès'
     })
 
@@ -2209,12 +2845,8 @@ def delete_access_photo(photo_id):
     if not property_id or photo['property_id'] != property_id:
         return jsonify({'error': 'Accès non autorisé'}), 403
 
-    # Delete file from disk
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], photo['filename'])
-    if os.path.exists(filepath):
-        os.remove(filepath)
-
     db.delete_access_photo(photo_id)
+    release_upload(photo['filename'], app.config['UPLOAD_FOLDER'])
     return jsonify({'success': True, 'message': 'Photo supprimée'})
 
 @app.route('/api/access-photos/limit', methods=['GET'])
@@ -2264,8 +2896,7 @@ def delete_account():
         account_info = db.get_account_info(current_user.id)
         if account_info and account_info.get('avatar'):
             avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], account_info['avatar'])
-            if os.path.exists(avatar_path):
-                os.remove(avatar_path)
+            image_pipeline.delete_with_variants(avatar_path)
 
         # Delete user account
         db.delete_user(current_user.id)
@@ -2291,7 +2922,7 @@ def upload_account_avatar():
 
     if file and allowed_file(file.filename):
         # Generate unique filename
-        ext = file.filename.rsplit('.', 1)[1].lower()
+        ext = upload_ext(file)
         filename = f"user_avatar_{current_user.id}_{int(time.time())}.{ext}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
@@ -2299,10 +2930,11 @@ def upload_account_avatar():
         account_info = db.get_account_info(current_user.id)
         if account_info and account_info.get('avatar'):
             old_path = os.path.join(app.config['UPLOAD_FOLDER'], account_info['avatar'])
-            if os.path.exists(old_path):
-                os.remove(old_path)
+            image_pipeline.delete_with_variants(old_path)
 
         file.save(filepath)
+        image_pipeline.strip_metadata(filepath)
+        image_worker.submit(filepath)
 
         # Update database
         db.update_user_avatar(current_user.id, filename)
@@ -2322,8 +2954,7 @@ def delete_account_avatar():
     account_info = db.get_account_info(current_user.id)
     if account_info and account_info.get('avatar'):
         avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], account_info['avatar'])
-        if os.path.exists(avatar_path):
-            os.remove(avatar_path)
+        image_pipeline.delete_with_variants(avatar_path)
 
         db.update_user_avatar(current_user.id, None)
         return jsonify({'success': True, 'message': 'Avatar supprimé'})
@@ -2342,7 +2973,6 @@ def get_subscription():
     if subscription:
         # Calculate duration
         if subscription['activated_at']:
-            from datetime import datetime
             try:
                 activated = datetime.fromisoformat(subscription['activated_at'].replace('Z', '+00:00'))
                 now = datetime.now()
@@ -2473,7 +3103,12 @@ def superadmin_redirect():
         return redirect(url_for('superadmin_dashboard'))
     return redirect(url_for('superadmin_login'))
 
+def superadmin_login_throttled(retry_after):
+    error = f'Trop de tentatives, réessayez dans {retry_after} secondes'
+    return app.make_response((render_template('superadmin_login.html', error=error), 429))
+
 @app.route('/superadmin/login', methods=['GET', 'POST'])
+@rate_limiter.limit(*SUPERADMIN_LOGIN_RATE_LIMITS, methods=('POST',), on_reject=superadmin_login_throttled)
 def superadmin_login():
     """SuperAdmin login page"""
     if check_superadmin():
@@ -2511,63 +3146,207 @@ def superadmin_logout_silent():
 @app.route('/superadmin/dashboard')
 @requires_superadmin
 def superadmin_dashboard():
-    """SuperAdmin dashboard"""
-    conn = db.get_connection()
+    """SuperAdmin dashboard
 
-    # Get active sessions
-    active_sessions = get_active_sessions()
+    Only the counters (platform_stats) are rendered; the lists and the trends
+    are loaded by the page itself from /superadmin/api/lists/<name> and
+    /superadmin/api/stats/trends.
+    """
+    return render_template('superadmin.html',
+        stats=db.get_platform_stats(),
+        route_metrics=metrics.summary(limit=15),
+        metrics_info=metrics.process_info(),
+        admin_user=session.get('superadmin_user', 'Admin')
+    )
 
-    # Get mobile sessions (with error handling)
+@app.route('/superadmin/api/stats', methods=['GET'])
+@requires_superadmin
+def superadmin_get_stats():
+    """Counters of the dashboard (see Database.get_platform_stats)"""
     try:
-        mobile_sessions_list = db.get_all_mobile_sessions(active_only=True)
+        return jsonify({'success': True, 'stats': db.get_platform_stats()})
     except Exception as e:
-        print(f"[SuperAdmin] Error getting mobile sessions: {e}")
-        mobile_sessions_list = []
+        return jsonify({'error': str(e)}), 500
 
-    # Get stats with error handling for each table
-    def safe_count(query):
-        try:
-            result = conn.execute(query).fetchone()
-            return result[0] if result else 0
-        except Exception:
-            return 0
-
-    stats = {
-        'users': safe_count('SELECT COUNT(*) FROM users'),
-        'mobile_users': safe_count('SELECT COUNT(*) FROM mobile_users'),
-        'properties': safe_count('SELECT COUNT(*) FROM properties'),
-        'activities': safe_count('SELECT COUNT(*) FROM activities'),
-        'services': safe_count('SELECT COUNT(*) FROM nearby_services'),
-        'active_sessions': len(active_sessions),
-        'mobile_sessions': len(mobile_sessions_list),
-    }
+@app.route('/superadmin/api/stats/trends', methods=['GET'])
+@requires_superadmin
+def superadmin_get_trends():
+    """Daily signups and guest views, properties per plan (?days=30)"""
+    days = max(1, min(request.args.get('days', 30, type=int), 365))
+    try:
+        return jsonify({'success': True, 'trends': db.get_platform_trends(days)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/superadmin/api/stats/rebuild', methods=['POST'])
+@requires_superadmin
+def superadmin_rebuild_stats():
+    """Recompute the counters from the tables"""
+    try:
+        return jsonify({'success': True, 'stats': db.rebuild_platform_stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-    # Get all users (web users / property owners)
-    users = [dict(row) for row in conn.execute('SELECT * FROM users ORDER BY id DESC').fetchall()]
+@app.route('/superadmin/api/lists/<name>', methods=['GET'])
+@requires_superadmin
+def superadmin_get_list(name):
+    """One page of a dashboard list (users, mobile-users, properties, web-sessions, mobile-sessions)
+
+    Query parameters: q (search), sort, order (asc/desc), cursor (next_cursor of
+    the previous page), limit.
+    """
+    if name not in ADMIN_LISTS:
+        return jsonify({'error': 'Liste inconnue'}), 404
+    try:
+        page = db.get_admin_page(
+            name,
+            search=request.args.get('q', '').strip() or None,
+            sort=request.args.get('sort'),
+            order=request.args.get('order'),
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', 50, type=int)
+        )
+    except ValueError:
+        return jsonify({'error': 'Curseur invalide'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'success': True, **page})
 
-    # Get all mobile users (travelers)
-    mobile_users = db.get_all_mobile_users_with_source()
+@app.route('/superadmin/api/metrics', methods=['GET'])
+def superadmin_metrics():
+    """Request metrics in the Prometheus text format (?format=json for the per-route summary)
 
-    # Get all properties with owner email (including inactive)
-    properties_rows = conn.execute('''
-        SELECT p.*, u.email as owner_email
-        FROM properties p
-        LEFT JOIN users u ON p.user_id = u.id
-        ORDER BY p.id
-    ''').fetchall()
-    properties = [dict(row) for row in properties_rows]
+    Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>".
+    Counters add up every worker process (per process without METRICS_DIR).
+    """
+    token = os.environ.get('METRICS_TOKEN', '')
+    bearer = request.headers.get('Authorization', '')
+    if not check_superadmin() and not (token and secrets.compare_digest(bearer, f'Bearer {token}')):
+        return jsonify({'error': 'Authentication required'}), 401
 
-    conn.close()
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'process': metrics.process_info(), 'routes': metrics.summary()})
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
-    return render_template('superadmin.html',
-        stats=stats,
-        users=users,
-        mobile_users=mobile_users,
-        properties=properties,
-        active_sessions=active_sessions,
-        mobile_sessions=mobile_sessions_list,
-        admin_user=session.get('superadmin_user', 'Admin')
-    )
+@app.route('/superadmin/api/slow-queries', methods=['GET'])
+@requires_superadmin
+def superadmin_slow_queries():
+    """Most recent slow SQL queries of this worker process, with their query plan"""
+    return jsonify({
+        'success': True,
+        'threshold_ms': query_tracker.SLOW_QUERY_MS,
+        'queries': query_tracker.slow_queries()
+    })
+
+@app.route('/superadmin/api/profiles', methods=['GET'])
+@requires_superadmin
+def superadmin_list_profiles():
+    """Stored request profiles (of every worker process), and the routes armed for profiling"""
+    return jsonify({
+        'success': True,
+        'profiles': profiler.list_profiles(),
+        'routes': profiler.armed_routes()
+    })
+
+@app.route('/superadmin/api/profiles/<int:profile_id>', methods=['GET'])
+@requires_superadmin
+def superadmin_download_profile(profile_id):
+    """Download a profile: ?format=folded (flame graph, default), text or pstats"""
+    entry = profiler.get_profile(profile_id)
+    if not entry:
+        return jsonify({'error': 'Profil non trouvé'}), 404
+
+    fmt = request.args.get('format', 'folded')
+    if fmt == 'pstats':
+        data = profiling.pstats_dump(entry)
+        if data is None:
+            return jsonify({'error': 'Format pstats disponible uniquement en mode cprofile'}), 400
+        mimetype, extension = 'application/octet-stream', 'prof'
+    elif fmt == 'text':
+        data, mimetype, extension = profiling.text_report(entry), 'text/plain', 'txt'
+    else:
+        data, mimetype, extension = profiling.folded_stacks(entry), 'text/plain', 'folded'
+
+    filename = f"profile-{profile_id}-{entry['endpoint'] or 'unmatched'}.{extension}"
+    return Response(data, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/superadmin/api/profiles', methods=['DELETE'])
+@requires_superadmin
+def superadmin_clear_profiles():
+    profiler.clear()
+    return jsonify({'success': True, 'message': 'Profils supprimés'})
+
+@app.route('/superadmin/api/profiles/routes', methods=['POST'])
+@requires_superadmin
+def superadmin_arm_route_profiling():
+    """Profile the next requests of a route: {"endpoint", "mode": "sample"|"cprofile", "count"}"""
+    data = request.json or {}
+    endpoint = data.get('endpoint', '')
+    if endpoint not in app.view_functions:
+        return jsonify({'error': 'Route inconnue'}), 400
+    try:
+        profiler.enable_route(endpoint, data.get('mode', profiling.MODE_SAMPLE), data.get('count', 10))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'routes': profiler.armed_routes()})
+
+@app.route('/superadmin/api/profiles/routes/<endpoint>', methods=['DELETE'])
+@requires_superadmin
+def superadmin_disarm_route_profiling(endpoint):
+    if not profiler.disable_route(endpoint):
+        return jsonify({'error': 'Route non profilée'}), 404
+    return jsonify({'success': True, 'routes': profiler.armed_routes()})
+
+@app.route('/superadmin/api/metrics', methods=['DELETE'])
+@requires_superadmin
+def superadmin_reset_metrics():
+    """Reset the request metrics of every worker process"""
+    metrics.reset()
+    return jsonify({'success': True, 'message': 'Métriques réinitialisées'})
+
+@app.route('/superadmin/api/jobs', methods=['GET'])
+@requires_superadmin
+def superadmin_get_jobs():
+    """Scheduled jobs as seen by this worker process (runs, last result, last error)"""
+    return jsonify({'success': True, 'jobs': scheduler.status()})
+
+@app.route('/superadmin/api/jobs/<name>/run', methods=['POST'])
+@requires_superadmin
+def superadmin_run_job(name):
+    """Run a scheduled job now"""
+    job = scheduler.run_now(name)
+    if job is None:
+        return jsonify({'error': 'Tâche inconnue'}), 404
+    if job['last_error']:
+        return jsonify({'success': False, 'job': job, 'error': job['last_error']}), 500
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/superadmin/api/outbox', methods=['GET'])
+@requires_superadmin
+def superadmin_get_outbox():
+    """Queued emails per status, and the latest ones that failed for good"""
+    return jsonify({'success': True, 'sending_enabled': mailer.enabled, **db.get_outbox_stats()})
+
+@app.route('/superadmin/api/outbox/retry', methods=['POST'])
+@requires_superadmin
+def superadmin_retry_outbox():
+    """Queue the failed emails again"""
+    return jsonify({'success': True, 'requeued': db.retry_failed_emails()})
+
+@app.route('/superadmin/api/startup')
+@requires_superadmin
+def superadmin_startup():
+    """Startup phases of this worker process, including subsystems built since on first use"""
+    return jsonify({
+        'pid': os.getpid(),
+        'started_at': startup.started_at,
+        'phases': startup.phases(),
+        'loaded': {
+            'database': db.loaded,
+            'ai_service': ai_service.loaded,
+            'geo_service': geo_service.loaded,
+        },
+    })
 
 # SuperAdmin API Routes
 @app.route('/superadmin/api/users/<int:user_id>', methods=['DELETE'])
@@ -2624,6 +3403,7 @@ def superadmin_delete_property(prop_id):
         conn.execute('DELETE FROM properties WHERE id=?', (prop_id,))
         conn.commit()
         conn.close()
+        db.invalidate_slug_cache()
         return jsonify({'success': True, 'message': 'Propriété supprimée'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2685,15 +3465,8 @@ def superadmin_get_sessions():
 def superadmin_disconnect_session(token_preview):
     """Disconnect a user session by token preview"""
     try:
-        # Find and remove the session matching the token preview
-        token_to_remove = None
-        for token in sessions_db:
-            if token.startswith(token_preview.replace('...', '')):
-                token_to_remove = token
-                break
-
-        if token_to_remove:
-            del sessions_db[token_to_remove]
+        # Remove the session matching the token preview
+        if db.delete_web_session_by_prefix(token_preview.replace('...', '')):
             return jsonify({'success': True, 'message': 'Session déconnectée'})
         else:
             return jsonify({'error': 'Session non trouvée'}), 404
@@ -2743,30 +3516,42 @@ def superadmin_delete_mobile_user(user_id):
 @app.route('/superadmin/api/sql', methods=['POST'])
 @requires_superadmin
 def superadmin_execute_sql():
-    """Execute read-only SQL query"""
-    try:
-        data = request.json
-        query = data.get('query', '').strip()
-
-        # Security: Only allow SELECT queries
-        if not query.upper().startswith('SELECT'):
-            return jsonify({'error': 'Seules les requêtes SELECT sont autorisées'}), 400
-
-        # Block dangerous keywords
-        dangerous = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'EXEC', 'EXECUTE']
-        query_upper = query.upper()
-        for keyword in dangerous:
-            if keyword in query_upper:
-                return jsonify({'error': f'Mot-clé interdit: {keyword}'}), 400
+    """Execute a read-only SQL query (see sql_console.py)
 
-        conn = db.get_connection()
-        results = [dict(row) for row in conn.execute(query).fetchall()]
-        conn.close()
-
-        return jsonify({'success': True, 'data': results, 'count': len(results)})
+    JSON body: query, limit (rows per page), cursor (next_cursor of the previous
+    page), explain (true: EXPLAIN QUERY PLAN instead of the rows).
+    """
+    data = request.get_json(silent=True) or {}
+    console = SQLConsole(db.db_name)
+    try:
+        if data.get('explain'):
+            return jsonify({'success': True, 'plan': console.explain(data.get('query'))})
+        page = console.run(data.get('query'),
+                           limit=data.get('limit') or DEFAULT_PAGE_ROWS,
+                           cursor=data.get('cursor'))
+        return jsonify({'success': True, **page})
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/superadmin/api/sql/export', methods=['GET'])
+@requires_superadmin
+def superadmin_export_sql():
+    """Stream all the rows of a read-only query: ?query=...&format=csv|ndjson"""
+    fmt = request.args.get('format', FORMAT_CSV)
+    try:
+        chunks = SQLConsole(db.db_name).export(request.args.get('query'), fmt)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype = 'text/csv' if fmt == FORMAT_CSV else 'application/x-ndjson'
+    filename = f"locapp-sql-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/superadmin/api/env-config', methods=['GET'])
 @requires_superadmin
 def superadmin_get_env_config():
@@ -2869,6 +3654,30 @@ def superadmin_test_openai():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/superadmin/api/images/variants', methods=['POST'])
+@requires_superadmin
+def superadmin_backfill_image_variants():
+    """Generate missing thumb/medium/full variants for images uploaded before the pipeline existed"""
+    try:
+        stats = image_pipeline.backfill(app.config['UPLOAD_FOLDER'])
+        headers_stats = image_pipeline.backfill(HEADERS_FOLDER)
+        for key in stats:
+            stats[key] += headers_stats[key]
+        print(f"[Image Pipeline] Backfill: {stats}")
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/superadmin/api/blobs/gc', methods=['POST'])
+@requires_superadmin
+def superadmin_blob_gc():
+    """Garbage-collect photo blobs no longer referenced by any property"""
+    try:
+        stats = blob_store.sweep()
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/superadmin/api/app-config', methods=['GET'])
 @requires_superadmin
 def superadmin_get_app_config():
@@ -2901,6 +3710,8 @@ def guest_preview(property_id):
     if not property_info.get('is_active', True):
         return "Cette propriété n'est pas disponible", 404
 
+    guest_views.add(property_id)
+
     # Gather all property data
     property_data = {
         'property': property_info,
@@ -2941,6 +3752,8 @@ def api_guest_data(property_id):
     if not property_info.get('is_active', True):
         return jsonify({'error': 'Property not available'}), 404
 
+    guest_views.add(property_id)
+
     # Gather all property data
     property_data = {
         'property': property_info,
@@ -2967,8 +3780,7 @@ def api_guest_data(property_id):
 import secrets
 from functools import wraps
 
-# Mobile sessions storage (in production, use Redis or JWT)
-mobile_sessions = {}
+# Mobile sessions are stored in the mobile_sessions table (shared by every worker process)
 
 def generate_mobile_token():
     """Generate a secure token for mobile sessions"""
@@ -2979,8 +3791,14 @@ def get_mobile_user_from_token():
     auth_header = request.headers.get('Authorization', '')
     if auth_header.startswith('Bearer '):
         token = auth_header[7:]
-        if token in mobile_sessions:
-            return mobile_sessions[token]
+        session_data = db.get_mobile_session_by_token(token)
+        if session_data:
+            return {
+                'id': session_data['mobile_user_id'],
+                'email': session_data['email'],
+                'firstname': session_data['firstname'],
+                'lastname': session_data['lastname']
+            }
     return None
 
 def mobile_auth_required(f):
@@ -3021,12 +3839,6 @@ def mobile_register():
 
     # Create session token
     token = generate_mobile_token()
-    mobile_sessions[token] = {
-        'id': user_id,
-        'email': email,
-        'firstname': firstname,
-        'lastname': lastname
-    }
 
     # Get device info from request
     device_name = data.get('device_name')
@@ -3035,7 +3847,7 @@ def mobile_register():
     app_version = data.get('app_version')
     ip_address = request.remote_addr
 
-    # Persist session in database for SuperAdmin visibility
+    # Persist session in database (also used to authenticate requests)
     db.create_mobile_session(
         mobile_user_id=user_id,
         token=token,
@@ -3058,6 +3870,7 @@ def mobile_register():
     })
 
 @app.route('/api/mobile/auth/login', methods=['POST'])
+@rate_limiter.limit(*MOBILE_LOGIN_RATE_LIMITS)
 def mobile_login():
     """Login mobile user"""
     data = request.json
@@ -3079,12 +3892,6 @@ def mobile_login():
 
     # Create session token
     token = generate_mobile_token()
-    mobile_sessions[token] = {
-        'id': user['id'],
-        'email': user['email'],
-        'firstname': user['firstname'],
-        'lastname': user['lastname']
-    }
 
     # Get device info from request
     device_name = data.get('device_name')
@@ -3093,7 +3900,7 @@ def mobile_login():
     app_version = data.get('app_version')
     ip_address = request.remote_addr
 
-    # Persist session in database for SuperAdmin visibility
+    # Persist session in database (also used to authenticate requests)
     db.create_mobile_session(
         mobile_user_id=user['id'],
         token=token,
@@ -3122,9 +3929,6 @@ def mobile_logout():
     auth_header = request.headers.get('Authorization', '')
     if auth_header.startswith('Bearer '):
         token = auth_header[7:]
-        # Supprimer de la mémoire
-        if token in mobile_sessions:
-            del mobile_sessions[token]
         # Désactiver la session en base de données
         db.deactivate_mobile_session(token)
     return jsonify({'success': True})
@@ -3156,12 +3960,6 @@ def mobile_update_profile():
 
     db.update_mobile_user(user['id'], firstname, lastname, password_hash)
 
-    # Update session
-    if firstname:
-        user['firstname'] = firstname
-    if lastname:
-        user['lastname'] = lastname
-
     return jsonify({'success': True, 'user': db.get_mobile_user_by_id(user['id'])})
 
 @app.route('/api/mobile/auth/delete', methods=['DELETE'])
@@ -3172,15 +3970,14 @@ def mobile_delete_account():
     db.delete_mobile_user(user['id'])
 
     # Remove all sessions for this user
-    tokens_to_remove = [t for t, u in mobile_sessions.items() if u['id'] == user['id']]
-    for token in tokens_to_remove:
-        del mobile_sessions[token]
+    db.deactivate_all_mobile_sessions(user['id'])
 
     return jsonify({'success': True})
 
 # ----- Token Validation -----
 
 @app.route('/api/mobile/token/validate', methods=['POST'])
+@rate_limiter.limit(*TOKEN_RATE_LIMITS)
 @mobile_auth_required
 def mobile_validate_token():
     """Validate a property access token and add to reservations"""
@@ -3194,6 +3991,7 @@ def mobile_validate_token():
     # Check if token is valid
     token_info = db.is_token_valid(token_code)
     if not token_info:
+        rate_limiter.record_failure(TOKEN_PREFIX_RATE_LIMIT)
         return jsonify({'error': 'Code invalide ou expiré'}), 400
 
     # Add to reservations
@@ -3266,6 +4064,7 @@ def mobile_get_property_data(reservation_id):
     if not property_data:
         return jsonify({'error': 'Propriété non trouvée'}), 404
 
+    guest_views.add(reservation['property_id'])
     return jsonify(property_data)
 
 # ----- History -----
@@ -3318,7 +4117,6 @@ def create_property_token(property_id):
     token_code = secrets.token_hex(3).upper()
 
     # Calculate validity dates
-    from datetime import timedelta
     valid_from = datetime.now()
     valid_until = valid_from + timedelta(days=valid_days)
 
@@ -3395,8 +4193,6 @@ def add_calendar_source(property_id):
 
         # Try to sync immediately
         try:
-            from calendar_service import CalendarService, CalendarError
-            calendar_service = CalendarService(db)
             result = calendar_service.sync_calendar_source(source_id)
             return jsonify({
                 'success': True,
@@ -3452,7 +4248,7 @@ def delete_calendar_source(property_id, source_id):
 @login_required
 def sync_calendar_source(property_id, source_id):
     """Manually sync a calendar source"""
-    from calendar_service import CalendarService, CalendarError
+    from calendar_service import CalendarError  # loaded with calendar_service (see _load_calendar_service)
     try:
         user = get_current_user()
         if not user:
@@ -3462,7 +4258,6 @@ def sync_calendar_source(property_id, source_id):
         if not property_info or property_info.get('user_id') != user.id:
             return jsonify({'error': 'Non autorisé'}), 403
 
-        calendar_service = CalendarService(db)
         result = calendar_service.sync_calendar_source(source_id)
         return jsonify(result)
     except CalendarError as e:
@@ -3485,8 +4280,6 @@ def sync_all_calendar_sources(property_id):
         if not property_info or property_info.get('user_id') != user.id:
             return jsonify({'error': 'Non autorisé'}), 403
 
-        from calendar_service import CalendarService
-        calendar_service = CalendarService(db)
         results = calendar_service.sync_all_property_sources(property_id)
         return jsonify({'success': True, 'results': results})
     except Exception as e:
@@ -3576,8 +4369,6 @@ def export_calendar_ical(property_id):
         return jsonify({'error': 'Propriété introuvable'}), 404
 
     try:
-        from calendar_service import CalendarService
-        calendar_service = CalendarService(db)
         ical_content = calendar_service.generate_ical_export(
             property_id,
             property_name=property_info.get('name'),
@@ -3605,12 +4396,71 @@ def check_calendar_availability(property_id):
         return jsonify({'error': 'Les dates sont requises'}), 400
 
     try:
-        from calendar_service import CalendarService
-        calendar_service = CalendarService(db)
         result = calendar_service.check_availability(property_id, check_in, check_out)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ==================== Application entry point ====================
+
+_app_created = False
+
+def create_app(config=None):
+    """Configure and return the application
+
+    Args:
+        config: Settings applied over the defaults, an object (config_prod.config)
+            or a mapping. PRELOAD_SUBSYSTEMS builds the database (migrations),
+            AIService and geo_service now instead of on first use, e.g. in the
+            Gunicorn master before the workers are forked.
+    """
+    global google, _app_created
+    if _app_created:
+        if config is not None:
+            print("[Startup] create_app() already ran, config ignored")
+        return app
+
+    startup.record('import', time.perf_counter() - _IMPORT_STARTED)
+
+    with startup.phase('config'):
+        if isinstance(config, dict):
+            app.config.update(config)
+        elif config is not None:
+            app.config.from_object(config)
+
+    with startup.phase('directories'):
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    # Client address and scheme from the proxy headers (rate limits, sessions, url_for)
+    trusted_proxies = int(app.config.get('TRUSTED_PROXIES', TRUSTED_PROXIES))
+    if trusted_proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+    # Authlib (and its crypto dependencies) is only imported when Google login is configured
+    if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
+        with startup.phase('oauth'):
+            from authlib.integrations.flask_client import OAuth
+            oauth = OAuth(app)
+            google = oauth.register(
+                name='google',
+                client_id=GOOGLE_CLIENT_ID,
+                client_secret=GOOGLE_CLIENT_SECRET,
+                server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+                client_kwargs={
+                    'scope': 'openid email profile'
+                }
+            )
+
+    if app.config.get('PRELOAD_SUBSYSTEMS'):
+        db.get()
+        ai_service.get()
+        geo_service.get()
+        calendar_service.get()
+
+    _app_created = True
+    startup.report()
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # Development server only, see wsgi.py / gunicorn.conf.py for production
+    create_app().run(debug=True, host='0.0.0.0', port=5001)
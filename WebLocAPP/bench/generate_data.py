@@ -0,0 +1,174 @@
+"""
+Synthetic data generator for the LocApp benchmarks
+Builds a locapp.db with many owners, properties (filled like the Mazet demo),
+mobile travelers with reservations, and calendar events
+
+Usage:
+    python bench/generate_data.py --users 2000 --properties 20000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, token_timestamp
+
+BENCH_PASSWORD = 'bench-password'
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'locapp.db')
+
+FIRSTNAMES = ['Camille', 'Louis', 'Emma', 'Jules', 'Léa', 'Hugo', 'Chloé', 'Lucas', 'Manon', 'Arthur']
+LASTNAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau']
+LOCATIONS = ['Bourg-Saint-Andéol', 'Vaujany', 'Annecy', 'Arles', 'Biarritz', 'Colmar', 'Gordes', 'Chamonix']
+ICONS = ['🏠', '🏡', '🏔️', '🌿', '🌊', '🏖️']
+PLATFORMS = ['Airbnb', 'Booking', 'Abritel', 'Manuel']
+
+
+def password_hash(password=BENCH_PASSWORD):
+    """Same hashing as app.hash_password (web) and mobile_login"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def generate(path, users, properties, mobile_users, events_per_property, seed=42):
+    """Create the database at `path` (replaced if it exists)
+
+    Returns:
+        Dict describing the generated volumes
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    started = time.time()
+    db = Database(path)  # Schema, migrations and the demo properties
+    conn = db.get_connection()
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    cursor = conn.cursor()
+    hashed = password_hash()
+
+    # Owners (web users)
+    cursor.executemany('''
+        INSERT INTO users (email, firstname, lastname, password_hash, source_platform)
+        VALUES (?, ?, ?, ?, 'web')
+    ''', [(f"owner{i}@bench.locapp", rng.choice(FIRSTNAMES), rng.choice(LASTNAMES), hashed)
+          for i in range(users)])
+    owner_ids = [row[0] for row in cursor.execute(
+        "SELECT id FROM users WHERE email LIKE '%@bench.locapp' ORDER BY id")]
+
+    # Properties, each filled with the Mazet demo fixtures; owners get a skewed
+    # number of properties (a few agencies, many single-property owners)
+    first_order = cursor.execute('SELECT COALESCE(MAX(display_order), 0) + 1 FROM properties').fetchone()[0]
+    property_ids = []
+    for i in range(properties):
+        owner_id = owner_ids[min(int(rng.paretovariate(1.2)) - 1, len(owner_ids) - 1)] \
+            if rng.random() < 0.3 else rng.choice(owner_ids)
+        location = rng.choice(LOCATIONS)
+        cursor.execute('''
+            INSERT INTO properties (name, slug, icon, location, theme, is_active, display_order, user_id)
+            VALUES (?, ?, ?, ?, 'mazet-bsa', 1, ?, ?)
+        ''', (f"Bench {location} {i}", f"bench-{i}", rng.choice(ICONS), location, first_order + i, owner_id))
+        property_id = cursor.lastrowid
+        db._insert_mazet_data(cursor, property_id)
+        property_ids.append(property_id)
+        if (i + 1) % 5000 == 0:
+            conn.commit()
+            print(f"[Bench] {i + 1}/{properties} properties")
+
+    # Calendar events: consecutive stays over the coming year
+    today = date.today()
+    events = []
+    for property_id in property_ids:
+        day = today - timedelta(days=rng.randint(0, 30))
+        for n in range(events_per_property):
+            day += timedelta(days=rng.randint(1, 20))
+            nights = rng.randint(2, 10)
+            events.append((
+                property_id, f"bench-{property_id}-{n}", 'Réservé', day.isoformat(),
+                (day + timedelta(days=nights)).isoformat(), rng.choice(FIRSTNAMES), rng.choice(PLATFORMS)
+            ))
+            day += timedelta(days=nights)
+    cursor.executemany('''
+        INSERT INTO calendar_events (property_id, uid, summary, start_date, end_date, guest_name, platform)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', events)
+
+    # Access tokens, one per property, valid around now
+    now = datetime.now()
+    token_rows = []
+    for property_id in property_ids:
+        valid_from = now - timedelta(days=7)
+        valid_until = now + timedelta(days=rng.randint(30, 365))
+        token_rows.append((property_id, f"BENCH{property_id:08d}", valid_from.isoformat(), valid_until.isoformat(),
+                           token_timestamp(valid_from), token_timestamp(valid_until)))
+    cursor.executemany('''
+        INSERT INTO property_tokens (property_id, token, valid_from, valid_until, valid_from_ts, valid_until_ts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', token_rows)
+    tokens = {row[1]: (row[0], row[2]) for row in cursor.execute(
+        "SELECT id, property_id, valid_until FROM property_tokens WHERE token LIKE 'BENCH%'")}
+
+    # Mobile travelers with one to three reservations each
+    cursor.executemany('''
+        INSERT INTO mobile_users (email, firstname, lastname, password_hash)
+        VALUES (?, ?, ?, ?)
+    ''', [(f"traveler{i}@bench.locapp", rng.choice(FIRSTNAMES), rng.choice(LASTNAMES), hashed)
+          for i in range(mobile_users)])
+    traveler_ids = [row[0] for row in cursor.execute(
+        "SELECT id FROM mobile_users WHERE email LIKE '%@bench.locapp' ORDER BY id")]
+    reservations = []
+    for traveler_id in traveler_ids:
+        for property_id in rng.sample(property_ids, min(len(property_ids), rng.randint(1, 3))):
+            token_id, valid_until = tokens[property_id]
+            reservations.append((traveler_id, property_id, token_id, valid_until))
+    cursor.executemany('''
+        INSERT INTO mobile_reservations (mobile_user_id, property_id, token_id, expires_at)
+        VALUES (?, ?, ?, ?)
+    ''', reservations)
+
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+    summary = {
+        'path': os.path.abspath(path),
+        'seed': seed,
+        'users': len(owner_ids),
+        'properties': len(property_ids),
+        'mobile_users': len(traveler_ids),
+        'reservations': len(reservations),
+        'calendar_events': len(events),
+        'password': BENCH_PASSWORD,
+        'size_mb': round(os.path.getsize(path) / (1024 * 1024), 1),
+        'seconds': round(time.time() - started, 1),
+    }
+    with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic locapp.db for benchmarks')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Database file to create')
+    parser.add_argument('--users', type=int, default=2000, help='Property owners')
+    parser.add_argument('--properties', type=int, default=20000)
+    parser.add_argument('--mobile-users', type=int, default=2000, help='Travelers (mobile app)')
+    parser.add_argument('--events-per-property', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    summary = generate(args.output, args.users, args.properties, args.mobile_users,
+                       args.events_per_property, args.seed)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
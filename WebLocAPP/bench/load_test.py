@@ -0,0 +1,382 @@
+"""
+Load test for LocApp
+Drives the app with concurrent virtual users (guests, travelers on the mobile
+API, owners using the admin CRUD and the calendar) and reports latency
+percentiles and throughput per endpoint, saved as JSON for comparison
+
+Usage:
+    python bench/generate_data.py
+    python bench/load_test.py --concurrency 16 --duration 30
+    python bench/load_test.py --compare bench/results/<baseline>.json
+
+Without --url, the app is started in-process (threaded Werkzeug server) on a
+copy of the generated database. With --url, the target server must run on the
+generated database (its locapp.db).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import date, timedelta
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import BENCH_PASSWORD, DEFAULT_OUTPUT
+
+DEFAULT_MIX = 'guest=50,mobile=25,admin=15,calendar=10'
+
+
+# ==================== Recording ====================
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latencies and errors per endpoint name, shared by the worker threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.recording = False
+
+    def record(self, name, duration, ok):
+        if not self.recording:
+            return
+        with self._lock:
+            self.samples.setdefault(name, []).append(duration)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed):
+        def stats(durations, errors):
+            values = sorted(durations)
+            return {
+                'count': len(values),
+                'errors': errors,
+                'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+                'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+            }
+
+        with self._lock:
+            endpoints = {name: stats(durations, self.errors.get(name, 0))
+                         for name, durations in sorted(self.samples.items())}
+            everything = [d for durations in self.samples.values() for d in durations]
+            total = stats(everything, sum(self.errors.values()))
+        return total, endpoints
+
+
+class Client:
+    """HTTP session of one virtual user, timing each call"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.http = requests.Session()
+
+    def call(self, name, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+            ok = response.status_code in expect
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return response if ok else None
+
+
+# ==================== Scenarios ====================
+
+def load_dataset(db_path):
+    """Identities and ids to draw virtual users from"""
+    conn = sqlite3.connect(db_path)
+    owners = {}
+    for email, property_id in conn.execute('''
+        SELECT u.email, p.id FROM users u JOIN properties p ON p.user_id = u.id
+        WHERE u.email LIKE '%@bench.locapp'
+    '''):
+        owners.setdefault(email, []).append(property_id)
+    properties = conn.execute(
+        "SELECT id, slug FROM properties WHERE slug LIKE 'bench-%' AND is_active = 1"
+    ).fetchall()
+    travelers = [row[0] for row in conn.execute('''
+        SELECT DISTINCT mu.email FROM mobile_users mu
+        JOIN mobile_reservations r ON r.mobile_user_id = mu.id
+        WHERE mu.email LIKE '%@bench.locapp'
+    ''')]
+    conn.close()
+    if not owners or not properties or not travelers:
+        raise SystemExit(f"No benchmark data in {db_path}, run bench/generate_data.py first")
+    return {'owners': list(owners.items()), 'properties': properties, 'travelers': travelers}
+
+
+class VirtualUser:
+    """One worker thread: a guest, a traveler and an owner identity"""
+
+    def __init__(self, base_url, recorder, dataset, rng):
+        self.client = Client(base_url, recorder)
+        self.dataset = dataset
+        self.rng = rng
+        self.owner_email, self.owner_properties = rng.choice(dataset['owners'])
+        self.traveler_email = rng.choice(dataset['travelers'])
+        self.mobile_headers = {}
+
+    def login(self):
+        self.client.call('auth.login', 'POST', '/api/auth/login',
+                         json={'email': self.owner_email, 'password': BENCH_PASSWORD})
+        response = self.client.call('auth.mobile_login', 'POST', '/api/mobile/auth/login',
+                                    json={'email': self.traveler_email, 'password': BENCH_PASSWORD})
+        if response is not None:
+            self.mobile_headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+    def guest(self):
+        property_id, slug = self.rng.choice(self.dataset['properties'])
+        self.client.call('guest.page', 'GET', f'/g/{property_id}')
+        self.client.call('guest.data', 'GET', f'/api/guest/{property_id}')
+        self.client.call('guest.property_by_slug', 'GET', f'/api/properties/{slug}')
+
+    def mobile(self):
+        response = self.client.call('mobile.reservations', 'GET', '/api/mobile/reservations',
+                                    headers=self.mobile_headers)
+        reservations = response.json().get('reservations', []) if response is not None else []
+        if reservations:
+            reservation = self.rng.choice(reservations)
+            self.client.call('mobile.property', 'GET', f"/api/mobile/reservations/{reservation['id']}/property",
+                             headers=self.mobile_headers)
+        self.client.call('mobile.me', 'GET', '/api/mobile/auth/me', headers=self.mobile_headers)
+
+    def admin(self):
+        params = {'property_id': self.rng.choice(self.owner_properties)}
+        self.client.call('admin.general', 'GET', '/api/general', params=params)
+        self.client.call('admin.activities', 'GET', '/api/activities', params=params)
+        response = self.client.call('admin.activity_create', 'POST', '/api/activities', params=params, json={
+            'name': 'Bench activité', 'category': 'Restaurants', 'description': 'Créée par le benchmark',
+            'emoji': '🍽️', 'distance': '1 km'
+        })
+        if response is not None:
+            activity_id = response.json()['id']
+            self.client.call('admin.activity_update', 'PUT', f'/api/activities/{activity_id}', params=params, json={
+                'name': 'Bench activité modifiée', 'category': 'Restaurants', 'description': '',
+                'emoji': '🍽️', 'distance': '2 km'
+            })
+            self.client.call('admin.activity_delete', 'DELETE', f'/api/activities/{activity_id}', params=params)
+
+    def calendar(self):
+        property_id = self.rng.choice(self.owner_properties)
+        start = date.today() + timedelta(days=self.rng.randint(0, 300))
+        self.client.call('calendar.events', 'GET', f'/api/properties/{property_id}/calendar/events', params={
+            'start': start.isoformat(), 'end': (start + timedelta(days=60)).isoformat()
+        })
+        response = self.client.call('calendar.event_create', 'POST', f'/api/properties/{property_id}/calendar/events',
+                                    json={'start_date': start.isoformat(),
+                                          'end_date': (start + timedelta(days=3)).isoformat(),
+                                          'summary': 'Bench'})
+        if response is not None:
+            event_id = response.json()['event_id']
+            self.client.call('calendar.event_delete', 'DELETE',
+                             f'/api/properties/{property_id}/calendar/events/{event_id}')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('guest', 'mobile', 'admin', 'calendar'):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run_load(base_url, dataset, mix, concurrency, duration, warmup, seed):
+    recorder = Recorder()
+    scenarios, weights = zip(*mix.items())
+    stop_at = time.time() + warmup + duration
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = VirtualUser(base_url, recorder, dataset, rng)
+        user.login()
+        barrier.wait()
+        while time.time() < stop_at:
+            getattr(user, rng.choices(scenarios, weights)[0])()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.time()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.time() - started)
+
+
+# ==================== Server ====================
+
+def start_local_server(db_path):
+    """Serve the app on a copy of the benchmark database, in this process
+
+    Returns:
+        (base_url, shutdown function)
+    """
+    workdir = tempfile.mkdtemp(prefix='locapp-bench-')
+    shutil.copyfile(db_path, os.path.join(workdir, 'locapp.db'))
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    # Every virtual user logs in from 127.0.0.1
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    import app as locapp
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    application = locapp.create_app({'PRELOAD_SUBSYSTEMS': True})
+    server = make_server('127.0.0.1', 0, application, threaded=True, request_handler=KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        locapp.image_worker.shutdown(wait=False)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return f"http://127.0.0.1:{server.server_port}", shutdown
+
+
+# ==================== Results ====================
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline, threshold):
+    """Print p95 / throughput changes per endpoint
+
+    Returns:
+        List of endpoint names that regressed by more than `threshold` percent
+    """
+    regressions = []
+    print(f"\nComparison with {baseline['meta']['commit']} ({baseline['meta']['date']})")
+    print(f"{'endpoint':32} {'p95 ms':>10} {'change':>8} {'req/s':>10} {'change':>8}")
+    for name, stats in current['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if not base:
+            continue
+        p95_change = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+        rps_change = ((stats['throughput_rps'] - base['throughput_rps']) / base['throughput_rps'] * 100
+                      if base['throughput_rps'] else 0.0)
+        flag = ''
+        if p95_change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:32} {stats['p95_ms']:>10.2f} {p95_change:>+7.1f}% "
+              f"{stats['throughput_rps']:>10.2f} {rps_change:>+7.1f}%{flag}")
+    return regressions
+
+
+def print_report(total, endpoints):
+    print(f"\n{'endpoint':32} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name, stats in endpoints.items():
+        print(f"{name:32} {stats['count']:>7} {stats['errors']:>5} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['throughput_rps']:>9.2f}")
+    print(f"{'TOTAL':32} {total['count']:>7} {total['errors']:>5} {total['p50_ms']:>9.2f} "
+          f"{total['p95_ms']:>9.2f} {total['p99_ms']:>9.2f} {total['throughput_rps']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the LocApp server')
+    parser.add_argument('--db', default=DEFAULT_OUTPUT, help='Database generated by generate_data.py')
+    parser.add_argument('--url', help='Target server (default: start the app in-process)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds run before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Scenario weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Result file (default: bench/results/<date>-<commit>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=15, help='p95 regression threshold in percent')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    dataset = load_dataset(db_path)
+    shutdown = None
+    base_url = args.url
+    if not base_url:
+        base_url, shutdown = start_local_server(db_path)
+
+    print(f"[Bench] {args.concurrency} virtual users for {args.duration:.0f}s against {base_url}")
+    try:
+        total, endpoints = run_load(base_url, dataset, args.mix, args.concurrency,
+                                    args.duration, args.warmup, args.seed)
+    finally:
+        if shutdown:
+            shutdown()
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': args.url or 'in-process',
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'mix': args.mix,
+            'dataset': {k: len(v) for k, v in dataset.items()},
+        },
+        'total': total,
+        'endpoints': endpoints,
+    }
+    print_report(total, endpoints)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\n[Bench] Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
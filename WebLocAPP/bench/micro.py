@@ -0,0 +1,452 @@
+"""
+Micro-benchmarks for LocApp
+Times the hot Database methods and the CalendarService iCal parsing / export
+on the synthetic dataset, in warm (repeated calls in one process) or cold
+(one call per fresh process) mode, and compares the samples with a stored
+baseline using a Mann-Whitney U test
+
+Usage:
+    python bench/generate_data.py
+    python bench/micro.py
+    python bench/micro.py --mode cold --only is_token_valid,get_properties_by_user
+    python bench/micro.py --compare bench/results/micro-<baseline>.json
+
+Every run works on a temporary copy of the generated database, so the
+benchmarks that write (expire_reservations, duplicate_property_from_template)
+leave it untouched.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from generate_data import DEFAULT_OUTPUT
+from load_test import git_commit, percentile
+
+DEFAULT_FEED_SIZES = '100,1000,10000,100000'
+
+# Reservations put back in the expired state before each expire_reservations call
+EXPIRED_PER_CALL = 200
+
+
+# ==================== Benchmarks ====================
+
+class Benchmark:
+    """One timed call, with its untimed setup
+
+    `setup(db, dataset)` runs once per process and returns the state handed to
+    `run(db, state)`; `prepare(db, state)`, when given, runs untimed before
+    every call (to restore what the previous call changed).
+    """
+
+    def __init__(self, name, run, setup=None, prepare=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda db, dataset: None)
+        self.prepare = prepare
+
+
+def _restore_expired(db, state):
+    conn = sqlite3.connect(db.db_name)
+    conn.execute('DELETE FROM mobile_reservation_history WHERE id > ?', (state['history_id'],))
+    conn.executemany(
+        "UPDATE mobile_reservations SET is_active=1, expires_at=datetime('now', '-1 day') WHERE id=?",
+        [(reservation_id,) for reservation_id in state['reservation_ids']])
+    conn.commit()
+    conn.close()
+
+
+def _setup_expire(db, dataset):
+    conn = sqlite3.connect(db.db_name)
+    history_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM mobile_reservation_history').fetchone()[0]
+    conn.close()
+    return {'history_id': history_id, 'reservation_ids': dataset['reservations'][:EXPIRED_PER_CALL]}
+
+
+def _setup_duplicate(db, dataset):
+    return {'template_id': db.get_template_property_id(), 'created': [], 'seq': 0}
+
+
+def _run_duplicate(db, state):
+    state['seq'] += 1
+    property_id = db.duplicate_property_from_template(state['template_id'], {
+        'name': f"Micro {state['seq']}",
+        'slug': f"micro-{os.getpid()}-{state['seq']}",
+        'icon': '🏠',
+        'address': '1 rue du Bench, 07700 Bourg-Saint-Andéol',
+        'latitude': 44.37,
+        'longitude': 4.64,
+        'region': 'Ardèche',
+    })
+    state['created'].append(property_id)
+
+
+def _cleanup_duplicates(db, state):
+    while state['created']:
+        db.delete_property_with_data(state['created'].pop())
+
+
+def build_ical_feed(events, seed=7):
+    """iCal feed shaped like the Airbnb / Booking exports, with `events` VEVENTs"""
+    rng = random.Random(seed)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%SZ')
+    day = date.today() - timedelta(days=30)
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//LocApp//Micro Bench//FR', 'CALSCALE:GREGORIAN']
+    for n in range(events):
+        day += timedelta(days=rng.randint(0, 3))
+        nights = rng.randint(1, 10)
+        lines += [
+            'BEGIN:VEVENT',
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{day + timedelta(days=nights):%Y%m%d}",
+            f"SUMMARY:{'Reserved' if n % 3 else 'Airbnb (Not available)'}",
+            f"UID:micro-{n}@locapp.bench",
+            'DESCRIPTION:Reservation URL: https://www.airbnb.fr/hosting/reservations/details/HM'
+            f"{n:08d}",
+            'END:VEVENT',
+        ]
+        day += timedelta(days=nights)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def _setup_parse(events):
+    def setup(db, dataset):
+        from calendar_service import CalendarService
+        return {'service': CalendarService(db), 'feed': build_ical_feed(events)}
+    return setup
+
+
+def _setup_export(events, slot):
+    def setup(db, dataset):
+        from calendar_service import CalendarService
+        # One property per feed size, filled on first use (the database copy is shared)
+        property_id = dataset['properties'][-1 - slot]
+        conn = sqlite3.connect(db.db_name)
+        existing = conn.execute("SELECT COUNT(*) FROM calendar_events WHERE property_id=? AND uid LIKE 'micro-%'",
+                                (property_id,)).fetchone()[0]
+        if existing != events:
+            conn.execute("DELETE FROM calendar_events WHERE property_id=? AND uid LIKE 'micro-%'", (property_id,))
+            day = date.today() - timedelta(days=30)
+            rows = []
+            for n in range(events):
+                rows.append((property_id, f"micro-{n}", 'Réservé', day.isoformat(),
+                             (day + timedelta(days=3)).isoformat(), 'Camille', 'Airbnb'))
+                day += timedelta(days=4)
+            conn.executemany('''
+                INSERT INTO calendar_events (property_id, uid, summary, start_date, end_date, guest_name, platform)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        conn.close()
+        return {'service': CalendarService(db), 'property_id': property_id}
+    return setup
+
+
+def build_benchmarks(feed_sizes):
+    """Benchmarks by name, in run order"""
+    benchmarks = [
+        Benchmark('get_full_property_data_for_mobile',
+                  lambda db, state: db.get_full_property_data_for_mobile(state),
+                  setup=lambda db, dataset: dataset['properties'][0]),
+        Benchmark('get_properties_by_user[agency]',
+                  lambda db, state: db.get_properties_by_user(state),
+                  setup=lambda db, dataset: dataset['agency_owner']),
+        Benchmark('get_properties_by_user[single]',
+                  lambda db, state: db.get_properties_by_user(state),
+                  setup=lambda db, dataset: dataset['single_owner']),
+        Benchmark('is_token_valid[hit]',
+                  lambda db, state: db.is_token_valid(state),
+                  setup=lambda db, dataset: dataset['token']),
+        Benchmark('is_token_valid[miss]',
+                  lambda db, state: db.is_token_valid(state),
+                  setup=lambda db, dataset: 'NOTATOKEN'),
+        Benchmark('expire_reservations', lambda db, state: db.expire_reservations(),
+                  setup=_setup_expire, prepare=_restore_expired),
+        Benchmark('duplicate_property_from_template', _run_duplicate, setup=_setup_duplicate),
+    ]
+    for slot, size in enumerate(feed_sizes):
+        benchmarks.append(Benchmark(f"parse_ical[{size}]",
+                                    lambda db, state: state['service'].parse_ical(state['feed']),
+                                    setup=_setup_parse(size)))
+        benchmarks.append(Benchmark(f"generate_ical_export[{size}]",
+                                    lambda db, state: state['service'].generate_ical_export(
+                                        state['property_id'], 'Micro bench', 'micro-bench'),
+                                    setup=_setup_export(size, slot)))
+    return {benchmark.name: benchmark for benchmark in benchmarks}
+
+
+def load_dataset(db_path):
+    """Ids the benchmarks run against, picked from the generated data"""
+    conn = sqlite3.connect(db_path)
+    counts = conn.execute('''
+        SELECT u.id, COUNT(p.id) AS n FROM users u JOIN properties p ON p.user_id = u.id
+        WHERE u.email LIKE '%@bench.locapp' GROUP BY u.id ORDER BY n DESC, u.id
+    ''').fetchall()
+    properties = [row[0] for row in conn.execute(
+        "SELECT id FROM properties WHERE slug LIKE 'bench-%' ORDER BY id")]
+    token = conn.execute('''
+        SELECT token FROM property_tokens
+        WHERE token LIKE 'BENCH%' AND datetime('now', 'localtime') < datetime(replace(valid_until, 'T', ' '))
+        ORDER BY id LIMIT 1
+    ''').fetchone()
+    reservations = [row[0] for row in conn.execute('SELECT id FROM mobile_reservations ORDER BY id')]
+    conn.close()
+    if not counts or not properties or not token or not reservations:
+        raise SystemExit(f"No benchmark data in {db_path}, run bench/generate_data.py first")
+    return {
+        'agency_owner': counts[0][0],
+        'single_owner': counts[-1][0],
+        'properties': properties,
+        'token': token[0],
+        'reservations': reservations,
+    }
+
+
+# ==================== Runners ====================
+
+def _open(db_path):
+    from database import Database
+    return Database(db_path)
+
+
+def run_warm(benchmark, db, dataset, repeat, warmup, max_time):
+    """Repeated calls in this process (caches, imports and pages already loaded)
+
+    Returns:
+        List of durations in seconds
+    """
+    state = benchmark.setup(db, dataset)
+    samples = []
+    try:
+        deadline = None
+        for i in range(warmup + repeat):
+            if benchmark.prepare:
+                benchmark.prepare(db, state)
+            start = time.perf_counter()
+            benchmark.run(db, state)
+            duration = time.perf_counter() - start
+            if i < warmup:
+                continue
+            samples.append(duration)
+            if deadline is None:
+                deadline = time.perf_counter() + max_time
+            elif len(samples) >= 5 and time.perf_counter() > deadline:
+                break
+    finally:
+        if benchmark.name == 'duplicate_property_from_template':
+            _cleanup_duplicates(db, state)
+    return samples
+
+
+def _cold_sample(db_path, dataset, feed_sizes, name):
+    """One call in a fresh process: only the call is timed, its setup is not"""
+    benchmark = build_benchmarks(feed_sizes)[name]
+    db = _open(db_path)
+    state = benchmark.setup(db, dataset)
+    if benchmark.prepare:
+        benchmark.prepare(db, state)
+    start = time.perf_counter()
+    benchmark.run(db, state)
+    duration = time.perf_counter() - start
+    if name == 'duplicate_property_from_template':
+        _cleanup_duplicates(db, state)
+    return duration
+
+
+def run_cold(benchmark, db_path, dataset, feed_sizes, repeat, max_time):
+    """One call per new interpreter (first connection, empty statement and
+    Python caches, first use of the icalendar code paths)
+
+    Returns:
+        List of durations in seconds
+    """
+    context = multiprocessing.get_context('spawn')
+    samples = []
+    deadline = time.perf_counter() + max_time
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as pool:
+        for _ in range(repeat):
+            samples.append(pool.submit(_cold_sample, db_path, dataset, feed_sizes, benchmark.name).result())
+            if len(samples) >= 5 and time.perf_counter() > deadline:
+                break
+    return samples
+
+
+# ==================== Statistics ====================
+
+def describe(samples):
+    """Summary of the durations, in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+        'median_ms': round(statistics.median(ordered) * 1000, 4),
+        'stdev_ms': round(statistics.stdev(ordered) * 1000, 4) if len(ordered) > 1 else 0.0,
+        'min_ms': round(ordered[0] * 1000, 4),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 4),
+    }
+
+
+def mann_whitney(a, b):
+    """Two-sided Mann-Whitney U test (normal approximation, tie corrected)
+
+    Makes no assumption on the shape of the distributions, which suits timings
+    (skewed, with outliers). Returns the p-value.
+    """
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    ranked = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    r1 = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0)
+    u = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+def compare(current, baseline, threshold, alpha):
+    """Print the median change of every benchmark present in both runs
+
+    A change counts when it is larger than `threshold` percent and significant
+    (Mann-Whitney p-value below `alpha`).
+
+    Returns:
+        List of benchmark names that regressed
+    """
+    regressions = []
+    meta = baseline['meta']
+    print(f"\nComparison with {meta['commit']} ({meta['date']}, {meta['mode']} mode)")
+    if meta['mode'] != current['meta']['mode']:
+        print("[Bench] Warning: the baseline was measured in another mode")
+    print(f"{'benchmark':40} {'median ms':>11} {'base ms':>11} {'change':>8} {'p-value':>9}")
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if not base:
+            continue
+        median, base_median = result['stats']['median_ms'], base['stats']['median_ms']
+        change = (median - base_median) / base_median * 100 if base_median else 0.0
+        p_value = mann_whitney(result['samples'], base['samples'])
+        verdict = ''
+        if p_value < alpha and abs(change) > threshold:
+            verdict = '  REGRESSION' if change > 0 else '  faster'
+            if change > 0:
+                regressions.append(name)
+        print(f"{name:40} {median:>11.3f} {base_median:>11.3f} {change:>+7.1f}% {p_value:>9.4f}{verdict}")
+    return regressions
+
+
+def print_report(results):
+    print(f"\n{'benchmark':40} {'n':>4} {'median ms':>11} {'mean ms':>11} {'stdev':>9} {'p95 ms':>11}")
+    for name, result in results.items():
+        stats = result['stats']
+        print(f"{name:40} {stats['n']:>4} {stats['median_ms']:>11.3f} {stats['mean_ms']:>11.3f} "
+              f"{stats['stdev_ms']:>9.3f} {stats['p95_ms']:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark the LocApp Database and CalendarService')
+    parser.add_argument('--db', default=DEFAULT_OUTPUT, help='Database generated by generate_data.py')
+    parser.add_argument('--mode', choices=('warm', 'cold'), default='warm')
+    parser.add_argument('--only', help='Comma separated benchmark names (prefix match)')
+    parser.add_argument('--feed-sizes', default=DEFAULT_FEED_SIZES, help='iCal events per feed')
+    parser.add_argument('--repeat', type=int, default=50, help='Samples per benchmark')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed calls before measuring (warm mode)')
+    parser.add_argument('--max-time', type=float, default=10, help='Seconds per benchmark, once 5 samples are taken')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+    parser.add_argument('--output', help='Result file (default: bench/results/micro-<date>-<commit>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=5, help='Median change ignored below this percent')
+    parser.add_argument('--alpha', type=float, default=0.01, help='Significance level of the comparison')
+    args = parser.parse_args()
+
+    feed_sizes = [int(size) for size in args.feed_sizes.split(',') if size]
+    benchmarks = build_benchmarks(feed_sizes)
+    if args.only:
+        prefixes = tuple(args.only.split(','))
+        benchmarks = {name: b for name, b in benchmarks.items() if name.startswith(prefixes)}
+    if args.list:
+        print('\n'.join(benchmarks))
+        return
+
+    dataset = load_dataset(os.path.abspath(args.db))
+    workdir = tempfile.mkdtemp(prefix='locapp-micro-')
+    db_path = os.path.join(workdir, 'locapp.db')
+    shutil.copyfile(os.path.abspath(args.db), db_path)
+
+    results = {}
+    try:
+        db = _open(db_path)
+        for name, benchmark in benchmarks.items():
+            print(f"[Bench] {name} ({args.mode})")
+            if args.mode == 'warm':
+                samples = run_warm(benchmark, db, dataset, args.repeat, args.warmup, args.max_time)
+            else:
+                samples = run_cold(benchmark, db_path, dataset, feed_sizes, args.repeat, args.max_time)
+            results[name] = {'stats': describe(samples), 'samples': samples}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': args.mode,
+            'db': os.path.abspath(args.db),
+            'feed_sizes': feed_sizes,
+        },
+        'benchmarks': results,
+    }
+    print_report(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"micro-{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n[Bench] Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold, args.alpha)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Blob Store Module for LocApp
+Content-addressed storage for uploaded images, shared between references
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+
+import image_pipeline
+
+BLOB_PREFIX = 'blobs/'
+BLOB_FILENAME_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{1,5}$')
+
+# Unreferenced blobs touched more recently than this are kept: an upload may be
+# between storing its blob and inserting the row that references it
+BLOB_GRACE_SECONDS = 600
+
+
+def is_blob(name):
+    """True for a stored reference to a blob ("blobs/ab/<sha256>.<ext>")"""
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def is_blob_filename(filename):
+    """True for a bare blob file name, as sent to the mobile app ("<sha256>.<ext>")"""
+    return bool(BLOB_FILENAME_RE.match(filename or ''))
+
+
+def blob_name(sha256, ext):
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256}.{ext.lower()}"
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 and size of a file, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """Stores each distinct image once under <root>/blobs/, keyed by its SHA-256
+
+    Rows in photos, access_photos, general_info.header_image and contact_info.avatar
+    hold the blob name; blobs.refcount is recomputed from those columns whenever a
+    reference is added or released. Files of unreferenced blobs are removed by
+    release() once the grace period is over, or by sweep().
+    """
+
+    def __init__(self, db, root):
+        self.db = db
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def directory_for(self, filename):
+        """Directory holding a bare blob file name"""
+        return os.path.join(self.root, BLOB_PREFIX, filename[:2])
+
+    def ingest(self, source_path, ext, move=True, sha256=None, size=None):
+        """Store a file by content
+
+        Args:
+            source_path: File to store (moved into the store, or copied if move=False)
+            ext: File extension of the blob
+            sha256, size: Already computed while the file was written (hashed otherwise)
+
+        Returns:
+            Tuple (name, created): created is False when identical content was already stored
+        """
+        if sha256 is None or size is None:
+            sha256, size = hash_file(source_path)
+        name = blob_name(sha256, ext)
+        path = self.path(name)
+
+        with self._lock:
+            # Registered (touched) before the file is checked: a concurrent
+            # _delete() then either misses the row or has removed the file already
+            self.db.register_blob(name, sha256, size)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if move:
+                    os.replace(source_path, path)
+                else:
+                    shutil.copyfile(source_path, path)
+            elif move:
+                os.remove(source_path)
+
+        return name, created
+
+    def has_variants(self, name):
+        return all(os.path.exists(image_pipeline.variant_path(self.path(name), size))
+                   for size in image_pipeline.VARIANTS)
+
+    def add_refs(self, names):
+        """Refresh refcounts after rows referencing these blobs were inserted"""
+        return self.db.recount_blob_refs([n for n in names if is_blob(n)])
+
+    def release(self, name):
+        """Refresh the refcount after a reference was removed, deleting the blob if unused
+
+        Returns:
+            True if the blob file was deleted
+        """
+        if not is_blob(name):
+            return False
+        refcount = self.db.recount_blob_refs([name]).get(name)
+        if refcount is None or refcount > 0:
+            return False
+        # Recently stored blobs are kept (the delete re-checks it): left to sweep()
+        return self._delete(name, time.time() - BLOB_GRACE_SECONDS)
+
+    def _delete(self, name, touched_before):
+        """Delete an unreferenced blob untouched since `touched_before`, and its file"""
+        with self._lock:
+            return self.db.delete_blob(name, touched_before,
+                                       lambda: image_pipeline.delete_with_variants(self.path(name)))
+
+    def sweep(self, grace_seconds=BLOB_GRACE_SECONDS):
+        """Garbage-collect blobs: recount every reference, then delete unreferenced
+        blobs and orphan files in the store older than the grace period
+
+        Returns:
+            Dict with counts and bytes freed
+        """
+        stats = {'blobs': 0, 'deleted': 0, 'orphans': 0, 'bytes_freed': 0}
+        cutoff = time.time() - grace_seconds
+
+        stats['blobs'] = len(self.db.recount_blob_refs())
+        for blob in self.db.get_unreferenced_blobs(cutoff):
+            if self._delete(blob['name'], cutoff):
+                stats['deleted'] += 1
+                stats['bytes_freed'] += blob['size']
+
+        known = self.db.get_blob_names()
+        blob_root = os.path.join(self.root, BLOB_PREFIX)
+        for directory, _, filenames in os.walk(blob_root):
+            for filename in filenames:
+                if image_pipeline.is_variant(filename) or filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if name in known or os.path.getmtime(path) >= cutoff:
+                    continue
+                stats['bytes_freed'] += os.path.getsize(path)
+                image_pipeline.delete_with_variants(path)
+                stats['orphans'] += 1
+
+        print(f"[Blob Store] Sweep: {stats}")
+        return stats
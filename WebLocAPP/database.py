@@ -1,16 +1,216 @@
+import os
 import sqlite3
 import json
+import base64
 import re
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from query_tracker import TrackedConnection
+
+# Cached slug -> property_id mappings are dropped when slug_version changed (a
+# property was deleted or renamed, in any worker process); the version is read at
+# most once per this many seconds, which bounds how long a mapping can be stale
+SLUG_CACHE_CHECK_INTERVAL = float(os.environ.get('SLUG_CACHE_CHECK_INTERVAL', 2))
+
+# A web / mobile session's last_activity is written at most once per this many seconds
+WEB_SESSION_ACTIVITY_INTERVAL = 60
+
+# Sessions end after this many seconds without activity, and at the latest this
+# many seconds after login
+WEB_SESSION_IDLE_TIMEOUT = int(os.environ.get('WEB_SESSION_IDLE_TIMEOUT', 7 * 86400))
+WEB_SESSION_MAX_AGE = int(os.environ.get('WEB_SESSION_MAX_AGE', 30 * 86400))
+MOBILE_SESSION_IDLE_TIMEOUT = int(os.environ.get('MOBILE_SESSION_IDLE_TIMEOUT', 30 * 86400))
+MOBILE_SESSION_MAX_AGE = int(os.environ.get('MOBILE_SESSION_MAX_AGE', 90 * 86400))
+
+# Ended mobile sessions are kept this many days (SuperAdmin history), then deleted
+MOBILE_SESSION_HISTORY_DAYS = 30
+
+# Property access codes found invalid are remembered this many seconds (bounds how
+# long a code created in another worker process can be refused), up to this many codes
+INVALID_TOKEN_CACHE_TTL = 60
+INVALID_TOKEN_CACHE_SIZE = 10000
+
+# platform_stats counters kept up to date by triggers: name -> table (every row counted)
+PLATFORM_STATS_TABLES = {
+    'users': 'users',
+    'mobile_users': 'mobile_users',
+    'properties': 'properties',
+    'activities': 'activities',
+    'services': 'nearby_services',
+    'active_sessions': 'web_sessions',
+}
+
+# Plan of a property's owner (owners without a subscription are on the default plan)
+_OWNER_PLAN = "COALESCE((SELECT plan FROM subscriptions WHERE user_id = {}), 'decouverte')"
+
+# Largest page of a SuperAdmin list
+ADMIN_PAGE_SIZE_MAX = 200
+
+# SuperAdmin lists (keyset pagination, see Database.get_admin_page):
+#   select   query without WHERE / ORDER BY
+#   where    conditions always applied
+#   key      (expression, column) unique per row, last sort key
+#   search   expressions matched by the search term (LIKE)
+#   sorts    column -> expression; columns are selected and never NULL
+#   default  (column, 'asc' | 'desc')
+ADMIN_LISTS = {
+    'users': {
+        'select': '''
+            SELECT id, email, firstname, lastname, source_platform, password_plain, google_id, created_at
+            FROM users
+        ''',
+        'where': (),
+        'key': ('id', 'id'),
+        'search': ('email', 'firstname', 'lastname'),
+        'sorts': {'id': 'id', 'email': 'email', 'lastname': 'lastname', 'created_at': 'created_at'},
+        'default': ('id', 'desc'),
+    },
+    'mobile-users': {
+        'select': '''
+            SELECT id, email, firstname, lastname, source_platform, is_active, created_at
+            FROM mobile_users
+        ''',
+        'where': (),
+        'key': ('id', 'id'),
+        'search': ('email', 'firstname', 'lastname'),
+        'sorts': {'id': 'id', 'email': 'email', 'lastname': 'lastname', 'created_at': 'created_at'},
+        'default': ('created_at', 'desc'),
+    },
+    'properties': {
+        'select': '''
+            SELECT p.id, p.icon, p.name, p.slug, p.user_id, p.theme, p.is_active, u.email AS owner_email
+            FROM properties p
+            LEFT JOIN users u ON p.user_id = u.id
+        ''',
+        'where': (),
+        'key': ('p.id', 'id'),
+        'search': ('p.name', 'p.slug', 'u.email'),
+        'sorts': {'id': 'p.id', 'name': 'p.name', 'slug': 'p.slug'},
+        'default': ('id', 'asc'),
+    },
+    'web-sessions': {
+        'select': '''
+            SELECT ws.rowid AS session_id, substr(ws.token, 1, 8) || '...' AS token_preview,
+                   ws.email, u.firstname, u.lastname, ws.user_agent, ws.ip_address,
+                   ws.login_time, ws.last_activity
+            FROM web_sessions ws
+            JOIN users u ON u.email = ws.email
+        ''',
+        'where': (),
+        'key': ('ws.rowid', 'session_id'),
+        'search': ('ws.email', 'u.firstname', 'u.lastname', 'ws.ip_address'),
+        'sorts': {'last_activity': 'ws.last_activity', 'login_time': 'ws.login_time', 'email': 'ws.email'},
+        'default': ('last_activity', 'desc'),
+    },
+    'mobile-sessions': {
+        'select': '''
+            SELECT ms.id, mu.email, mu.firstname, mu.lastname, ms.device_name, ms.device_model,
+                   ms.os_version, ms.app_version, ms.ip_address, ms.last_activity, ms.created_at
+            FROM mobile_sessions ms
+            JOIN mobile_users mu ON ms.mobile_user_id = mu.id
+        ''',
+        'where': ('ms.is_active = 1',),
+        'key': ('ms.id', 'id'),
+        'search': ('mu.email', 'mu.firstname', 'mu.lastname', 'ms.device_name', 'ms.ip_address'),
+        'sorts': {'last_activity': 'ms.last_activity', 'created_at': 'ms.created_at', 'email': 'mu.email'},
+        'default': ('last_activity', 'desc'),
+    },
+}
+
+# Sections of a property export, in output order: (key, query on property_id, one row or a list)
+EXPORT_SECTIONS = (
+    ('general_info', '''
+        SELECT gi.*, p.region, a.city
+        FROM general_info gi
+        LEFT JOIN properties p ON gi.property_id = p.id
+        LEFT JOIN address a ON gi.property_id = a.property_id
+        WHERE gi.property_id=?
+        ORDER BY gi.id DESC LIMIT 1
+    ''', True),
+    ('wifi', 'SELECT * FROM wifi_config WHERE property_id=? ORDER BY id DESC LIMIT 1', True),
+    ('address', 'SELECT * FROM address WHERE property_id=? ORDER BY id DESC LIMIT 1', True),
+    ('parking', 'SELECT * FROM parking_info WHERE property_id=? ORDER BY id DESC LIMIT 1', True),
+    ('access', 'SELECT * FROM access_info WHERE property_id=? ORDER BY id DESC LIMIT 1', True),
+    ('contact', 'SELECT * FROM contact_info WHERE property_id=? ORDER BY id DESC LIMIT 1', True),
+    ('emergency_numbers', 'SELECT * FROM emergency_numbers WHERE property_id=? ORDER BY display_order', False),
+    ('nearby_services', 'SELECT * FROM nearby_services WHERE property_id=? ORDER BY display_order', False),
+    ('activities', 'SELECT * FROM activities WHERE property_id=? ORDER BY category, display_order', False),
+    ('activity_categories', 'SELECT * FROM activity_categories WHERE property_id=? ORDER BY display_order', False),
+)
+
+# Header of a property in multi-property exports
+EXPORT_PROPERTY_QUERY = 'SELECT id, name, slug, region, icon, theme FROM properties WHERE id=?'
+
+# Table of each export section (written back by Database.import_property)
+EXPORT_SECTION_TABLES = {
+    'general_info': 'general_info',
+    'wifi': 'wifi_config',
+    'address': 'address',
+    'parking': 'parking_info',
+    'access': 'access_info',
+    'contact': 'contact_info',
+    'emergency_numbers': 'emergency_numbers',
+    'nearby_services': 'nearby_services',
+    'activities': 'activities',
+    'activity_categories': 'activity_categories',
+}
+
+# Tables read by an export: any write to them bumps the property's data version (export ETags)
+EXPORT_VERSIONED_TABLES = tuple(EXPORT_SECTION_TABLES.values())
+
+# Columns never taken from an imported document: row identity, and uploaded files
+# (not part of exports), which are kept from the row being replaced
+IMPORT_SKIPPED_COLUMNS = ('id', 'property_id', 'updated_at')
+IMPORT_KEPT_COLUMNS = ('header_image', 'avatar')
+
+
+def encode_cursor(values):
+    """Opaque pagination cursor for a list of JSON values"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def token_timestamp(value):
+    """Epoch seconds of a token validity bound: a datetime or an ISO string
+    ('2026-02-07T09:57:36.198184', '2026-02-07 09:57:36', '2026-02-07'...).
+    Naive values are local time. Returns None if the value can't be parsed."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return int(value.timestamp())
 
 class Database:
     def __init__(self, db_name='locapp.db'):
         self.db_name = db_name
+        self._slug_cache = {}
+        self._slug_cache_lock = threading.Lock()
+        self._slug_version = None
+        self._slug_version_read_at = None
+        self._invalid_tokens = OrderedDict()
+        self._invalid_tokens_lock = threading.Lock()
         self.init_db()
 
     def get_connection(self):
         # Add timeout=30 to wait up to 30 seconds for database locks to be released
-        conn = sqlite3.connect(self.db_name, timeout=30)
+        # Statements are timed per request, see query_tracker.py
+        conn = sqlite3.connect(self.db_name, timeout=30, factory=TrackedConnection)
         conn.row_factory = sqlite3.Row
         return conn
 
@@ -454,6 +654,33 @@ class Database:
         # Migrate: add source_platform column to mobile_users
         self._migrate_add_source_platform_to_mobile_users(cursor, conn)
 
+        # Migrate: add processing_state column to photos and access_photos
+        self._migrate_add_processing_state_to_photos(cursor, conn)
+        self._migrate_add_processing_claim_to_photos(cursor, conn)
+
+        # Migrate: add epoch validity columns to property_tokens
+        self._migrate_add_token_timestamps(cursor, conn)
+
+        # Content-addressed photo storage (see blob_store.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                name TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                touched_at INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_photos_filename ON photos(filename)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_photos_filename ON access_photos(filename)')
+        # Reservation expiry: range scan on the active, expired reservations
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mobile_reservations_active_expires
+            ON mobile_reservations(is_active, expires_at)
+        ''')
+        conn.commit()
+
         # Create mobile_sessions table for tracking mobile connections
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS mobile_sessions (
@@ -472,6 +699,80 @@ class Database:
             )
         ''')
         conn.commit()
+        self._migrate_add_expires_at_to_mobile_sessions(cursor, conn)
+
+        # Web (admin) sessions, shared by every worker process
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS web_sessions (
+                token TEXT PRIMARY KEY,
+                email TEXT NOT NULL,
+                user_agent TEXT,
+                ip_address TEXT,
+                login_time TEXT NOT NULL,
+                last_activity TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+
+        # Leases of the scheduled jobs, so that one worker process runs each job
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_locks (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                locked_until REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+        # SuperAdmin lists: index scans for their default sort orders
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mobile_users_created_at ON mobile_users(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_web_sessions_last_activity ON web_sessions(last_activity)')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mobile_sessions_active_activity
+            ON mobile_sessions(is_active, last_activity)
+        ''')
+        conn.commit()
+
+        # Dashboard counters and daily series, maintained by triggers
+        self._migrate_create_platform_stats(cursor, conn)
+
+        # Data version of each property, maintained by triggers (export ETags)
+        self._migrate_create_property_versions(cursor, conn)
+
+        # Version of the slug -> property id mapping, maintained by triggers
+        self._migrate_create_slug_version(cursor, conn)
+
+        # Bulk imports and the result of each imported document
+        self._migrate_create_import_jobs(cursor, conn)
+        self._migrate_add_owner_to_import_jobs(cursor, conn)
+
+        # Routes armed for profiling and the last request profiles (see profiling.py)
+        self._migrate_create_request_profiles(cursor, conn)
+
+        # Outbound emails, sent in the background (see mailer.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_by TEXT,
+                claimed_until REAL,
+                last_error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                sent_at TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_outbox_status_due ON email_outbox(status, next_attempt_at)')
+        conn.commit()
+
+        # Readers don't block the writer (and the other way round) when several
+        # worker processes share the database; the mode is stored in the file
+        conn.execute('PRAGMA journal_mode=WAL')
 
         conn.close()
 
@@ -594,6 +895,324 @@ class Database:
             cursor.execute("ALTER TABLE mobile_users ADD COLUMN source_platform TEXT DEFAULT 'mobile'")
             conn.commit()
 
+    def _migrate_add_processing_state_to_photos(self, cursor, conn):
+        """Migration: Add processing_state column (pending/ready/failed) to photo tables"""
+        for table in ('photos', 'access_photos'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [col[1] for col in cursor.fetchall()]
+
+            if 'processing_state' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN processing_state TEXT DEFAULT 'ready'")
+                conn.commit()
+
+    def _migrate_add_processing_claim_to_photos(self, cursor, conn):
+        """Migration: processing_claimed_by / processing_claimed_until, the process generating a photo's variants"""
+        for table in ('photos', 'access_photos'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [col[1] for col in cursor.fetchall()]
+
+            if 'processing_claimed_by' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN processing_claimed_by TEXT")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN processing_claimed_until REAL")
+                conn.commit()
+
+    def _migrate_add_expires_at_to_mobile_sessions(self, cursor, conn):
+        """Migration: mobile_sessions.expires_at (epoch), the session's latest possible end
+
+        Sessions created before it never expired: they are all ended, their
+        users log in again.
+        """
+        cursor.execute("PRAGMA table_info(mobile_sessions)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if 'expires_at' not in columns:
+            cursor.execute('ALTER TABLE mobile_sessions ADD COLUMN expires_at REAL')
+            cursor.execute('UPDATE mobile_sessions SET is_active = 0 WHERE is_active = 1')
+            print(f"[Database] Migration: {cursor.rowcount} mobile session(s) without expiry ended")
+            conn.commit()
+
+    def _migrate_add_token_timestamps(self, cursor, conn):
+        """Migration: Add valid_from_ts / valid_until_ts (epoch seconds) to property_tokens
+
+        valid_from / valid_until are kept as given (returned by the API); the
+        validity check uses the integer columns, which an index can serve.
+        """
+        cursor.execute("PRAGMA table_info(property_tokens)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if 'valid_until_ts' not in columns:
+            cursor.execute('ALTER TABLE property_tokens ADD COLUMN valid_from_ts INTEGER')
+            cursor.execute('ALTER TABLE property_tokens ADD COLUMN valid_until_ts INTEGER')
+            rows = cursor.execute('SELECT id, valid_from, valid_until FROM property_tokens').fetchall()
+            cursor.executemany(
+                'UPDATE property_tokens SET valid_from_ts=?, valid_until_ts=? WHERE id=?',
+                [(token_timestamp(row[1]), token_timestamp(row[2]), row[0]) for row in rows]
+            )
+            conn.commit()
+            print(f"[Database] Migration: validity timestamps computed for {len(rows)} property tokens")
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_property_tokens_validity
+            ON property_tokens(token, is_active, valid_from_ts, valid_until_ts)
+        ''')
+        conn.commit()
+
+    def _migrate_create_platform_stats(self, cursor, conn):
+        """Migration: platform_stats (counters) and platform_stats_series (daily series)
+
+        Triggers keep both up to date on every write, whichever code path does it
+        (Database methods, raw SQL of the SuperAdmin routes, bench scripts).
+        Counters are computed from the tables once, when platform_stats is created.
+
+        platform_stats:        name -> value ('users', 'properties_plan:<plan>'...)
+        platform_stats_series: (series, bucket day, dimension) -> value
+            user_signups, mobile_signups  signups per day (UTC)
+            guest_views                   guest views per day, dimension = property id
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS platform_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS platform_stats_series (
+                series TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                dimension TEXT NOT NULL DEFAULT '',
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (series, bucket, dimension)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+
+        # Triggers and backfill in one write transaction: no write can slip between them
+        cursor.execute('BEGIN IMMEDIATE')
+        for statement in self._platform_stats_triggers():
+            cursor.execute(statement)
+        if cursor.execute('SELECT COUNT(*) FROM platform_stats').fetchone()[0] == 0:
+            self._compute_platform_stats(cursor)
+            print("[Database] Migration: platform statistics computed")
+        conn.commit()
+
+    def _migrate_create_property_versions(self, cursor, conn):
+        """Migration: property_versions, bumped by triggers on every write to the exported data
+
+        A property without a row is at version 0. Versions only need to change
+        when the data does, so they start from 0 on existing databases.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS property_versions (
+                property_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for statement in self._property_version_triggers():
+            cursor.execute(statement)
+        conn.commit()
+
+    def _migrate_create_slug_version(self, cursor, conn):
+        """Migration: slug_version (one row), bumped by triggers when a slug stops
+        pointing to its property (property deleted or slug changed)
+
+        Slugs of new properties need no bump: unknown slugs are never cached.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS slug_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO slug_version (id, version) VALUES (1, 0)')
+        bump = 'UPDATE slug_version SET version = version + 1 WHERE id = 1;'
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS slug_version_delete AFTER DELETE ON properties BEGIN {bump} END')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS slug_version_update AFTER UPDATE OF slug ON properties
+            WHEN OLD.slug IS NOT NEW.slug BEGIN {bump} END
+        ''')
+        conn.commit()
+
+    def _migrate_create_import_jobs(self, cursor, conn):
+        """Migration: import_jobs (progress of a bulk import) and import_job_items (one per document)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                finished_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_job_items (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                slug TEXT,
+                status TEXT NOT NULL,
+                property_id INTEGER,
+                message TEXT,
+                PRIMARY KEY (job_id, position)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_created_at ON import_jobs(created_at)')
+        conn.commit()
+
+    def _migrate_add_owner_to_import_jobs(self, cursor, conn):
+        """Migration: import_jobs.owner (process running the job), heartbeat_at (epoch) and error
+
+        Running jobs get a heartbeat now: if their process is gone, they are failed
+        once it is stale.
+        """
+        cursor.execute("PRAGMA table_info(import_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if 'owner' not in columns:
+            cursor.execute("ALTER TABLE import_jobs ADD COLUMN owner TEXT")
+            cursor.execute("ALTER TABLE import_jobs ADD COLUMN heartbeat_at REAL")
+            cursor.execute("ALTER TABLE import_jobs ADD COLUMN error TEXT")
+            cursor.execute("UPDATE import_jobs SET heartbeat_at = ? WHERE status = 'running'", (time.time(),))
+            conn.commit()
+
+    def _migrate_create_request_profiles(self, cursor, conn):
+        """Migration: profile_routes (routes armed for profiling) and request_profiles"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS profile_routes (
+                endpoint TEXT PRIMARY KEY,
+                mode TEXT NOT NULL,
+                remaining INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS request_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT,
+                method TEXT,
+                path TEXT,
+                mode TEXT NOT NULL,
+                duration_ms REAL,
+                error TEXT,
+                at REAL,
+                pid INTEGER,
+                data BLOB NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    @staticmethod
+    def _property_version_triggers():
+        """CREATE TRIGGER statements bumping property_versions"""
+        def bump(property_id):
+            return f'''
+                INSERT INTO property_versions (property_id, version) VALUES ({property_id}, 1)
+                ON CONFLICT(property_id) DO UPDATE SET version = version + 1;'''
+
+        def trigger(name, event, body, when=None):
+            condition = f' WHEN {when}' if when else ''
+            return f'CREATE TRIGGER IF NOT EXISTS property_version_{name} AFTER {event}{condition} BEGIN {body} END'
+
+        statements = []
+        for table in EXPORT_VERSIONED_TABLES:
+            statements += [
+                trigger(f'{table}_insert', f'INSERT ON {table}', bump('NEW.property_id')),
+                trigger(f'{table}_update', f'UPDATE ON {table}', bump('NEW.property_id')),
+                trigger(f'{table}_moved', f'UPDATE OF property_id ON {table}', bump('OLD.property_id'),
+                        when='OLD.property_id IS NOT NEW.property_id'),
+                trigger(f'{table}_delete', f'DELETE ON {table}', bump('OLD.property_id')),
+            ]
+        # Property header and general_info.region
+        statements.append(trigger('properties_update', 'UPDATE ON properties', bump('NEW.id')))
+        return statements
+
+    @staticmethod
+    def _platform_stats_triggers():
+        """CREATE TRIGGER statements maintaining platform_stats and platform_stats_series"""
+        def add(name, delta):
+            return f'''
+                INSERT INTO platform_stats (name, value) VALUES ({name}, {delta})
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;'''
+
+        def signup(series):
+            return f'''
+                INSERT INTO platform_stats_series (series, bucket, value)
+                VALUES ('{series}', COALESCE(date(NEW.created_at), date('now')), 1)
+                ON CONFLICT(series, bucket, dimension) DO UPDATE SET value = value + 1;'''
+
+        def trigger(name, event, body, when=None):
+            condition = f' WHEN {when}' if when else ''
+            return f'CREATE TRIGGER IF NOT EXISTS platform_stats_{name} AFTER {event}{condition} BEGIN {body} END'
+
+        statements = []
+        for name, table in PLATFORM_STATS_TABLES.items():
+            insert_body = add(f"'{name}'", 1)
+            if table == 'users':
+                insert_body += signup('user_signups')
+            elif table == 'mobile_users':
+                insert_body += signup('mobile_signups')
+            statements.append(trigger(f'{table}_insert', f'INSERT ON {table}', insert_body))
+            statements.append(trigger(f'{table}_delete', f'DELETE ON {table}', add(f"'{name}'", -1)))
+
+        # Active mobile sessions (logout and expiry deactivate them)
+        statements += [
+            trigger('mobile_sessions_insert', 'INSERT ON mobile_sessions',
+                    add("'mobile_sessions'", 1), when='NEW.is_active = 1'),
+            trigger('mobile_sessions_update', 'UPDATE OF is_active ON mobile_sessions',
+                    add("'mobile_sessions'", '(NEW.is_active = 1) - (OLD.is_active = 1)'),
+                    when='(NEW.is_active = 1) != (OLD.is_active = 1)'),
+            trigger('mobile_sessions_delete', 'DELETE ON mobile_sessions',
+                    add("'mobile_sessions'", -1), when='OLD.is_active = 1'),
+        ]
+
+        # Properties per plan of their owner
+        new_plan = f"'properties_plan:' || {_OWNER_PLAN.format('NEW.user_id')}"
+        old_plan = f"'properties_plan:' || {_OWNER_PLAN.format('OLD.user_id')}"
+        owned = '(SELECT COUNT(*) FROM properties WHERE user_id = {})'
+        statements += [
+            trigger('properties_plan_insert', 'INSERT ON properties', add(new_plan, 1)),
+            trigger('properties_plan_delete', 'DELETE ON properties', add(old_plan, -1)),
+            trigger('properties_plan_owner', 'UPDATE OF user_id ON properties',
+                    add(old_plan, -1) + add(new_plan, 1), when='OLD.user_id IS NOT NEW.user_id'),
+            trigger('subscriptions_insert', 'INSERT ON subscriptions',
+                    add("'properties_plan:decouverte'", f"-{owned.format('NEW.user_id')}")
+                    + add("'properties_plan:' || NEW.plan", owned.format('NEW.user_id')),
+                    when="NEW.plan != 'decouverte'"),
+            trigger('subscriptions_plan', 'UPDATE OF plan ON subscriptions',
+                    add("'properties_plan:' || OLD.plan", f"-{owned.format('OLD.user_id')}")
+                    + add("'properties_plan:' || NEW.plan", owned.format('NEW.user_id')),
+                    when='OLD.plan != NEW.plan'),
+            trigger('subscriptions_delete', 'DELETE ON subscriptions',
+                    add("'properties_plan:' || OLD.plan", f"-{owned.format('OLD.user_id')}")
+                    + add("'properties_plan:decouverte'", owned.format('OLD.user_id')),
+                    when="OLD.plan != 'decouverte'"),
+        ]
+        return statements
+
+    @staticmethod
+    def _compute_platform_stats(cursor):
+        """Recompute the counters and signup series from the tables (guest views are kept)"""
+        cursor.execute('DELETE FROM platform_stats')
+        for name, table in PLATFORM_STATS_TABLES.items():
+            cursor.execute(f'INSERT INTO platform_stats (name, value) SELECT ?, COUNT(*) FROM {table}', (name,))
+        cursor.execute('''
+            INSERT INTO platform_stats (name, value)
+            SELECT 'mobile_sessions', COUNT(*) FROM mobile_sessions WHERE is_active = 1
+        ''')
+        cursor.execute(f'''
+            INSERT INTO platform_stats (name, value)
+            SELECT 'properties_plan:' || {_OWNER_PLAN.format('p.user_id')}, COUNT(*)
+            FROM properties p
+            GROUP BY 1
+        ''')
+        cursor.execute("DELETE FROM platform_stats_series WHERE series IN ('user_signups', 'mobile_signups')")
+        for series, table in (('user_signups', 'users'), ('mobile_signups', 'mobile_users')):
+            cursor.execute(f'''
+                INSERT INTO platform_stats_series (series, bucket, value)
+                SELECT ?, COALESCE(date(created_at), date('now')) AS day, COUNT(*)
+                FROM {table}
+                GROUP BY day
+            ''', (series,))
+
     def _migrate_and_insert_default_data(self, cursor, conn):
         """Migrate existing data and insert default data"""
 
@@ -953,6 +1572,51 @@ class Database:
         conn.close()
         return dict(result) if result else None
 
+    def get_property_id_by_slug(self, slug):
+        """Get a property id from its slug, cached in memory (used by the photo serving routes)"""
+        self._check_slug_version()
+        with self._slug_cache_lock:
+            cached = self._slug_cache.get(slug)
+            version = self._slug_version
+        if cached is not None:
+            return cached
+
+        conn = self.get_connection()
+        result = conn.execute('SELECT id FROM properties WHERE slug=?', (slug,)).fetchone()
+        conn.close()
+        if not result:
+            return None
+
+        with self._slug_cache_lock:
+            # Not cached if the cache was dropped meanwhile: the row may predate the change
+            if self._slug_version == version:
+                self._slug_cache[slug] = result['id']
+        return result['id']
+
+    def _check_slug_version(self):
+        """Drop the slug cache if slug_version changed since it was last read"""
+        now = time.monotonic()
+        if self._slug_version_read_at is not None and now - self._slug_version_read_at < SLUG_CACHE_CHECK_INTERVAL:
+            return
+        conn = self.get_connection()
+        row = conn.execute('SELECT version FROM slug_version WHERE id = 1').fetchone()
+        conn.close()
+        version = row['version'] if row else 0
+        with self._slug_cache_lock:
+            self._slug_version_read_at = now
+            if version != self._slug_version:
+                self._slug_cache.clear()
+                self._slug_version = version
+
+    def invalidate_slug_cache(self):
+        """Forget cached slug -> id mappings (call after creating, renaming or deleting a property)
+
+        Other worker processes drop theirs within SLUG_CACHE_CHECK_INTERVAL (slug_version).
+        """
+        with self._slug_cache_lock:
+            self._slug_cache.clear()
+            self._slug_version_read_at = None
+
     def create_property(self, data, user_id=None):
         """Create a new property and initialize all related tables"""
         conn = self.get_connection()
@@ -1013,6 +1677,7 @@ class Database:
 
         conn.commit()
         conn.close()
+        self.invalidate_slug_cache()
 
         return property_id
 
@@ -1029,216 +1694,38 @@ class Database:
         Returns:
             The ID of the newly created property
         """
+        return self.duplicate_properties_from_template(template_property_id, [new_property_data], user_id)[0]
+
+    def duplicate_properties_from_template(self, template_property_id, properties_data, user_id=None):
+        """
+        Create several properties from a template in one transaction (all or none).
+
+        Each child table is copied with one INSERT ... SELECT per property, so
+        template rows never go through Python.
+
+        Args:
+            properties_data: list of new_property_data dicts (see duplicate_property_from_template)
+
+        Returns:
+            The IDs of the new properties, in the order of properties_data
+
+        Raises:
+            ValueError: a slug is already used
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            # 1. Create the new property record
-            cursor.execute('''
-                INSERT INTO properties (name, slug, icon, location, region, theme, is_active, display_order, user_id)
-                VALUES (?, ?, ?, ?, ?, 'mazet-bsa', 1, (SELECT COALESCE(MAX(display_order), 0) + 1 FROM properties), ?)
-            ''', (
-                new_property_data['name'],
-                new_property_data['slug'],
-                new_property_data.get('icon', '🏠'),
-                new_property_data.get('address', ''),
-                new_property_data.get('region', ''),
-                user_id
-            ))
-            new_property_id = cursor.lastrowid
-
-            # 2. Duplicate general_info from template
-            cursor.execute('SELECT * FROM general_info WHERE property_id=?', (template_property_id,))
-            template_general = cursor.fetchone()
-            if template_general:
-                cursor.execute('''
-                    INSERT INTO general_info (property_id, property_name, welcome_title, welcome_message, welcome_description)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    new_property_data['name'],  # Use the new property name
-                    f"Bienvenue à {new_property_data['name']} ! 🌿",
-                    template_general['welcome_message'],
-                    template_general['welcome_description']
-                ))
-
-            # 3. Duplicate wifi_config from template
-            cursor.execute('SELECT * FROM wifi_config WHERE property_id=?', (template_property_id,))
-            template_wifi = cursor.fetchone()
-            if template_wifi:
-                cursor.execute('''
-                    INSERT INTO wifi_config (property_id, ssid, password, location_description)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    "WiFi_" + new_property_data['slug'].replace('-', '_'),  # Generate new SSID
-                    "À configurer",  # Password to be configured
-                    template_wifi['location_description']
-                ))
-
-            # 4. Parse and insert address
-            address_str = new_property_data.get('address', '')
-            address_parts = address_str.split(',')
-
-            # Try to extract components from the address
-            street = address_parts[0].strip() if address_parts else ''
-            city = ''
-            postal_code = ''
-            country = 'France'
-
-            # Parse address: typically "Street, Postal Code City, Country" or "Street, City"
-            if len(address_parts) >= 2:
-                # Look for postal code (5 digits in France)
-                for part in address_parts[1:]:
-                    postal_match = re.search(r'\b(\d{5})\b', part)
-                    if postal_match:
-                        postal_code = postal_match.group(1)
-                        # City is the part after the postal code
-                        city_part = part.replace(postal_code, '').strip()
-                        if city_part:
-                            city = city_part
-                    elif not city and part.strip():
-                        city = part.strip()
-
-            # If city wasn't found but we have multiple parts, use the last one
-            if not city and len(address_parts) > 1:
-                city = address_parts[-1].strip()
-
-            cursor.execute('''
-                INSERT INTO address (property_id, street, postal_code, city, country, latitude, longitude, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                new_property_id,
-                street,
-                postal_code,
-                city,
-                country,
-                new_property_data.get('latitude'),
-                new_property_data.get('longitude'),
-                address_str  # Full address as description
-            ))
+            cursor.execute('BEGIN IMMEDIATE')
+            slugs = [data['slug'] for data in properties_data]
+            placeholders = ','.join('?' * len(slugs))
+            taken = [row[0] for row in cursor.execute(
+                f'SELECT slug FROM properties WHERE slug IN ({placeholders})', slugs).fetchall()]
+            if taken:
+                raise ValueError(f"Slug(s) déjà utilisé(s) : {', '.join(taken)}")
 
-            # 5. Duplicate parking_info from template
-            cursor.execute('SELECT * FROM parking_info WHERE property_id=?', (template_property_id,))
-            template_parking = cursor.fetchone()
-            if template_parking:
-                cursor.execute('''
-                    INSERT INTO parking_info (property_id, distance, description, is_free, tips)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    template_parking['distance'],
-                    template_parking['description'],
-                    template_parking['is_free'],
-                    template_parking['tips']
-                ))
-
-            # 6. Duplicate access_info from template
-            cursor.execute('SELECT * FROM access_info WHERE property_id=?', (template_property_id,))
-            template_access = cursor.fetchone()
-            if template_access:
-                access_dict = dict(template_access)
-                cursor.execute('''
-                    INSERT INTO access_info (property_id, check_in_time, check_out_time, keybox_code, keybox_location, access_instructions)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    access_dict.get('check_in_time', '16:00'),
-                    access_dict.get('check_out_time', '10:00'),
-                    access_dict.get('keybox_code', ''),
-                    access_dict.get('keybox_location', ''),
-                    access_dict.get('access_instructions', '')
-                ))
-
-            # 7. Duplicate contact_info from template (with placeholder values)
-            cursor.execute('SELECT * FROM contact_info WHERE property_id=?', (template_property_id,))
-            template_contact = cursor.fetchone()
-            if template_contact:
-                contact_dict = dict(template_contact)
-                cursor.execute('''
-                    INSERT INTO contact_info (property_id, host_name, phone, email, whatsapp, airbnb_url, description, response_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    contact_dict.get('host_name', 'Votre nom'),
-                    contact_dict.get('phone', 'À configurer'),
-                    contact_dict.get('email', 'À configurer'),
-                    contact_dict.get('whatsapp', ''),
-                    contact_dict.get('airbnb_url', ''),
-                    contact_dict.get('description', 'À votre service pour un séjour parfait'),
-                    contact_dict.get('response_time', 'Réponse rapide')
-                ))
-
-            # 8. Duplicate activities from template
-            cursor.execute('SELECT * FROM activities WHERE property_id=?', (template_property_id,))
-            template_activities = cursor.fetchall()
-            for activity in template_activities:
-                cursor.execute('''
-                    INSERT INTO activities (property_id, category, name, description, emoji, distance, latitude, longitude, display_order)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    activity['category'],
-                    activity['name'],
-                    activity['description'],
-                    activity['emoji'],
-                    activity['distance'],
-                    activity['latitude'],
-                    activity['longitude'],
-                    activity['display_order']
-                ))
-
-            # 9. Duplicate nearby_services from template
-            cursor.execute('SELECT * FROM nearby_services WHERE property_id=?', (template_property_id,))
-            template_services = cursor.fetchall()
-            for service in template_services:
-                cursor.execute('''
-                    INSERT INTO nearby_services (property_id, category, name, description, address, phone, opening_hours, icon, latitude, longitude, display_order)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    service['category'],
-                    service['name'],
-                    service['description'],
-                    service['address'],
-                    service['phone'],
-                    service['opening_hours'],
-                    service['icon'],
-                    service['latitude'],
-                    service['longitude'],
-                    service['display_order']
-                ))
-
-            # 10. Duplicate emergency_numbers from template
-            cursor.execute('SELECT * FROM emergency_numbers WHERE property_id=?', (template_property_id,))
-            template_emergency = cursor.fetchall()
-            for emergency in template_emergency:
-                cursor.execute('''
-                    INSERT INTO emergency_numbers (property_id, name, number, category, display_order)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    emergency['name'],
-                    emergency['number'],
-                    emergency['category'],
-                    emergency['display_order']
-                ))
-
-            # 11. Duplicate amenities from template
-            cursor.execute('SELECT * FROM amenities WHERE property_id=?', (template_property_id,))
-            template_amenities = cursor.fetchall()
-            for amenity in template_amenities:
-                cursor.execute('''
-                    INSERT INTO amenities (property_id, category, name, icon, description, display_order)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    new_property_id,
-                    amenity['category'],
-                    amenity['name'],
-                    amenity['icon'],
-                    amenity['description'],
-                    amenity['display_order']
-                ))
+            new_property_ids = [self._copy_template_property(cursor, template_property_id, data, user_id)
+                                for data in properties_data]
 
             conn.commit()
         except Exception as e:
@@ -1247,6 +1734,129 @@ class Database:
         finally:
             conn.close()
 
+        self.invalidate_slug_cache()
+        return new_property_ids
+
+    @staticmethod
+    def _parse_address(address_str):
+        """(street, postal_code, city, country) of a free-form address"""
+        address_parts = address_str.split(',')
+
+        # Try to extract components from the address
+        street = address_parts[0].strip() if address_parts else ''
+        city = ''
+        postal_code = ''
+        country = 'France'
+
+        # Parse address: typically "Street, Postal Code City, Country" or "Street, City"
+        if len(address_parts) >= 2:
+            # Look for postal code (5 digits in France)
+            for part in address_parts[1:]:
+                postal_match = re.search(r'\b(\d{5})\b', part)
+                if postal_match:
+                    postal_code = postal_match.group(1)
+                    # City is the part after the postal code
+                    city_part = part.replace(postal_code, '').strip()
+                    if city_part:
+                        city = city_part
+                elif not city and part.strip():
+                    city = part.strip()
+
+        # If city wasn't found but we have multiple parts, use the last one
+        if not city and len(address_parts) > 1:
+            city = address_parts[-1].strip()
+
+        return street, postal_code, city, country
+
+    def _copy_template_property(self, cursor, template_property_id, new_property_data, user_id):
+        """Insert one property and copy the template's rows into it (in the caller's transaction)"""
+        template = template_property_id
+        name = new_property_data['name']
+
+        # 1. Create the new property record
+        cursor.execute('''
+            INSERT INTO properties (name, slug, icon, location, region, theme, is_active, display_order, user_id)
+            VALUES (?, ?, ?, ?, ?, 'mazet-bsa', 1, (SELECT COALESCE(MAX(display_order), 0) + 1 FROM properties), ?)
+        ''', (
+            name,
+            new_property_data['slug'],
+            new_property_data.get('icon', '🏠'),
+            new_property_data.get('address', ''),
+            new_property_data.get('region', ''),
+            user_id
+        ))
+        new_property_id = cursor.lastrowid
+
+        # 2. general_info: new name and title, template messages (images are not copied)
+        cursor.execute('''
+            INSERT INTO general_info (property_id, property_name, welcome_title, welcome_message, welcome_description)
+            SELECT ?, ?, ?, welcome_message, welcome_description
+            FROM general_info WHERE property_id=? ORDER BY id DESC LIMIT 1
+        ''', (new_property_id, name, f"Bienvenue à {name} ! 🌿", template))
+
+        # 3. wifi_config: generated SSID, password to be configured
+        cursor.execute('''
+            INSERT INTO wifi_config (property_id, ssid, password, location_description)
+            SELECT ?, ?, 'À configurer', location_description
+            FROM wifi_config WHERE property_id=? ORDER BY id DESC LIMIT 1
+        ''', (new_property_id, "WiFi_" + new_property_data['slug'].replace('-', '_'), template))
+
+        # 4. Address of the new property
+        address_str = new_property_data.get('address', '')
+        street, postal_code, city, country = self._parse_address(address_str)
+        cursor.execute('''
+            INSERT INTO address (property_id, street, postal_code, city, country, latitude, longitude, description)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            new_property_id,
+            street,
+            postal_code,
+            city,
+            country,
+            new_property_data.get('latitude'),
+            new_property_data.get('longitude'),
+            address_str  # Full address as description
+        ))
+
+        # 5-7. parking_info, access_info, contact_info: latest template row
+        cursor.execute('''
+            INSERT INTO parking_info (property_id, distance, description, is_free, tips)
+            SELECT ?, distance, description, is_free, tips
+            FROM parking_info WHERE property_id=? ORDER BY id DESC LIMIT 1
+        ''', (new_property_id, template))
+        cursor.execute('''
+            INSERT INTO access_info (property_id, check_in_time, check_out_time, keybox_code, keybox_location, access_instructions)
+            SELECT ?, check_in_time, check_out_time, keybox_code, keybox_location, access_instructions
+            FROM access_info WHERE property_id=? ORDER BY id DESC LIMIT 1
+        ''', (new_property_id, template))
+        cursor.execute('''
+            INSERT INTO contact_info (property_id, host_name, phone, email, whatsapp, airbnb_url, description, response_time)
+            SELECT ?, host_name, phone, email, whatsapp, airbnb_url, description, response_time
+            FROM contact_info WHERE property_id=? ORDER BY id DESC LIMIT 1
+        ''', (new_property_id, template))
+
+        # 8-11. Lists: every template row, in their original order
+        cursor.execute('''
+            INSERT INTO activities (property_id, category, name, description, emoji, distance, latitude, longitude, display_order)
+            SELECT ?, category, name, description, emoji, distance, latitude, longitude, display_order
+            FROM activities WHERE property_id=? ORDER BY id
+        ''', (new_property_id, template))
+        cursor.execute('''
+            INSERT INTO nearby_services (property_id, category, name, description, address, phone, opening_hours, icon, latitude, longitude, display_order)
+            SELECT ?, category, name, description, address, phone, opening_hours, icon, latitude, longitude, display_order
+            FROM nearby_services WHERE property_id=? ORDER BY id
+        ''', (new_property_id, template))
+        cursor.execute('''
+            INSERT INTO emergency_numbers (property_id, name, number, category, display_order)
+            SELECT ?, name, number, category, display_order
+            FROM emergency_numbers WHERE property_id=? ORDER BY id
+        ''', (new_property_id, template))
+        cursor.execute('''
+            INSERT INTO amenities (property_id, category, name, icon, description, display_order)
+            SELECT ?, category, name, icon, description, display_order
+            FROM amenities WHERE property_id=? ORDER BY id
+        ''', (new_property_id, template))
+
         return new_property_id
 
     def get_template_property_id(self):
@@ -1451,15 +2061,17 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO activities (property_id, name, category, description, emoji, distance, display_order)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (property_id, data['name'], data['category'], data['description'], data['emoji'], data['distance'], data.get('display_order', 0)))
+            INSERT INTO activities (property_id, name, category, description, emoji, distance, latitude, longitude, display_order)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (property_id, data['name'], data['category'], data['description'], data['emoji'], data['distance'],
+              data.get('latitude'), data.get('longitude'), data.get('display_order', 0)))
         conn.commit()
         activity_id = cursor.lastrowid
         conn.close()
         return activity_id
 
     def update_activity(self, activity_id, data):
+        """Update an activity; its coordinates only when `data` has 'latitude' and 'longitude'"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
@@ -1467,6 +2079,9 @@ class Database:
             SET name=?, category=?, description=?, emoji=?, distance=?, display_order=?, updated_at=CURRENT_TIMESTAMP
             WHERE id=?
         ''', (data['name'], data['category'], data['description'], data['emoji'], data['distance'], data.get('display_order', 0), activity_id))
+        if 'latitude' in data and 'longitude' in data:
+            cursor.execute('UPDATE activities SET latitude=?, longitude=? WHERE id=?',
+                           (data['latitude'], data['longitude'], activity_id))
         conn.commit()
         conn.close()
 
@@ -1477,6 +2092,39 @@ class Database:
         conn.commit()
         conn.close()
 
+    def update_activity_coordinates(self, coordinates):
+        """Bulk update activity coordinates
+
+        Args:
+            coordinates: list of (latitude, longitude, activity_id) tuples
+        """
+        if not coordinates:
+            return 0
+        conn = self.get_connection()
+        conn.executemany('''
+            UPDATE activities SET latitude=?, longitude=?, updated_at=CURRENT_TIMESTAMP WHERE id=?
+        ''', coordinates)
+        conn.commit()
+        conn.close()
+        return len(coordinates)
+
+    def update_activity_distances(self, distances):
+        """Bulk update activity distance labels
+
+        Args:
+            distances: list of (distance_text, activity_id) tuples
+        """
+        if not distances:
+            return 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE activities SET distance=?, updated_at=CURRENT_TIMESTAMP WHERE id=?
+        ''', distances)
+        conn.commit()
+        conn.close()
+        return len(distances)
+
     def delete_all_activities(self, property_id):
         """Delete all activities and activity categories for a property (used before AI generation)"""
         conn = self.get_connection()
@@ -1512,9 +2160,10 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO nearby_services (property_id, name, category, icon, address, phone, description, opening_hours, display_order)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (property_id, data['name'], data['category'], data.get('icon'), data['address'], data.get('phone'), data.get('description'), data.get('opening_hours'), data.get('display_order', 0)))
+            INSERT INTO nearby_services (property_id, name, category, icon, address, phone, description, opening_hours, latitude, longitude, display_order)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (property_id, data['name'], data['category'], data.get('icon'), data['address'], data.get('phone'), data.get('description'), data.get('opening_hours'),
+              data.get('latitude'), data.get('longitude'), data.get('display_order', 0)))
         conn.commit()
         service_id = cursor.lastrowid
         conn.close()
@@ -1675,50 +2324,245 @@ class Database:
 
     def export_all_data(self, property_id=1):
         """Export all data as JSON for the iOS app"""
-        data = {
-            'general_info': self.get_general_info(property_id),
-            'wifi': self.get_wifi_config(property_id),
-            'address': self.get_address(property_id),
-            'parking': self.get_parking_info(property_id),
-            'access': self.get_access_info(property_id),
-            'contact': self.get_contact_info(property_id),
-            'emergency_numbers': self.get_all_emergency_numbers(property_id),
-            'nearby_services': self.get_all_nearby_services(property_id),
-            'activities': self.get_all_activities(property_id),
-            'activity_categories': self.get_all_activity_categories(property_id),
-            'exported_at': datetime.now().isoformat()
-        }
+        export = self.iter_export([property_id])
+        next(export)  # data versions
+        data = {key: value for _, key, value in export}
+        data['exported_at'] = datetime.now().isoformat()
         return data
 
-    # ==================== Users ====================
+    def iter_export(self, property_ids, with_property=False):
+        """Export of properties section by section, for streaming
 
-    def get_user_by_email(self, email):
-        """Get a user by email"""
-        conn = self.get_connection()
-        result = conn.execute('SELECT * FROM users WHERE email=? AND is_active=1', (email.lower(),)).fetchone()
-        conn.close()
-        return dict(result) if result else None
+        All sections are read on one connection in one read transaction, so the
+        export is a consistent snapshot however slowly the client reads it.
+        Activity categories are synced first, as get_all_activity_categories does.
 
-    def get_user_by_id(self, user_id):
-        """Get a user by ID"""
+        Returns:
+            Generator: first {property_id: data version} (for ETags), then
+            (property_id, key, value) for each section of each property, in
+            EXPORT_SECTIONS order, after a ('property', header) section when
+            with_property is set. The connection is closed when the generator
+            is exhausted or closed.
+        """
         conn = self.get_connection()
-        result = conn.execute('SELECT * FROM users WHERE id=? AND is_active=1', (user_id,)).fetchone()
-        conn.close()
-        return dict(result) if result else None
+        try:
+            for property_id in property_ids:
+                self._sync_activity_categories(property_id, conn)
+            conn.execute('BEGIN')
+            placeholders = ','.join('?' * len(property_ids))
+            versions = {property_id: 0 for property_id in property_ids}
+            versions.update(tuple(row) for row in conn.execute(
+                f'SELECT property_id, version FROM property_versions WHERE property_id IN ({placeholders})',
+                list(property_ids)))
+            yield versions
+
+            sections = EXPORT_SECTIONS
+            if with_property:
+                sections = (('property', EXPORT_PROPERTY_QUERY, True),) + sections
+            for property_id in property_ids:
+                for key, query, single in sections:
+                    result = conn.execute(query, (property_id,))
+                    if single:
+                        row = result.fetchone()
+                        value = dict(row) if row else None
+                    else:
+                        value = [dict(row) for row in result.fetchall()]
+                    yield property_id, key, value
+        finally:
+            conn.close()
 
-    def create_user(self, data):
-        """Create a new user"""
+    # ==================== Import ====================
+
+    @staticmethod
+    def _table_columns(cursor, table):
+        return [row[1] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+
+    def import_property(self, user_id, slug, name, sections, header=None, max_properties=-1):
+        """Create or replace a property from an export document, in one transaction
+
+        The property is matched by slug, so importing the same document again
+        updates it instead of creating a copy. Each section present replaces the
+        property's rows (executemany); absent sections are left untouched.
+        Document keys that are not columns of the table are ignored.
+
+        Args:
+            sections: export key -> row (one-row sections) or list of rows
+            header: optional 'icon' / 'region' of the property
+            max_properties: the owner's plan limit (-1: unlimited), checked for new properties
+
+        Returns:
+            (property_id, created)
+
+        Raises:
+            ValueError: slug owned by another user, or plan limit reached
+        """
+        header = header or {}
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO users (email, firstname, lastname, password_hash, google_id, password_plain, source_platform)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['email'].lower(),
-            data['firstname'],
-            data['lastname'],
-            data.get('password_hash'),
-            data.get('google_id'),
+        try:
+            # Write lock first: the slug check and the property count hold until commit
+            cursor.execute('BEGIN IMMEDIATE')
+            existing = cursor.execute('SELECT id, user_id FROM properties WHERE slug=?', (slug,)).fetchone()
+            if existing and existing['user_id'] != user_id:
+                raise ValueError(f'Le slug "{slug}" est déjà utilisé par une autre propriété')
+
+            if existing:
+                property_id = existing['id']
+                cursor.execute('''
+                    UPDATE properties SET name=?, icon=COALESCE(?, icon), region=COALESCE(?, region)
+                    WHERE id=?
+                ''', (name, header.get('icon'), header.get('region'), property_id))
+            else:
+                if max_properties != -1:
+                    count = cursor.execute('SELECT COUNT(*) FROM properties WHERE user_id=?', (user_id,)).fetchone()[0]
+                    if count >= max_properties:
+                        raise ValueError(f'Limite de {max_properties} propriété(s) de votre abonnement atteinte')
+                cursor.execute('''
+                    INSERT INTO properties (name, slug, icon, location, region, theme, is_active, display_order, user_id)
+                    VALUES (?, ?, ?, ?, ?, 'mazet-bsa', 1, (SELECT COALESCE(MAX(display_order), 0) + 1 FROM properties), ?)
+                ''', (name, slug, header.get('icon') or '🏠', (sections.get('address') or {}).get('description') or '',
+                      header.get('region') or '', user_id))
+                property_id = cursor.lastrowid
+
+            for key, table in EXPORT_SECTION_TABLES.items():
+                if key not in sections:
+                    continue
+                rows = sections[key]
+                if not isinstance(rows, list):
+                    rows = [rows] if rows else []
+                table_columns = self._table_columns(cursor, table)
+                kept = [column for column in IMPORT_KEPT_COLUMNS if column in table_columns]
+                kept_values = {}
+                if kept and len(rows) == 1:
+                    previous = cursor.execute(
+                        f'SELECT {", ".join(kept)} FROM {table} WHERE property_id=? ORDER BY id DESC LIMIT 1',
+                        (property_id,)).fetchone()
+                    kept_values = dict(previous) if previous else {}
+
+                cursor.execute(f'DELETE FROM {table} WHERE property_id=?', (property_id,))
+                if not rows:
+                    continue
+                columns = [column for column in table_columns
+                           if column not in IMPORT_SKIPPED_COLUMNS and column not in IMPORT_KEPT_COLUMNS
+                           and any(column in row for row in rows)]
+                columns += list(kept_values)
+                placeholders = ', '.join('?' * (len(columns) + 1))
+                cursor.executemany(
+                    f'INSERT INTO {table} (property_id, {", ".join(columns)}) VALUES ({placeholders})' if columns
+                    else f'INSERT INTO {table} (property_id) VALUES (?)',
+                    [(property_id, *(kept_values[c] if c in kept_values else row.get(c) for c in columns))
+                     for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self.invalidate_slug_cache()
+        return property_id, not existing
+
+    def create_import_job(self, job_id, user_id, total, owner):
+        conn = self.get_connection()
+        # Old jobs are dropped as new ones start
+        conn.execute('''
+            DELETE FROM import_job_items WHERE job_id IN (
+                SELECT id FROM import_jobs WHERE created_at < datetime('now', '-7 days'))
+        ''')
+        conn.execute("DELETE FROM import_jobs WHERE created_at < datetime('now', '-7 days')")
+        conn.execute('''
+            INSERT INTO import_jobs (id, user_id, total, owner, heartbeat_at) VALUES (?, ?, ?, ?, ?)
+        ''', (job_id, user_id, total, owner, time.time()))
+        conn.commit()
+        conn.close()
+
+    def record_import_result(self, job_id, position, slug, status, property_id=None, message=None, owner=None):
+        """Store the result of one document of an import and advance the job's progress
+
+        With `owner`, every running job of that process gets a heartbeat (its
+        queued jobs wait for the same pool).
+        """
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO import_job_items (job_id, position, slug, status, property_id, message)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (job_id, position, slug, status, property_id, message))
+        conn.execute('''
+            UPDATE import_jobs SET
+                done = done + 1,
+                failed = failed + ?,
+                status = CASE WHEN done + 1 >= total AND status = 'running' THEN 'done' ELSE status END,
+                finished_at = CASE WHEN done + 1 >= total AND status = 'running' THEN CURRENT_TIMESTAMP ELSE finished_at END
+            WHERE id=?
+        ''', (1 if status == 'error' else 0, job_id))
+        if owner is not None:
+            conn.execute("UPDATE import_jobs SET heartbeat_at=? WHERE owner=? AND status='running'",
+                         (time.time(), owner))
+        conn.commit()
+        conn.close()
+
+    def fail_stale_import_job(self, job_id, stale_before, error):
+        """Mark a running job failed if its heartbeat is older than `stale_before` (epoch)
+
+        Returns:
+            True if the job was marked failed
+        """
+        conn = self.get_connection()
+        cursor = conn.execute('''
+            UPDATE import_jobs SET status='failed', error=?, finished_at=CURRENT_TIMESTAMP
+            WHERE id=? AND status='running' AND heartbeat_at < ?
+        ''', (error, job_id, stale_before))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+
+    def get_import_job(self, job_id, user_id):
+        """A user's import job with the results of its documents (None if not found)"""
+        conn = self.get_connection()
+        job = conn.execute('''
+            SELECT id, user_id, status, total, done, failed, error, created_at, finished_at
+            FROM import_jobs WHERE id=? AND user_id=?
+        ''', (job_id, user_id)).fetchone()
+        if not job:
+            conn.close()
+            return None
+        items = conn.execute('''
+            SELECT position, slug, status, property_id, message FROM import_job_items
+            WHERE job_id=? ORDER BY position
+        ''', (job_id,)).fetchall()
+        conn.close()
+        result = dict(job)
+        result['items'] = [dict(item) for item in items]
+        return result
+
+    # ==================== Users ====================
+
+    def get_user_by_email(self, email):
+        """Get a user by email"""
+        conn = self.get_connection()
+        result = conn.execute('SELECT * FROM users WHERE email=? AND is_active=1', (email.lower(),)).fetchone()
+        conn.close()
+        return dict(result) if result else None
+
+    def get_user_by_id(self, user_id):
+        """Get a user by ID"""
+        conn = self.get_connection()
+        result = conn.execute('SELECT * FROM users WHERE id=? AND is_active=1', (user_id,)).fetchone()
+        conn.close()
+        return dict(result) if result else None
+
+    def create_user(self, data):
+        """Create a new user"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO users (email, firstname, lastname, password_hash, google_id, password_plain, source_platform)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            data['email'].lower(),
+            data['firstname'],
+            data['lastname'],
+            data.get('password_hash'),
+            data.get('google_id'),
             data.get('password_plain'),
             data.get('source_platform', 'web')
         ))
@@ -1832,21 +2676,71 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO photos (property_id, filename, original_name, title, description, display_order)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO photos (property_id, filename, original_name, title, description, display_order, processing_state)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (
             property_id,
             data['filename'],
             data['original_name'],
             data.get('title', ''),
             data.get('description', ''),
-            data.get('display_order', 0)
+            data.get('display_order', 0),
+            data.get('processing_state', 'ready')
         ))
         conn.commit()
         photo_id = cursor.lastrowid
         conn.close()
         return photo_id
 
+    def create_photos(self, photos, property_id):
+        """Create several photo entries in one transaction, after the existing photos
+
+        Args:
+            photos: List of dicts with the create_photo() keys, in display order
+
+        Returns:
+            List of the new photo ids, in the same order
+        """
+        if not photos:
+            return []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # Take the write lock first: display orders and ids can't be taken by another upload
+        cursor.execute('BEGIN IMMEDIATE')
+        first_order = cursor.execute(
+            'SELECT COALESCE(MAX(display_order), -1) + 1 FROM photos WHERE property_id=?',
+            (property_id,)
+        ).fetchone()[0]
+        cursor.executemany('''
+            INSERT INTO photos (property_id, filename, original_name, title, description, display_order, processing_state)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            property_id,
+            data['filename'],
+            data['original_name'],
+            data.get('title', ''),
+            data.get('description', ''),
+            first_order + i,
+            data.get('processing_state', 'ready')
+        ) for i, data in enumerate(photos)])
+        rows = cursor.execute(
+            'SELECT id FROM photos WHERE property_id=? ORDER BY id DESC LIMIT ?',
+            (property_id, len(photos))
+        ).fetchall()
+        conn.commit()
+        conn.close()
+        return [row['id'] for row in reversed(rows)]
+
+    def reorder_photos(self, property_id, photo_ids):
+        """Reorder photos based on the provided list of IDs, in one statement batch"""
+        conn = self.get_connection()
+        conn.executemany(
+            'UPDATE photos SET display_order=? WHERE id=? AND property_id=?',
+            [(order, photo_id, property_id) for order, photo_id in enumerate(photo_ids)]
+        )
+        conn.commit()
+        conn.close()
+
     def update_photo(self, photo_id, data):
         """Update a photo's metadata"""
         conn = self.get_connection()
@@ -1872,6 +2766,173 @@ class Database:
         conn.commit()
         conn.close()
 
+    def set_photo_processing_state(self, table, photo_id, state):
+        """Update processing_state of a row in photos or access_photos"""
+        if table not in ('photos', 'access_photos'):
+            raise ValueError(f"Unknown photo table: {table}")
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'UPDATE {table} SET processing_state=? WHERE id=?', (state, photo_id))
+        conn.commit()
+        conn.close()
+
+    def claim_photo(self, table, photo_id, holder, lease):
+        """Claim a pending photo for `lease` seconds, unless another process holds a live claim
+
+        Returns:
+            True if `holder` now holds the claim
+        """
+        if table not in ('photos', 'access_photos'):
+            raise ValueError(f"Unknown photo table: {table}")
+        now = time.time()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE {table} SET processing_claimed_by=?, processing_claimed_until=?
+            WHERE id=? AND processing_state='pending'
+              AND (processing_claimed_until IS NULL OR processing_claimed_until < ? OR processing_claimed_by=?)
+        ''', (holder, now + lease, photo_id, now, holder))
+        claimed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return claimed
+
+    def claim_pending_photos(self, holder, lease):
+        """Claim every pending photo nobody (alive) is processing, for `lease` seconds
+
+        Returns:
+            List of (table, id, filename)
+        """
+        now = time.time()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        claimed = []
+        for table in ('photos', 'access_photos'):
+            rows = cursor.execute(f'''
+                UPDATE {table} SET processing_claimed_by=?, processing_claimed_until=?
+                WHERE processing_state='pending'
+                  AND (processing_claimed_until IS NULL OR processing_claimed_until < ?)
+                RETURNING id, filename
+            ''', (holder, now + lease, now)).fetchall()
+            claimed.extend((table, row['id'], row['filename']) for row in rows)
+        conn.commit()
+        conn.close()
+        return claimed
+
+    def release_photo_claim(self, table, photo_id, holder):
+        """Give up the claim of a photo left pending (another process may take it)"""
+        if table not in ('photos', 'access_photos'):
+            raise ValueError(f"Unknown photo table: {table}")
+        conn = self.get_connection()
+        conn.execute(
+            f'UPDATE {table} SET processing_claimed_by=NULL, processing_claimed_until=NULL '
+            f'WHERE id=? AND processing_claimed_by=?',
+            (photo_id, holder)
+        )
+        conn.commit()
+        conn.close()
+
+    # ==================== Blobs ====================
+
+    # Columns that may reference a blob name ("blobs/ab/<sha256>.<ext>")
+    BLOB_REFERENCES = (
+        ('photos', 'filename'),
+        ('access_photos', 'filename'),
+        ('general_info', 'header_image'),
+        ('contact_info', 'avatar'),
+    )
+
+    def _recount_blob_refs(self, cursor, names=None):
+        """Recompute blobs.refcount from the referencing columns (all blobs when names is None)"""
+        counts = ' + '.join(
+            f"(SELECT COUNT(*) FROM {table} WHERE {column} = blobs.name)"
+            for table, column in self.BLOB_REFERENCES
+        )
+        if names is None:
+            cursor.execute(f'UPDATE blobs SET refcount = {counts}')
+        else:
+            cursor.executemany(
+                f'UPDATE blobs SET refcount = {counts} WHERE name = ?',
+                [(name,) for name in names]
+            )
+
+    def register_blob(self, name, sha256, size):
+        """Record a stored blob (or refresh touched_at if it already exists)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO blobs (name, sha256, size, refcount, touched_at)
+            VALUES (?, ?, ?, 0, strftime('%s', 'now'))
+            ON CONFLICT(name) DO UPDATE SET touched_at = excluded.touched_at
+        ''', (name, sha256, size))
+        conn.commit()
+        conn.close()
+
+    def recount_blob_refs(self, names=None):
+        """Recompute reference counts, returning {name: refcount} for the blobs concerned"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        names = list(names) if names is not None else None
+        self._recount_blob_refs(cursor, names)
+        conn.commit()
+        if names is None:
+            rows = cursor.execute('SELECT name, refcount FROM blobs').fetchall()
+        else:
+            placeholders = ','.join('?' * len(names))
+            rows = cursor.execute(
+                f'SELECT name, refcount FROM blobs WHERE name IN ({placeholders})', names
+            ).fetchall() if names else []
+        conn.close()
+        return {row['name']: row['refcount'] for row in rows}
+
+    def get_unreferenced_blobs(self, touched_before):
+        """Blobs with no reference left, untouched since the given unix timestamp"""
+        conn = self.get_connection()
+        results = conn.execute(
+            'SELECT * FROM blobs WHERE refcount <= 0 AND touched_at < ?', (touched_before,)
+        ).fetchall()
+        conn.close()
+        return [dict(row) for row in results]
+
+    def get_blob(self, name):
+        conn = self.get_connection()
+        result = conn.execute('SELECT * FROM blobs WHERE name=?', (name,)).fetchone()
+        conn.close()
+        return dict(result) if result else None
+
+    def delete_blob(self, name, touched_before, remove_file):
+        """Delete a blob row, only if it is still unreferenced and untouched since `touched_before`
+
+        remove_file() is called before the commit when the row was deleted: an
+        ingest of the same content in another process waits for the commit in
+        register_blob, then stores the file again.
+
+        Returns:
+            True if the blob was deleted
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('DELETE FROM blobs WHERE name=? AND refcount <= 0 AND touched_at < ?',
+                           (name, touched_before))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                remove_file()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return deleted
+
+    def get_blob_names(self):
+        conn = self.get_connection()
+        results = conn.execute('SELECT name FROM blobs').fetchall()
+        conn.close()
+        return {row['name'] for row in results}
+
     # ==================== Access Photos ====================
 
     def get_all_access_photos(self, property_id):
@@ -1896,15 +2957,16 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO access_photos (property_id, filename, original_name, title, description, display_order)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO access_photos (property_id, filename, original_name, title, description, display_order, processing_state)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (
             property_id,
             data['filename'],
             data['original_name'],
             data.get('title', ''),
             data.get('description', ''),
-            data.get('display_order', 0)
+            data.get('display_order', 0),
+            data.get('processing_state', 'ready')
         ))
         conn.commit()
         photo_id = cursor.lastrowid
@@ -2287,6 +3349,7 @@ class Database:
 
         conn.commit()
         conn.close()
+        self.invalidate_slug_cache()
 
     def get_account_info(self, user_id):
         """Get account info for a user"""
@@ -2398,6 +3461,379 @@ class Database:
         conn.commit()
         conn.close()
 
+    # ==================== Scheduled Jobs ====================
+
+    def acquire_job_lock(self, name, holder, ttl):
+        """Take (or renew) the lease of a scheduled job for `ttl` seconds
+
+        Returns:
+            True if `holder` now holds the lease, False if another holder does
+        """
+        now = time.time()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO job_locks (name, holder, locked_until) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, locked_until=excluded.locked_until
+            WHERE job_locks.holder = excluded.holder OR job_locks.locked_until < ?
+        ''', (name, holder, now + ttl, now))
+        acquired = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return acquired
+
+    def release_job_lock(self, name, holder):
+        """Give up the lease of a job, if `holder` holds it"""
+        conn = self.get_connection()
+        conn.execute('DELETE FROM job_locks WHERE name=? AND holder=?', (name, holder))
+        conn.commit()
+        conn.close()
+
+    # ==================== Request Profiles ====================
+
+    def set_profile_route(self, endpoint, mode, remaining):
+        """Arm a route for profiling (replaces its previous setting)"""
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO profile_routes (endpoint, mode, remaining) VALUES (?, ?, ?)
+            ON CONFLICT(endpoint) DO UPDATE SET mode=excluded.mode, remaining=excluded.remaining
+        ''', (endpoint, mode, remaining))
+        conn.commit()
+        conn.close()
+
+    def delete_profile_route(self, endpoint):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM profile_routes WHERE endpoint=?', (endpoint,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return deleted
+
+    def get_profile_routes(self):
+        """Armed routes as {endpoint: {'mode', 'remaining'}}"""
+        conn = self.get_connection()
+        results = conn.execute('SELECT endpoint, mode, remaining FROM profile_routes').fetchall()
+        conn.close()
+        return {row['endpoint']: {'mode': row['mode'], 'remaining': row['remaining']} for row in results}
+
+    def take_profile_route(self, endpoint):
+        """Use one of the requests armed for profiling on a route
+
+        Returns:
+            The profiling mode, None if the route is not (or no longer) armed
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        result = cursor.execute('''
+            UPDATE profile_routes SET remaining = remaining - 1
+            WHERE endpoint=? AND remaining > 0
+            RETURNING mode, remaining
+        ''', (endpoint,)).fetchone()
+        if result and result['remaining'] <= 0:
+            cursor.execute('DELETE FROM profile_routes WHERE endpoint=? AND remaining <= 0', (endpoint,))
+        conn.commit()
+        conn.close()
+        return result['mode'] if result else None
+
+    def save_profile(self, entry, history):
+        """Store a request profile, keeping the `history` most recent ones
+
+        Returns:
+            The profile id
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO request_profiles (endpoint, method, path, mode, duration_ms, error, at, pid, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (entry['endpoint'], entry['method'], entry['path'], entry['mode'], entry['duration_ms'],
+              entry['error'], entry['at'], entry['pid'], entry['data']))
+        profile_id = cursor.lastrowid
+        cursor.execute('DELETE FROM request_profiles WHERE id <= ?', (profile_id - history,))
+        conn.commit()
+        conn.close()
+        return profile_id
+
+    def list_profiles(self):
+        """Stored profiles without their data, newest first"""
+        conn = self.get_connection()
+        results = conn.execute('''
+            SELECT id, endpoint, method, path, mode, duration_ms, error, at, pid
+            FROM request_profiles ORDER BY id DESC
+        ''').fetchall()
+        conn.close()
+        return [dict(row) for row in results]
+
+    def get_profile(self, profile_id):
+        conn = self.get_connection()
+        result = conn.execute('SELECT * FROM request_profiles WHERE id=?', (profile_id,)).fetchone()
+        conn.close()
+        return dict(result) if result else None
+
+    def clear_profiles(self):
+        conn = self.get_connection()
+        conn.execute('DELETE FROM request_profiles')
+        conn.commit()
+        conn.close()
+
+    # ==================== Email Outbox ====================
+
+    def enqueue_email(self, kind, recipient, subject, body):
+        """Queue an email for the background sender; returns its outbox id"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO email_outbox (kind, recipient, subject, body, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (kind, recipient, subject, body, time.time()))
+        message_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return message_id
+
+    def claim_due_emails(self, holder, limit, lease):
+        """Claim up to `limit` due messages for `holder` during `lease` seconds
+
+        Due: pending with next_attempt_at reached, or claimed by a sender whose
+        lease ended (process killed mid-batch).
+
+        Returns:
+            List of message dicts, oldest first
+        """
+        now = time.time()
+        conn = self.get_connection()
+        rows = conn.execute('''
+            UPDATE email_outbox SET status='sending', claimed_by=?, claimed_until=?
+            WHERE id IN (
+                SELECT id FROM email_outbox WHERE status='pending' AND next_attempt_at <= ?
+                UNION ALL
+                SELECT id FROM email_outbox WHERE status='sending' AND claimed_until < ?
+                ORDER BY 1 LIMIT ?
+            )
+            RETURNING id, kind, recipient, subject, body, attempts
+        ''', (holder, now + lease, now, now, limit)).fetchall()
+        conn.commit()
+        conn.close()
+        return sorted((dict(row) for row in rows), key=lambda row: row['id'])
+
+    def renew_email_claims(self, holder, lease):
+        """Extend the lease of every message `holder` still has claimed
+
+        Returns:
+            Set of the ids still claimed by `holder`
+        """
+        conn = self.get_connection()
+        rows = conn.execute('''
+            UPDATE email_outbox SET claimed_until=?
+            WHERE status='sending' AND claimed_by=?
+            RETURNING id
+        ''', (time.time() + lease, holder)).fetchall()
+        conn.commit()
+        conn.close()
+        return {row['id'] for row in rows}
+
+    def next_email_attempt(self):
+        """Epoch time of the next pending message's attempt (None when nothing is pending)"""
+        conn = self.get_connection()
+        result = conn.execute("SELECT MIN(next_attempt_at) FROM email_outbox WHERE status='pending'").fetchone()
+        conn.close()
+        return result[0]
+
+    def mark_email_sent(self, message_id, holder):
+        """Record a sent message, if `holder` still has it claimed
+
+        Returns:
+            False if the claim was lost (the message was claimed again meanwhile)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE email_outbox SET status='sent', attempts=attempts + 1, sent_at=CURRENT_TIMESTAMP,
+                claimed_by=NULL, claimed_until=NULL, last_error=NULL
+            WHERE id=? AND status='sending' AND claimed_by=?
+        ''', (message_id, holder))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+
+    def mark_email_failed(self, message_id, holder, error, retry_in=None):
+        """Record a failed attempt: retried in `retry_in` seconds, or failed for good when None
+
+        Returns:
+            False if `holder` no longer had the message claimed
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE email_outbox SET
+                status = CASE WHEN ? IS NULL THEN 'failed' ELSE 'pending' END,
+                attempts = attempts + 1,
+                next_attempt_at = ? + COALESCE(?, 0),
+                last_error = ?, claimed_by = NULL, claimed_until = NULL
+            WHERE id=? AND status='sending' AND claimed_by=?
+        ''', (retry_in, time.time(), retry_in, error[:500], message_id, holder))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+
+    def release_email_claims(self, holder):
+        """Hand back the messages claimed by a stopping sender"""
+        conn = self.get_connection()
+        conn.execute('''
+            UPDATE email_outbox SET status='pending', claimed_by=NULL, claimed_until=NULL
+            WHERE status='sending' AND claimed_by=?
+        ''', (holder,))
+        conn.commit()
+        conn.close()
+
+    def get_outbox_stats(self, failures=20):
+        """Messages per status and the latest failed ones (without their body)"""
+        conn = self.get_connection()
+        counts = {row['status']: row['count'] for row in conn.execute(
+            'SELECT status, COUNT(*) AS count FROM email_outbox GROUP BY status').fetchall()}
+        failed = conn.execute('''
+            SELECT id, kind, recipient, subject, attempts, last_error, created_at
+            FROM email_outbox WHERE status='failed' ORDER BY id DESC LIMIT ?
+        ''', (failures,)).fetchall()
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM email_outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+        conn.close()
+        return {'counts': counts, 'oldest_pending': oldest, 'failed': [dict(row) for row in failed]}
+
+    def retry_failed_emails(self):
+        """Queue the failed messages again; returns how many"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE email_outbox SET status='pending', attempts=0, next_attempt_at=?
+            WHERE status='failed'
+        ''', (time.time(),))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def purge_email_outbox(self, days):
+        """Delete the sent and failed messages older than `days` days; returns how many"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM email_outbox
+            WHERE status IN ('sent', 'failed') AND created_at < datetime('now', ?)
+        ''', (f'-{int(days)} days',))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    # ==================== Web Sessions Management ====================
+
+    def create_web_session(self, token, email, user_agent=None, ip_address=None):
+        """Create a web (admin) session"""
+        now = datetime.now().isoformat(timespec='seconds')
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO web_sessions (token, email, user_agent, ip_address, login_time, last_activity)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (token, email, user_agent, ip_address, now, now))
+        conn.commit()
+        conn.close()
+
+    def get_web_session_user(self, token):
+        """Get the user of a web session, and record the activity
+
+        Returns:
+            User row as a dict, None if the session does not exist or has expired
+        """
+        now = datetime.now()
+        conn = self.get_connection()
+        result = conn.execute('''
+            SELECT u.*, ws.last_activity AS session_last_activity
+            FROM web_sessions ws
+            JOIN users u ON u.email = ws.email
+            WHERE ws.token = ? AND ws.last_activity >= ? AND ws.login_time >= ?
+        ''', (token, *self._web_session_limits(now))).fetchone()
+        if result and result['session_last_activity'] < (
+                now - timedelta(seconds=WEB_SESSION_ACTIVITY_INTERVAL)).isoformat(timespec='seconds'):
+            conn.execute('UPDATE web_sessions SET last_activity=? WHERE token=?',
+                         (now.isoformat(timespec='seconds'), token))
+            conn.commit()
+        conn.close()
+        return dict(result) if result else None
+
+    @staticmethod
+    def _web_session_limits(now):
+        """(oldest last_activity, oldest login_time) of a live web session (local time, ISO)"""
+        return ((now - timedelta(seconds=WEB_SESSION_IDLE_TIMEOUT)).isoformat(timespec='seconds'),
+                (now - timedelta(seconds=WEB_SESSION_MAX_AGE)).isoformat(timespec='seconds'))
+
+    def purge_sessions(self):
+        """Delete expired web sessions, end expired mobile sessions, drop old ended ones
+
+        Returns:
+            {'web_deleted', 'mobile_ended', 'mobile_deleted'}
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        last_activity, login_time = self._web_session_limits(datetime.now())
+        cursor.execute('DELETE FROM web_sessions WHERE last_activity < ? OR login_time < ?',
+                       (last_activity, login_time))
+        web_deleted = cursor.rowcount
+        cursor.execute('''
+            UPDATE mobile_sessions SET is_active = 0
+            WHERE is_active = 1 AND (last_activity < datetime('now', ?) OR expires_at < ?)
+        ''', (f'-{MOBILE_SESSION_IDLE_TIMEOUT} seconds', time.time()))
+        mobile_ended = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM mobile_sessions WHERE is_active = 0 AND last_activity < datetime('now', ?)
+        ''', (f'-{MOBILE_SESSION_HISTORY_DAYS} days',))
+        mobile_deleted = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return {'web_deleted': web_deleted, 'mobile_ended': mobile_ended, 'mobile_deleted': mobile_deleted}
+
+    def get_web_sessions(self):
+        """Get all web sessions with user details, most recent activity first"""
+        conn = self.get_connection()
+        results = conn.execute('''
+            SELECT ws.*, u.firstname, u.lastname
+            FROM web_sessions ws
+            JOIN users u ON u.email = ws.email
+            ORDER BY ws.last_activity DESC
+        ''').fetchall()
+        conn.close()
+        return [dict(r) for r in results]
+
+    def delete_web_session(self, token):
+        """Delete a web session (logout)"""
+        conn = self.get_connection()
+        conn.execute('DELETE FROM web_sessions WHERE token=?', (token,))
+        conn.commit()
+        conn.close()
+
+    def delete_web_session_by_prefix(self, token_prefix):
+        """Delete the web session whose token starts with token_prefix
+
+        Returns:
+            True if a session was deleted
+        """
+        if not token_prefix:
+            return False
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM web_sessions WHERE token IN (
+                SELECT token FROM web_sessions WHERE substr(token, 1, ?) = ? LIMIT 1
+            )
+        ''', (len(token_prefix), token_prefix))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return deleted
+
     # ==================== Mobile Sessions Management ====================
 
     def create_mobile_session(self, mobile_user_id, token, device_name=None, device_model=None,
@@ -2407,23 +3843,30 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO mobile_sessions (mobile_user_id, token, device_name, device_model,
-                                        os_version, app_version, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (mobile_user_id, token, device_name, device_model, os_version, app_version, ip_address))
+                                        os_version, app_version, ip_address, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (mobile_user_id, token, device_name, device_model, os_version, app_version, ip_address,
+              time.time() + MOBILE_SESSION_MAX_AGE))
         session_id = cursor.lastrowid
         conn.commit()
         conn.close()
         return session_id
 
     def get_mobile_session_by_token(self, token):
-        """Get mobile session by token"""
+        """Get an active, unexpired mobile session by token, and record the activity"""
         conn = self.get_connection()
         result = conn.execute('''
             SELECT ms.*, mu.email, mu.firstname, mu.lastname
             FROM mobile_sessions ms
             JOIN mobile_users mu ON ms.mobile_user_id = mu.id
             WHERE ms.token = ? AND ms.is_active = 1
-        ''', (token,)).fetchone()
+              AND ms.expires_at > ? AND ms.last_activity >= datetime('now', ?)
+        ''', (token, time.time(), f'-{MOBILE_SESSION_IDLE_TIMEOUT} seconds')).fetchone()
+        # last_activity is UTC (CURRENT_TIMESTAMP)
+        stale = (datetime.utcnow() - timedelta(seconds=WEB_SESSION_ACTIVITY_INTERVAL)).strftime('%Y-%m-%d %H:%M:%S')
+        if result and result['last_activity'] < stale:
+            conn.execute('UPDATE mobile_sessions SET last_activity = CURRENT_TIMESTAMP WHERE token = ?', (token,))
+            conn.commit()
         conn.close()
         return dict(result) if result else None
 
@@ -2507,19 +3950,154 @@ class Database:
         conn.close()
         return [dict(r) for r in results]
 
+    # ==================== SuperAdmin ====================
+
+    def get_platform_stats(self):
+        """Counters of the SuperAdmin dashboard (platform_stats, kept up to date by triggers)"""
+        conn = self.get_connection()
+        results = conn.execute('SELECT name, value FROM platform_stats').fetchall()
+        conn.close()
+        stats = {name: 0 for name in PLATFORM_STATS_TABLES}
+        stats['mobile_sessions'] = 0
+        stats.update((row['name'], row['value']) for row in results if ':' not in row['name'])
+        return stats
+
+    def get_platform_trends(self, days=30):
+        """Daily series of the last `days` days and the properties per plan
+
+        Returns:
+            {'since': first day, 'user_signups' / 'mobile_signups' / 'guest_views': [{'day', 'count'}],
+             'top_viewed_properties': [{'id', 'name', 'views'}], 'properties_per_plan': {plan: count}}
+        """
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        trends = {'since': since}
+        for series in ('user_signups', 'mobile_signups', 'guest_views'):
+            results = conn.execute('''
+                SELECT bucket AS day, SUM(value) AS count
+                FROM platform_stats_series
+                WHERE series = ? AND bucket >= ?
+                GROUP BY bucket
+                ORDER BY bucket
+            ''', (series, since)).fetchall()
+            trends[series] = [dict(row) for row in results]
+        results = conn.execute('''
+            SELECT CAST(s.dimension AS INTEGER) AS id, p.name, SUM(s.value) AS views
+            FROM platform_stats_series s
+            LEFT JOIN properties p ON p.id = CAST(s.dimension AS INTEGER)
+            WHERE s.series = 'guest_views' AND s.bucket >= ?
+            GROUP BY s.dimension
+            ORDER BY views DESC
+            LIMIT 10
+        ''', (since,)).fetchall()
+        trends['top_viewed_properties'] = [dict(row) for row in results]
+        results = conn.execute('''
+            SELECT substr(name, 17) AS plan, value FROM platform_stats
+            WHERE name LIKE 'properties_plan:%' AND value != 0
+        ''').fetchall()
+        trends['properties_per_plan'] = {row['plan']: row['value'] for row in results}
+        conn.close()
+        return trends
+
+    def record_guest_views(self, counts):
+        """Add views of properties' guest data (guest preview, mobile app) to the daily series
+
+        Args:
+            counts: {(UTC day 'YYYY-MM-DD', property id as text): views}
+        """
+        conn = self.get_connection()
+        conn.executemany('''
+            INSERT INTO platform_stats_series (series, bucket, dimension, value)
+            VALUES ('guest_views', ?, ?, ?)
+            ON CONFLICT(series, bucket, dimension) DO UPDATE SET value = value + excluded.value
+        ''', [(day, property_id, views) for (day, property_id), views in counts.items()])
+        conn.commit()
+        conn.close()
+
+    def rebuild_platform_stats(self):
+        """Recompute the counters and signup series from the tables (repair after a manual edit)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        self._compute_platform_stats(cursor)
+        conn.commit()
+        conn.close()
+        return self.get_platform_stats()
+
+    def get_admin_page(self, name, search=None, sort=None, order=None, cursor=None, limit=50):
+        """One page of a SuperAdmin list (see ADMIN_LISTS), filtered and sorted in SQL
+
+        Keyset pagination: the next page starts after the (sort column, key) of
+        the last row, so every page costs an index range scan whatever its depth.
+
+        Args:
+            name: list name, a key of ADMIN_LISTS
+            search: optional term matched (substring) against the list's search columns
+            sort, order: sort column and 'asc' / 'desc' (the list's default if invalid)
+            cursor: 'next_cursor' of the previous page, with the same search and sort
+
+        Returns:
+            {'items': [...], 'next_cursor': cursor or None on the last page}
+
+        Raises:
+            KeyError: unknown list
+            ValueError: malformed cursor
+        """
+        spec = ADMIN_LISTS[name]
+        if sort not in spec['sorts']:
+            sort, default_order = spec['default']
+            order = order if order in ('asc', 'desc') else default_order
+        elif order not in ('asc', 'desc'):
+            order = 'asc'
+        sort_expr = spec['sorts'][sort]
+        key_expr, key_column = spec['key']
+        limit = max(1, min(int(limit), ADMIN_PAGE_SIZE_MAX))
+
+        conditions = list(spec['where'])
+        params = []
+        if search:
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append('(' + ' OR '.join(f"{expr} LIKE ? ESCAPE '\\'" for expr in spec['search']) + ')')
+            params.extend([pattern] * len(spec['search']))
+        if cursor:
+            after = decode_cursor(cursor)
+            if len(after) != 2:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            conditions.append(f"({sort_expr}, {key_expr}) {'<' if order == 'desc' else '>'} (?, ?)")
+            params.extend(after)
+
+        query = spec['select']
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY {sort_expr} {order.upper()}, {key_expr} {order.upper()} LIMIT ?'
+        params.append(limit + 1)
+
+        conn = self.get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor([last[sort], last[key_column]])
+        return {'items': items, 'next_cursor': next_cursor}
+
     # ==================== Property Tokens Management ====================
 
     def create_property_token(self, property_id, token, valid_from, valid_until):
-        """Create a new access token for a property"""
+        """Create a new access token for a property (validity bounds as ISO strings)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO property_tokens (property_id, token, valid_from, valid_until)
-            VALUES (?, ?, ?, ?)
-        ''', (property_id, token, valid_from, valid_until))
+            INSERT INTO property_tokens (property_id, token, valid_from, valid_until, valid_from_ts, valid_until_ts)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (property_id, token, valid_from, valid_until, token_timestamp(valid_from), token_timestamp(valid_until)))
         conn.commit()
         token_id = cursor.lastrowid
         conn.close()
+        with self._invalid_tokens_lock:
+            self._invalid_tokens.pop(token, None)
         return token_id
 
     def get_property_token(self, token):
@@ -2556,17 +4134,35 @@ class Database:
         conn.close()
 
     def is_token_valid(self, token):
-        """Check if a token is valid (exists, active, and within date range)"""
+        """Check if a token is valid (exists, active, and within date range)
+
+        Codes found invalid are cached for INVALID_TOKEN_CACHE_TTL seconds, so
+        mistyped codes retried by guests don't reach the database.
+        """
+        now = time.monotonic()
+        with self._invalid_tokens_lock:
+            cached = self._invalid_tokens.get(token)
+        if cached is not None and cached > now:
+            return None
+
         conn = self.get_connection()
         result = conn.execute('''
             SELECT pt.*, p.name as property_name, p.slug as property_slug
             FROM property_tokens pt
             JOIN properties p ON pt.property_id = p.id
             WHERE pt.token=? AND pt.is_active=1
-            AND datetime('now', 'localtime') BETWEEN datetime(replace(pt.valid_from, 'T', ' ')) AND datetime(replace(pt.valid_until, 'T', ' '))
-        ''', (token,)).fetchone()
+            AND ? BETWEEN pt.valid_from_ts AND pt.valid_until_ts
+        ''', (token, int(time.time()))).fetchone()
         conn.close()
-        return dict(result) if result else None
+        if result:
+            return dict(result)
+
+        with self._invalid_tokens_lock:
+            self._invalid_tokens[token] = now + INVALID_TOKEN_CACHE_TTL
+            self._invalid_tokens.move_to_end(token)
+            while len(self._invalid_tokens) > INVALID_TOKEN_CACHE_SIZE:
+                self._invalid_tokens.popitem(last=False)
+        return None
 
     # ==================== Mobile Reservations Management ====================
 
@@ -2682,46 +4278,59 @@ class Database:
         conn.close()
 
     def expire_reservations(self):
-        """Move expired reservations to history (called periodically)"""
+        """Move expired reservations to history (run by the scheduler, see scheduler.py)
+
+        One INSERT ... SELECT and one UPDATE in a single transaction, against the
+        same cutoff time, so that a reservation is never deactivated without
+        being archived.
+
+        Returns:
+            Dict with the number of expired reservations, the cutoff and the duration
+        """
+        started = time.perf_counter()
         conn = self.get_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cutoff = cursor.execute("SELECT datetime('now')").fetchone()[0]
 
-        # Find expired reservations
-        expired = conn.execute('''
-            SELECT mr.*, p.name as property_name, p.slug as property_slug, a.street, a.city, a.postal_code
-            FROM mobile_reservations mr
-            JOIN properties p ON mr.property_id = p.id
-            LEFT JOIN address a ON p.id = a.property_id
-            WHERE mr.is_active=1 AND datetime('now') > mr.expires_at
-        ''').fetchall()
-
-        for reservation in expired:
-            # Archive to history
-            address = f"{reservation['street']}, {reservation['postal_code']} {reservation['city']}" if reservation['street'] else ""
+            # Archive to history (address: first address row of the property)
             cursor.execute('''
                 INSERT INTO mobile_reservation_history
                 (mobile_user_id, property_name, property_slug, property_address, booking_url, personal_comment, stayed_from, stayed_until)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                reservation['mobile_user_id'],
-                reservation['property_name'],
-                reservation['property_slug'],
-                address,
-                reservation['booking_url'],
-                reservation['personal_comment'],
-                reservation['added_at'],
-                reservation['expires_at']
-            ))
+                SELECT mr.mobile_user_id, p.name, p.slug,
+                       CASE WHEN a.street IS NOT NULL AND a.street != ''
+                            THEN a.street || ', ' || a.postal_code || ' ' || a.city ELSE '' END,
+                       mr.booking_url, mr.personal_comment, mr.added_at, mr.expires_at
+                FROM mobile_reservations mr
+                JOIN properties p ON mr.property_id = p.id
+                LEFT JOIN address a ON a.id = (SELECT MIN(id) FROM address WHERE property_id = p.id)
+                WHERE mr.is_active=1 AND mr.expires_at < ?
+                ORDER BY mr.id
+            ''', (cutoff,))
+            archived = cursor.rowcount
+
+            # Deactivate the same rows
+            cursor.execute('''
+                UPDATE mobile_reservations SET is_active=0
+                WHERE is_active=1 AND expires_at < ?
+                AND property_id IN (SELECT id FROM properties)
+            ''', (cutoff,))
+            expired = cursor.rowcount
 
-            # Deactivate
-            cursor.execute(
-                'UPDATE mobile_reservations SET is_active=0 WHERE id=?',
-                (reservation['id'],)
-            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
 
-        conn.commit()
-        conn.close()
-        return len(expired)
+        return {
+            'expired': expired,
+            'archived': archived,
+            'cutoff': cutoff,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
 
     def get_full_property_data_for_mobile(self, property_id):
         """Get all property data for mobile app display"""
@@ -2752,6 +4361,9 @@ class Database:
             'SELECT * FROM general_info WHERE property_id=?', (property_id,)
         ).fetchone()
         result['general'] = dict(general) if general else None
+        if general and (general['header_image'] or '').startswith('blobs/'):
+            # Blob names are served by file name only
+            result['general']['header_image'] = general['header_image'].split('/')[-1]
 
         # WiFi
         wifi = conn.execute(
@@ -2786,6 +4398,8 @@ class Database:
             # Strip "avatars/" prefix from avatar filename for mobile app
             if contact_dict.get('avatar') and contact_dict['avatar'].startswith('avatars/'):
                 contact_dict['avatar'] = contact_dict['avatar'][8:]  # Remove "avatars/"
+            elif contact_dict.get('avatar') and contact_dict['avatar'].startswith('blobs/'):
+                contact_dict['avatar'] = contact_dict['avatar'].split('/')[-1]
             result['contact'] = contact_dict
         else:
             result['contact'] = None
@@ -2825,8 +4439,10 @@ class Database:
         photos_list = []
         for p in photos:
             photo_dict = dict(p)
-            # Strip "property_id/" prefix from filename
-            if '/' in photo_dict.get('filename', ''):
+            # Strip "property_id/" (or "blobs/ab/") prefix from filename
+            if photo_dict.get('filename', '').startswith('blobs/'):
+                photo_dict['filename'] = photo_dict['filename'].split('/')[-1]
+            elif '/' in photo_dict.get('filename', ''):
                 photo_dict['filename'] = photo_dict['filename'].split('/', 1)[1]
             photos_list.append(photo_dict)
         result['photos'] = photos_list
@@ -2841,7 +4457,7 @@ class Database:
             photo_dict = dict(p)
             # Strip "access/property_id/" prefix from filename
             fn = photo_dict.get('filename', '')
-            if fn.startswith('access/') and '/' in fn[7:]:
+            if (fn.startswith('access/') and '/' in fn[7:]) or fn.startswith('blobs/'):
                 photo_dict['filename'] = fn.split('/')[-1]
             access_photos_list.append(photo_dict)
         result['access_photos'] = access_photos_list
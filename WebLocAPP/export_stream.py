@@ -0,0 +1,112 @@
+"""
+Export Stream Module for LocApp
+JSON exports of properties encoded section by section straight into the
+response (no file written), with weak ETags from the properties' data versions
+and optional gzip
+"""
+
+import os
+import json
+import zlib
+import hashlib
+from datetime import datetime
+
+from flask import Response, request, stream_with_context
+
+# Bump when the layout of an export changes, so clients don't keep an old one
+EXPORT_FORMAT_VERSION = 1
+
+# Gzip the export when the client accepts it (0 disables)
+EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+
+def _encode(value, depth):
+    """`value` as indent=2 JSON, nested `depth` levels deep"""
+    return json.dumps(value, ensure_ascii=False, indent=2, default=str).replace('\n', '\n' + '  ' * depth)
+
+
+def export_etag(versions, scope=''):
+    """ETag of an export: the data versions of its properties ({property_id: version})"""
+    tag = ','.join(f'{property_id}:{version}' for property_id, version in versions.items())
+    return hashlib.sha1(f'{EXPORT_FORMAT_VERSION}|{scope}|{tag}'.encode()).hexdigest()[:32]
+
+
+def property_chunks(sections):
+    """Text chunks of a single-property export, one per section
+
+    Same document as json.dump(db.export_all_data(...), indent=2).
+    """
+    yield '{'
+    separator = '\n'
+    for _, key, value in sections:
+        yield f'{separator}  {_encode(key, 1)}: {_encode(value, 1)}'
+        separator = ',\n'
+    yield f'{separator}  "exported_at": {_encode(datetime.now().isoformat(), 1)}\n}}'
+
+
+def multi_property_chunks(sections):
+    """Text chunks of a multi-property export, one per section
+
+    {"exported_at": ..., "properties": [{"property": {...}, "data": {...}}, ...]}
+    `sections` comes from Database.iter_export(..., with_property=True).
+    """
+    yield f'{{\n  "exported_at": {_encode(datetime.now().isoformat(), 1)},\n  "properties": ['
+    current = None
+    for property_id, key, value in sections:
+        if key == 'property':
+            if current is not None:
+                yield '\n      }\n    },'
+            current = property_id
+            yield f'\n    {{\n      "property": {_encode(value, 3)},\n      "data": {{'
+            separator = '\n'
+            continue
+        yield f'{separator}        {_encode(key, 4)}: {_encode(value, 4)}'
+        separator = ',\n'
+    if current is not None:
+        yield '\n      }\n    }\n  '
+    yield ']\n}'
+
+
+def _gzip(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _closing(body, export):
+    """`body`, closing the export's connection even when the client disconnects mid-stream"""
+    try:
+        yield from body
+    finally:
+        export.close()
+
+
+def export_response(export, chunks, filename, etag):
+    """Attachment response streaming `chunks(sections)` of `export` (Database.iter_export, versions read)
+
+    Answers 304 when the client's copy has the same ETag, and gzips when the
+    client accepts it.
+    """
+    if request.if_none_match.contains_weak(etag):
+        export.close()
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    body = chunks(export)
+    gzip = bool(EXPORT_GZIP_LEVEL and request.accept_encodings['gzip'])
+    if gzip:
+        body = _gzip(body, EXPORT_GZIP_LEVEL)
+    else:
+        body = (chunk.encode('utf-8') for chunk in body)
+    response = Response(stream_with_context(_closing(body, export)), mimetype='application/json')
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag, weak=True)
+    return response
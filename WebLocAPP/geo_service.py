@@ -0,0 +1,102 @@
+"""
+Geo Service Module for LocApp
+Vectorized distance computations (NumPy) for places, services and activities
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distances in km from one origin to an array of points
+
+    Args:
+        latitude, longitude: Origin coordinates in degrees
+        latitudes, longitudes: Sequences (or arrays) of point coordinates in degrees
+
+    Returns:
+        NumPy float array of distances, NaN where a point has no coordinates
+    """
+    lat1 = np.radians(float(latitude))
+    lon1 = np.radians(float(longitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def rank_by_distance(latitude, longitude, latitudes, longitudes, k=None):
+    """Indices of the k nearest points, closest first
+
+    Uses argpartition so only the k selected points are sorted. Points without
+    coordinates (NaN) are never returned.
+
+    Returns:
+        Tuple (indices, distances_km) as NumPy arrays
+    """
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    valid = np.flatnonzero(~np.isnan(distances))
+    if valid.size == 0:
+        return valid, distances[valid]
+
+    if k is not None and k < valid.size:
+        part = np.argpartition(distances[valid], k - 1)[:k]
+        valid = valid[part]
+
+    order = valid[np.argsort(distances[valid], kind='stable')]
+    return order, distances[order]
+
+
+def _coordinates(items, lat_key, lng_key):
+    """Extract coordinate arrays from dicts, using NaN for missing values"""
+    lats = np.full(len(items), np.nan)
+    lngs = np.full(len(items), np.nan)
+    for i, item in enumerate(items):
+        lat, lng = item.get(lat_key), item.get(lng_key)
+        if lat is not None and lng is not None and lat != '' and lng != '':
+            try:
+                lats[i] = float(lat)
+                lngs[i] = float(lng)
+            except (TypeError, ValueError):
+                pass
+    return lats, lngs
+
+
+def nearest_items(latitude, longitude, items, k=None, lat_key='latitude', lng_key='longitude'):
+    """Rank dicts carrying coordinates by distance from the origin
+
+    Returns:
+        List of (item, distance_km) tuples, closest first, at most k entries
+    """
+    if not items:
+        return []
+    lats, lngs = _coordinates(items, lat_key, lng_key)
+    indices, distances = rank_by_distance(latitude, longitude, lats, lngs, k)
+    return [(items[i], float(d)) for i, d in zip(indices, distances)]
+
+
+def nearest_places(latitude, longitude, places, k=None):
+    """Rank Google Places results (geometry.location.lat/lng) by true distance
+
+    Returns:
+        List of (place, distance_km) tuples, closest first, at most k entries
+    """
+    items = [((place.get('geometry') or {}).get('location') or {}) for place in places]
+    if not items:
+        return []
+    lats, lngs = _coordinates(items, 'lat', 'lng')
+    indices, distances = rank_by_distance(latitude, longitude, lats, lngs, k)
+    return [(places[i], float(d)) for i, d in zip(indices, distances)]
+
+
+def format_distance(distance_km):
+    """Human readable distance (e.g. "350 m", "2.4 km")"""
+    if distance_km is None:
+        return ''
+    if distance_km < 1:
+        return f"{int(distance_km * 1000)} m"
+    return f"{distance_km:.1f} km"
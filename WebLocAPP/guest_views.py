@@ -0,0 +1,62 @@
+"""
+Guest Views Module for LocApp
+Counts the views of the guest pages in memory and writes them to the daily
+statistics in batches, off the hot guest endpoints
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+
+# Each process writes its buffered counts at most once per this many seconds
+GUEST_VIEWS_FLUSH_INTERVAL = float(os.environ.get('GUEST_VIEWS_FLUSH_INTERVAL', 30))
+
+
+class GuestViewCounter:
+    """Per-process buffer of guest views, keyed by (UTC day, property id)
+
+    add() only touches memory; the request that finds the buffer older than
+    GUEST_VIEWS_FLUSH_INTERVAL writes it (one statement per process and
+    interval). Counts that could not be written are kept for the next flush,
+    and flush() is called when a worker exits.
+    """
+
+    def __init__(self, db, interval=GUEST_VIEWS_FLUSH_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def add(self, property_id):
+        """Count one view of a property's guest data"""
+        day = datetime.utcnow().date().isoformat()
+        with self._lock:
+            key = (day, str(property_id))
+            self._counts[key] = self._counts.get(key, 0) + 1
+            due = time.monotonic() - self._flushed_at >= self.interval
+            if due:
+                self._flushed_at = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered views
+
+        Returns:
+            Number of views written
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+        try:
+            self.db.record_guest_views(counts)
+        except Exception as e:
+            print(f"[Guest Views] Error writing {sum(counts.values())} views, kept for the next flush: {e}")
+            with self._lock:
+                for key, count in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + count
+            return 0
+        return sum(counts.values())
@@ -0,0 +1,66 @@
+"""
+Gunicorn configuration for LocApp (production)
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Every setting can be overridden from the environment (values below are the
+defaults). State shared by the workers lives in the database: web sessions
+(web_sessions), mobile sessions (mobile_sessions), resumable uploads (files),
+profiles (request_profiles). Metrics are added up from the workers' files in METRICS_DIR.
+"""
+
+import os
+import multiprocessing
+
+# Set before the app is imported, which creates the metrics (see metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+
+bind = os.environ.get('LOCAPP_BIND', '0.0.0.0:5001')
+
+# Worker processes, each serving `threads` requests at a time. Requests mostly
+# wait on SQLite, Google or OpenAI, so threads are cheap concurrency.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('LOCAPP_THREADS', 4))
+
+# Import the app (and run the database migrations) once in the master, then fork.
+# With preload, a HUP does not load new code: deploy with USR2 then QUIT on the
+# old master (see README).
+preload_app = os.environ.get('LOCAPP_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# Recycle workers after this many requests (+ jitter, so they don't restart together)
+max_requests = int(os.environ.get('LOCAPP_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('LOCAPP_MAX_REQUESTS_JITTER', 200))
+
+# AI property generation can take a minute
+timeout = int(os.environ.get('LOCAPP_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('LOCAPP_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('LOCAPP_KEEPALIVE', 5))
+
+accesslog = os.environ.get('LOCAPP_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('LOCAPP_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Counters left by the workers of a previous run
+    from app import metrics
+    metrics.reset()
+
+
+def post_fork(server, worker):
+    # Counters inherited from the master describe no request of this worker
+    from app import metrics
+    metrics.reset_process()
+
+
+def worker_exit(server, worker):
+    # Hand the scheduled jobs and claimed emails over to another worker, and let the
+    # image and import jobs of a recycled / stopping worker finish
+    from app import scheduler, image_worker, bulk_importer, mailer, metrics, guest_views
+    metrics.flush()
+    guest_views.flush()
+    scheduler.stop()
+    mailer.stop()
+    image_worker.shutdown(wait=True)
+    bulk_importer.shutdown(wait=True)
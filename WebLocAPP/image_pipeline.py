@@ -0,0 +1,229 @@
+"""
+Image Pipeline Module for LocApp
+Generates resized WebP variants (thumb, medium, full) of uploaded images, and
+strips the metadata of stored originals
+"""
+
+import os
+import struct
+import zlib
+
+# Variant name -> (max width/height in px, WebP quality)
+VARIANTS = {
+    'thumb': (320, 75),
+    'medium': (1280, 80),
+    'full': (2560, 85),
+}
+
+VARIANT_FORMAT = 'webp'
+VARIANT_MIMETYPE = 'image/webp'
+
+
+def variant_filename(filename, size):
+    """Name of a variant file, stored next to the original (e.g. "3_ab12.thumb.webp")"""
+    stem = filename.rsplit('.', 1)[0] if '.' in filename else filename
+    return f"{stem}.{size}.{VARIANT_FORMAT}"
+
+
+def variant_path(original_path, size):
+    """Absolute path of a variant for an original file path"""
+    directory, filename = os.path.split(original_path)
+    return os.path.join(directory, variant_filename(filename, size))
+
+
+def generate_variants(original_path):
+    """Create every variant for an uploaded image
+
+    The image is rotated according to its EXIF orientation, downscaled (never
+    upscaled) to fit each variant's bounding box and re-encoded as WebP. EXIF and
+    other metadata (GPS position, camera serial...) are not copied to variants.
+
+    Returns:
+        Dict {size: path} of the variants written, empty if the image could not be read
+    """
+    from PIL import Image, ImageOps
+
+    written = {}
+    try:
+        with Image.open(original_path) as source:
+            image = ImageOps.exif_transpose(source)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+            for size, (max_side, quality) in VARIANTS.items():
+                variant = image.copy()
+                variant.thumbnail((max_side, max_side), Image.LANCZOS)
+                path = variant_path(original_path, size)
+                # Write then rename so a half-written variant is never served
+                tmp_path = f"{path}.tmp"
+                variant.save(tmp_path, 'WEBP', quality=quality, method=4)
+                os.replace(tmp_path, path)
+                written[size] = path
+    except Exception as e:
+        print(f"[Image Pipeline] Error generating variants for {os.path.basename(original_path)}: {e}")
+        delete_variants(original_path)
+        return {}
+
+    return written
+
+
+EXIF_ORIENTATION = 0x0112
+
+# Metadata blocks removed from originals: EXIF (GPS position, camera serial...),
+# XMP, IPTC and comments. Colour profiles are kept.
+_JPEG_DROPPED = (0xE1, 0xED, 0xFE)  # APP1 (EXIF, XMP), APP13 (IPTC), COM
+_PNG_DROPPED = (b'eXIf', b'tEXt', b'zTXt', b'iTXt')
+_WEBP_DROPPED = (b'EXIF', b'XMP ')
+
+
+def _orientation_tiff(orientation):
+    """Minimal EXIF (TIFF) block holding only the orientation tag"""
+    return b'MM\x00\x2a' + struct.pack('>IHHHIHHI', 8, 1, EXIF_ORIENTATION, 3, 1, orientation, 0, 0)
+
+
+def _strip_jpeg(data, tiff):
+    out = [data[:2]]
+    position = 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        if marker == 0xDA:  # Start of scan: compressed data follows
+            break
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        segment = data[position:position + 2 + length]
+        if marker in _JPEG_DROPPED:
+            if tiff:
+                payload = b'Exif\x00\x00' + tiff
+                out.append(b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload)
+                tiff = None
+        else:
+            out.append(segment)
+        position += 2 + length
+    out.append(data[position:])
+    return b''.join(out)
+
+
+def _strip_png(data, tiff):
+    out = [data[:8]]
+    position = 8
+    while position + 12 <= len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        chunk = data[position:position + 12 + length]
+        if kind in _PNG_DROPPED or (tiff and kind == b'IDAT'):
+            if tiff:
+                out.append(struct.pack('>I', len(tiff)) + b'eXIf' + tiff
+                           + struct.pack('>I', zlib.crc32(b'eXIf' + tiff)))
+                tiff = None
+            if kind == b'IDAT':
+                out.append(chunk)
+        else:
+            out.append(chunk)
+        position += 12 + length
+    return b''.join(out)
+
+
+def _strip_webp(data, tiff):
+    chunks = []
+    position = 12
+    while position + 8 <= len(data):
+        kind, length = struct.unpack('<4sI', data[position:position + 8])
+        chunk = data[position:position + 8 + length + (length & 1)]
+        if kind not in _WEBP_DROPPED:
+            chunks.append(chunk)
+        position += 8 + length + (length & 1)
+    if tiff:
+        chunks.append(b'EXIF' + struct.pack('<I', len(tiff)) + tiff + b'\x00' * (len(tiff) & 1))
+    if chunks and chunks[0][:4] == b'VP8X':
+        # Feature flags: EXIF (0x08) only if kept, XMP (0x04) never
+        flags = chunks[0][8] & ~0x0C | (0x08 if tiff else 0)
+        chunks[0] = chunks[0][:8] + bytes([flags]) + chunks[0][9:]
+    body = b'WEBP' + b''.join(chunks)
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def strip_metadata(path):
+    """Remove EXIF, XMP, IPTC and text metadata from an original (JPEG, PNG, WebP), in place
+
+    The pixels are not re-encoded. A non-default EXIF orientation is kept,
+    alone, so the image still displays the right way up.
+
+    Returns:
+        True if the file was rewritten
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        strip = {'JPEG': _strip_jpeg, 'PNG': _strip_png, 'WEBP': _strip_webp}.get(image_format)
+        if strip is None:
+            return False
+        with open(path, 'rb') as f:
+            data = f.read()
+        stripped = strip(data, _orientation_tiff(orientation) if orientation in range(2, 9) else None)
+    except Exception as e:
+        print(f"[Image Pipeline] Error reading the metadata of {os.path.basename(path)}: {e}")
+        return False
+    if stripped == data:
+        return False
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(stripped)
+    os.replace(tmp_path, path)
+    return True
+
+
+def delete_variants(original_path):
+    """Remove every variant of an original file (missing variants are ignored)"""
+    for size in VARIANTS:
+        path = variant_path(original_path, size)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def delete_with_variants(original_path):
+    """Remove an original file and all of its variants"""
+    if os.path.exists(original_path):
+        os.remove(original_path)
+    delete_variants(original_path)
+
+
+def resolve(directory, filename, size):
+    """Pick the file to serve for a `?size=` request
+
+    Returns:
+        Tuple (filename, mimetype): the variant when it exists, otherwise the
+        original filename and None (let Flask guess the mimetype)
+    """
+    if size in VARIANTS:
+        name = variant_filename(filename, size)
+        if os.path.isfile(os.path.join(directory, name)):
+            return name, VARIANT_MIMETYPE
+    return filename, None
+
+
+def is_variant(filename):
+    """True for files produced by generate_variants"""
+    return any(filename.endswith(f".{size}.{VARIANT_FORMAT}") for size in VARIANTS)
+
+
+def backfill(root):
+    """Generate missing variants for every original image under a directory tree
+
+    Returns:
+        Dict with counts of processed, skipped and failed originals
+    """
+    stats = {'processed': 0, 'skipped': 0, 'failed': 0}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            if is_variant(filename) or ext not in ('png', 'jpg', 'jpeg', 'gif', 'webp'):
+                continue
+            original_path = os.path.join(directory, filename)
+            if all(os.path.exists(variant_path(original_path, size)) for size in VARIANTS):
+                stats['skipped'] += 1
+            elif generate_variants(original_path):
+                stats['processed'] += 1
+            else:
+                stats['failed'] += 1
+    return stats
@@ -0,0 +1,186 @@
+"""
+Image Worker Module for LocApp
+Runs the image pipeline in a process pool, off the upload request path
+"""
+
+import os
+import socket
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import image_pipeline
+
+# Processing states stored in photos.processing_state / access_photos.processing_state
+STATE_PENDING = 'pending'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+PHOTO_TABLES = ('photos', 'access_photos')
+
+# A photo is claimed by the process generating its variants for this many seconds
+# (retries included); a claim left by a dead process is taken over after it
+IMAGE_CLAIM_SECONDS = float(os.environ.get('IMAGE_CLAIM_SECONDS', 600))
+
+
+def _process(original_path):
+    """Job executed in a worker process: build every variant of an original"""
+    return bool(image_pipeline.generate_variants(original_path))
+
+
+class ImageWorker:
+    """Process-pool backed queue for image variant generation
+
+    Jobs are bounded by IMAGE_WORKER_BACKLOG (queued + running): when the backlog
+    is full, submit() returns False and the photo stays `pending` until the next
+    requeue_pending(). Failed jobs are retried with exponential backoff, up to
+    IMAGE_WORKER_MAX_ATTEMPTS, then the photo is marked `failed`. The serve
+    routes fall back to the original file as long as variants are missing.
+
+    A photo row is claimed before it is queued, so that one process only
+    generates its variants, whichever worker processes requeue pending photos.
+    """
+
+    def __init__(self, db, max_workers=None, max_backlog=None, max_attempts=None, retry_delay=2.0):
+        self.db = db
+        self.max_workers = max_workers or int(os.environ.get('IMAGE_WORKERS', 2))
+        self.max_backlog = max_backlog or int(os.environ.get('IMAGE_WORKER_BACKLOG', 200))
+        self.max_attempts = max_attempts or int(os.environ.get('IMAGE_WORKER_MAX_ATTEMPTS', 3))
+        self.retry_delay = retry_delay
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_backlog)
+        self._requeued_pid = None
+
+    def _get_executor(self):
+        """Create the pool lazily, and again in a forked child (pools don't survive fork)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = None
+                self._slots = threading.BoundedSemaphore(self.max_backlog)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a pool whose worker died so the next job starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    @property
+    def holder(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def submit(self, original_path, table=None, row_id=None):
+        """Queue an original for processing
+
+        Args:
+            original_path: Absolute path of the uploaded file
+            table: 'photos' or 'access_photos' to track processing_state, None otherwise
+            row_id: Row id in that table
+
+        Returns:
+            True if queued, False if the backlog is full or another process claimed the photo
+        """
+        if table in PHOTO_TABLES and row_id:
+            try:
+                if not self.db.claim_photo(table, row_id, self.holder, IMAGE_CLAIM_SECONDS):
+                    return False
+            except Exception as e:
+                print(f"[Image Worker] Error claiming {table} #{row_id}: {e}")
+        return self._queue(original_path, table, row_id)
+
+    def _queue(self, original_path, table, row_id):
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            print(f"[Image Worker] Backlog full, leaving {os.path.basename(original_path)} pending")
+            if table in PHOTO_TABLES and row_id:
+                try:
+                    self.db.release_photo_claim(table, row_id, self.holder)
+                except Exception as e:
+                    print(f"[Image Worker] Error releasing {table} #{row_id}: {e}")
+            return False
+        self._run(executor, original_path, table, row_id, attempt=1)
+        return True
+
+    def _run(self, executor, original_path, table, row_id, attempt):
+        try:
+            future = executor.submit(_process, original_path)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor(executor)
+            self._finish(original_path, table, row_id, attempt, error=e)
+            return
+        future.add_done_callback(
+            lambda f: self._finish(original_path, table, row_id, attempt, executor=executor, future=f)
+        )
+
+    def _finish(self, original_path, table, row_id, attempt, executor=None, future=None, error=None):
+        ok = False
+        if future is not None:
+            try:
+                ok = future.result()
+            except BrokenProcessPool as e:
+                error = e
+                self._discard_executor(executor)
+            except Exception as e:
+                error = e
+
+        if ok:
+            self._set_state(table, row_id, STATE_READY)
+            self._slots.release()
+            return
+
+        if not os.path.exists(original_path):
+            # Photo deleted while it was processing
+            self._slots.release()
+            return
+
+        if attempt < self.max_attempts:
+            delay = self.retry_delay * (2 ** (attempt - 1))
+            print(f"[Image Worker] Attempt {attempt} failed for {os.path.basename(original_path)}"
+                  f" ({error or 'unreadable image'}), retrying in {delay:.0f}s")
+            timer = threading.Timer(delay, lambda: self._run(
+                self._get_executor(), original_path, table, row_id, attempt + 1
+            ))
+            timer.daemon = True
+            timer.start()
+            return
+
+        print(f"[Image Worker] Giving up on {os.path.basename(original_path)}: {error or 'unreadable image'}")
+        self._set_state(table, row_id, STATE_FAILED)
+        self._slots.release()
+
+    def _set_state(self, table, row_id, state):
+        if table in PHOTO_TABLES and row_id:
+            try:
+                self.db.set_photo_processing_state(table, row_id, state)
+            except Exception as e:
+                print(f"[Image Worker] Error updating {table} #{row_id}: {e}")
+
+    def requeue_pending(self, upload_folder):
+        """Queue the photos still `pending` that no live process claimed (e.g. after a restart), once per process"""
+        if self._requeued_pid == os.getpid():
+            return 0
+        self._requeued_pid = os.getpid()
+
+        queued = 0
+        try:
+            for table, row_id, filename in self.db.claim_pending_photos(self.holder, IMAGE_CLAIM_SECONDS):
+                if self._queue(os.path.join(upload_folder, filename), table, row_id):
+                    queued += 1
+        except Exception as e:
+            print(f"[Image Worker] Error requeuing pending photos: {e}")
+        if queued:
+            print(f"[Image Worker] Requeued {queued} pending photos")
+        return queued
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,243 @@
+"""
+Importer Module for LocApp
+Bulk import of properties from export documents (one JSON export, a
+multi-property export, or NDJSON with one export per line): documents are
+validated up front, then imported in parallel, each property in its own
+transaction, matched by slug so that re-importing updates instead of duplicating
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import EXPORT_SECTION_TABLES
+
+# Threads importing the documents of a job (SQLite still runs one write transaction at a time)
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 4))
+
+# Limits of one import request
+IMPORT_MAX_SIZE = int(os.environ.get('IMPORT_MAX_SIZE', 20 * 1024 * 1024))
+IMPORT_MAX_DOCUMENTS = int(os.environ.get('IMPORT_MAX_DOCUMENTS', 500))
+
+# A running job whose process recorded no result for this many seconds (process
+# killed or restarted mid-job) is reported as failed
+IMPORT_STALE_SECONDS = int(os.environ.get('IMPORT_STALE_SECONDS', 300))
+
+# Results of a document
+RESULT_CREATED = 'created'
+RESULT_UPDATED = 'updated'
+RESULT_ERROR = 'error'
+
+SINGLE_SECTIONS = ('general_info', 'wifi', 'address', 'parking', 'access', 'contact')
+LIST_SECTIONS = ('emergency_numbers', 'nearby_services', 'activities', 'activity_categories')
+
+# Keys of an export document that are not sections
+_DOCUMENT_KEYS = ('exported_at', 'slug', 'property')
+
+_SLUG_RE = re.compile(r'^[a-z0-9]+(-[a-z0-9]+)*$')
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class ImportDocument:
+    """A validated export document, ready for Database.import_property"""
+
+    def __init__(self, position, slug, name, sections, header):
+        self.position = position
+        self.slug = slug
+        self.name = name
+        self.sections = sections
+        self.header = header
+
+
+def slugify(name):
+    """Slug of a property name, as the property creation routes build it"""
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
+def parse_documents(text):
+    """Export documents of an import request body
+
+    Accepts one JSON document (a property export or a multi-property export)
+    or NDJSON. Multi-property exports are expanded into one document per
+    property, carrying its header under 'property'.
+
+    Returns:
+        List of (document, error message) pairs; document is None on a parse error
+    """
+    text = text.strip()
+    try:
+        values = [json.loads(text)]
+    except ValueError as e:
+        # NDJSON only if the first line is a document on its own
+        error = e
+        try:
+            json.loads(text.split('\n', 1)[0])
+        except ValueError:
+            return [(None, f'JSON invalide ({error.msg}, ligne {error.lineno})')]
+        values = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                values.append(json.loads(line))
+            except ValueError as e:
+                values.append(ValueError(f'Ligne {number}: JSON invalide ({e.msg})'))
+
+    documents = []
+    for value in values:
+        if isinstance(value, ValueError):
+            documents.append((None, str(value)))
+        elif isinstance(value, dict) and isinstance(value.get('properties'), list):
+            for entry in value['properties']:
+                if isinstance(entry, dict) and isinstance(entry.get('data'), dict):
+                    documents.append(({**entry['data'], 'property': entry.get('property')}, None))
+                else:
+                    documents.append((None, 'Entrée de "properties" invalide'))
+        else:
+            documents.append((value, None))
+    return documents
+
+
+def _row_errors(key, row):
+    if not isinstance(row, dict):
+        return [f'{key}: objet attendu']
+    return [f'{key}.{column}: valeur non scalaire' for column, value in row.items()
+            if not isinstance(value, _SCALARS)]
+
+
+def validate_document(position, document):
+    """Check an export document
+
+    Returns:
+        (ImportDocument or None, list of error messages)
+    """
+    if not isinstance(document, dict):
+        return None, ['Document JSON objet attendu']
+    errors = []
+    for key in document:
+        if key not in _DOCUMENT_KEYS and key not in EXPORT_SECTION_TABLES:
+            errors.append(f'Section inconnue: {key}')
+
+    sections = {}
+    for key in SINGLE_SECTIONS:
+        if key in document:
+            if document[key] is not None:
+                errors += _row_errors(key, document[key])
+            sections[key] = document[key]
+    for key in LIST_SECTIONS:
+        if key in document:
+            if not isinstance(document[key], list):
+                errors.append(f'{key}: liste attendue')
+                continue
+            for index, row in enumerate(document[key]):
+                errors += _row_errors(f'{key}[{index}]', row)
+            sections[key] = document[key]
+
+    header = document.get('property') if isinstance(document.get('property'), dict) else {}
+    general_info = document.get('general_info') if isinstance(document.get('general_info'), dict) else {}
+    name = header.get('name') or general_info.get('property_name')
+    if not isinstance(name, str) or not name.strip():
+        errors.append('Nom de la propriété manquant (general_info.property_name)')
+        name = ''
+    slug = document.get('slug') or header.get('slug') or slugify(name)
+    if not isinstance(slug, str) or not _SLUG_RE.match(slug) or len(slug) > 100:
+        errors.append(f'Slug invalide: {slug!r}')
+
+    if errors:
+        return None, errors
+    return ImportDocument(position, slug, name.strip(), sections,
+                          {'icon': header.get('icon'), 'region': header.get('region')}), []
+
+
+class BulkImporter:
+    """Runs import jobs on a thread pool; progress and results are stored in the database
+
+    A job is created with every document's validation result: invalid documents
+    are recorded as failed right away, valid ones are imported by the pool and
+    recorded as they finish, so any worker process can report a job's progress.
+    Each result is a heartbeat of the running jobs of this process: a job of a
+    process that died stops getting them and get_job reports it failed.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.max_workers = max_workers or IMPORT_WORKERS
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Create the pool lazily, and again in a forked child (threads don't survive fork)"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='import')
+                self._pid = os.getpid()
+            return self._executor
+
+    @property
+    def holder(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self, user_id, documents, max_properties=-1):
+        """Validate `documents` (from parse_documents) and start importing them
+
+        Returns:
+            Job id
+        """
+        job_id = uuid.uuid4().hex
+        self.db.create_import_job(job_id, user_id, len(documents), self.holder)
+        valid = []
+        slugs = set()
+        for position, (document, parse_error) in enumerate(documents):
+            if parse_error:
+                self.db.record_import_result(job_id, position, None, RESULT_ERROR, message=parse_error,
+                                             owner=self.holder)
+                continue
+            item, errors = validate_document(position, document)
+            if errors:
+                slug = document.get('slug') if isinstance(document, dict) else None
+                self.db.record_import_result(job_id, position, slug, RESULT_ERROR, message='; '.join(errors[:20]),
+                                             owner=self.holder)
+            elif item.slug in slugs:
+                self.db.record_import_result(job_id, position, item.slug, RESULT_ERROR,
+                                             message=f'Slug "{item.slug}" en double dans l\'import',
+                                             owner=self.holder)
+            else:
+                slugs.add(item.slug)
+                valid.append(item)
+
+        print(f"[Import] Job {job_id}: {len(documents)} document(s), {len(valid)} valid")
+        executor = self._get_executor()
+        for item in valid:
+            executor.submit(self._import, job_id, user_id, item, max_properties)
+        return job_id
+
+    def _import(self, job_id, user_id, item, max_properties):
+        try:
+            property_id, created = self.db.import_property(
+                user_id, item.slug, item.name, item.sections, item.header, max_properties)
+            self.db.record_import_result(job_id, item.position, item.slug,
+                                         RESULT_CREATED if created else RESULT_UPDATED, property_id,
+                                         owner=self.holder)
+        except Exception as e:
+            print(f"[Import] Job {job_id}: {item.slug} failed: {e}")
+            self.db.record_import_result(job_id, item.position, item.slug, RESULT_ERROR, message=str(e),
+                                         owner=self.holder)
+
+    def get_job(self, job_id, user_id):
+        """A user's import job (None if not found); a stale running job is marked failed first"""
+        if self.db.fail_stale_import_job(job_id, time.time() - IMPORT_STALE_SECONDS,
+                                         'Import interrompu : le processus qui l\'exécutait s\'est arrêté'):
+            print(f"[Import] Job {job_id}: no progress for {IMPORT_STALE_SECONDS}s, marked failed")
+        return self.db.get_import_job(job_id, user_id)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
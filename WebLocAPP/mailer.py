@@ -0,0 +1,241 @@
+"""
+Mailer Module for LocApp
+Outbound emails go through a persistent outbox (email_outbox table): requests
+only queue them, a background thread of each worker process claims due
+messages in batches and sends them over one reused SMTP connection, with
+retries and exponential backoff
+"""
+
+import os
+import time
+import socket
+import smtplib
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# Messages claimed (and sent on one connection) per round
+MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 20))
+
+# Seconds between two looks at the outbox when nothing wakes the sender up
+MAIL_POLL_INTERVAL = float(os.environ.get('MAIL_POLL_INTERVAL', 15))
+
+# An idle SMTP connection is closed after this many seconds; a connection
+# sends at most this many messages before it is renewed
+MAIL_IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT', 30))
+MAIL_MAX_PER_CONNECTION = int(os.environ.get('MAIL_MAX_PER_CONNECTION', 100))
+
+# Retries: delay doubles from MAIL_RETRY_DELAY up to MAIL_RETRY_MAX_DELAY, then the message fails
+MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 8))
+MAIL_RETRY_DELAY = float(os.environ.get('MAIL_RETRY_DELAY', 30))
+MAIL_RETRY_MAX_DELAY = float(os.environ.get('MAIL_RETRY_MAX_DELAY', 3600))
+
+# SMTP timeout in seconds, and STARTTLS (0 for a local debugging server)
+MAIL_SMTP_TIMEOUT = float(os.environ.get('MAIL_SMTP_TIMEOUT', 20))
+MAIL_SMTP_STARTTLS = os.environ.get('MAIL_SMTP_STARTTLS', '1').lower() in ('1', 'true', 'yes')
+
+# Lease of claimed messages, renewed before each message is sent: it covers one
+# message (connection, STARTTLS, login and a reconnection each up to the SMTP
+# timeout). A message not sent within it (process killed) is claimed again.
+MAIL_CLAIM_SECONDS = max(float(os.environ.get('MAIL_CLAIM_SECONDS', 120)), 10 * MAIL_SMTP_TIMEOUT)
+
+# Outbox states
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+def retry_delay(attempts):
+    """Seconds before the next attempt of a message that failed `attempts` times"""
+    return min(MAIL_RETRY_DELAY * 2 ** (attempts - 1), MAIL_RETRY_MAX_DELAY)
+
+
+def _is_permanent(error):
+    """SMTP errors retrying can't fix: 5xx replies, to RCPT included (bad credentials excepted)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class Mailer:
+    """Queues emails in the outbox and sends them from a daemon thread
+
+    Every worker process runs its own sender (start() is a no-op when it
+    already runs in this process). Messages are claimed with a lease, renewed
+    before each message of the batch, so two processes never send the same
+    message, and a process that dies mid-batch only delays its messages until
+    the lease ends. A sender that lost a claim anyway (stalled past the lease)
+    skips the message, and its result is not recorded. `enabled=False` only
+    queues (the messages wait for a process with sending enabled).
+    """
+
+    def __init__(self, db, config, enabled=True):
+        self.db = db
+        self.config = config
+        self.enabled = enabled
+        self._smtp = None
+        self._smtp_sent = 0
+        self._smtp_used_at = 0.0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def holder(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def enqueue(self, recipient, subject, body, kind):
+        """Queue an email; it is sent in the background, as soon as possible
+
+        Returns:
+            The outbox id of the message
+        """
+        message_id = self.db.enqueue_email(kind, recipient, subject, body)
+        if self.enabled and self._pid == os.getpid():
+            self._wakeup.set()
+        return message_id
+
+    def start(self):
+        """Start the sender thread of this process (once per process)"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._smtp = None
+            self._wakeup = threading.Event()
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._loop, name='locapp-mailer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the sender after its current message and hand back the messages it claimed"""
+        if self._pid != os.getpid():
+            return
+        self._pid = None
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.db.release_email_claims(self.holder)
+        except Exception as e:
+            print(f"[Mailer] Error releasing claimed messages: {e}")
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            # Cleared before reading the outbox: a message queued meanwhile wakes the next wait
+            self._wakeup.clear()
+            try:
+                sent = self.send_due()
+            except Exception as e:
+                print(f"[Mailer] Error reading the outbox: {e}")
+                sent = 0
+            if sent:
+                continue
+            if self._smtp is not None and time.monotonic() - self._smtp_used_at > MAIL_IDLE_TIMEOUT:
+                self._disconnect()
+            self._wakeup.wait(self._idle_wait())
+        self._disconnect()
+
+    def _idle_wait(self):
+        """Seconds until the next retry is due, at most the poll interval"""
+        wait = min(MAIL_POLL_INTERVAL, MAIL_IDLE_TIMEOUT) if self._smtp is not None else MAIL_POLL_INTERVAL
+        try:
+            next_attempt = self.db.next_email_attempt()
+        except Exception:
+            return wait
+        if next_attempt is not None:
+            wait = min(wait, max(next_attempt - time.time(), 0.1))
+        return wait
+
+    def send_due(self):
+        """One round of the sender: claim a batch of due messages and send it
+
+        Returns:
+            Number of messages processed (sent or not)
+        """
+        batch = self.db.claim_due_emails(self.holder, MAIL_BATCH_SIZE, MAIL_CLAIM_SECONDS)
+        for message in batch:
+            if self._stopped.is_set():
+                break
+            # The rest of the batch waited for the previous messages: extend the lease first
+            if message['id'] not in self.db.renew_email_claims(self.holder, MAIL_CLAIM_SECONDS):
+                print(f"[Mailer] Message {message['id']} was claimed by another sender, skipped")
+                continue
+            self._send(message)
+        return len(batch)
+
+    def _send(self, message):
+        try:
+            self._deliver(self._build(message))
+        except (smtplib.SMTPException, OSError) as e:
+            attempts = message['attempts'] + 1
+            permanent = _is_permanent(e) or attempts >= MAIL_MAX_ATTEMPTS
+            if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                # The connection may be unusable (timeout, disconnect, bad state)
+                self._disconnect()
+            if not self.db.mark_email_failed(message['id'], self.holder, str(e),
+                                             None if permanent else retry_delay(attempts)):
+                print(f"[Mailer] Message {message['id']}: claim lost, failure not recorded")
+            print(f"[Mailer] Message {message['id']} to {message['recipient']} "
+                  f"{'failed' if permanent else 'will be retried'} (attempt {attempts}): {e}")
+            return False
+        if not self.db.mark_email_sent(message['id'], self.holder):
+            print(f"[Mailer] Message {message['id']}: claim lost while sending, it may be sent twice")
+        print(f"[Mailer] Message {message['id']} ({message['kind']}) sent to {message['recipient']}")
+        return True
+
+    def _deliver(self, msg):
+        reused = self._smtp is not None
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            if not reused:
+                raise
+            # The server dropped the idle connection: reconnect once
+            self._disconnect()
+            self._connection().send_message(msg)
+        self._smtp_sent += 1
+        self._smtp_used_at = time.monotonic()
+
+    def _build(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.config['sender_email']
+        msg['To'] = message['recipient']
+        msg['Subject'] = message['subject']
+        msg.attach(MIMEText(message['body'], 'plain'))
+        return msg
+
+    def _connection(self):
+        """The open SMTP connection, or a new authenticated one"""
+        if self._smtp is not None and self._smtp_sent >= MAIL_MAX_PER_CONNECTION:
+            self._disconnect()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=MAIL_SMTP_TIMEOUT)
+            try:
+                if MAIL_SMTP_STARTTLS:
+                    smtp.starttls()
+                if self.config.get('sender_password'):
+                    smtp.login(self.config['sender_email'], self.config['sender_password'])
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self._smtp_sent = 0
+        return self._smtp
+
+    def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
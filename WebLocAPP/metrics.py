@@ -0,0 +1,371 @@
+"""
+Metrics Module for LocApp
+Per-route request metrics (latency histograms, status counts, in-flight requests)
+exposed in the Prometheus text format, aggregated over the worker processes
+"""
+
+import os
+import glob
+import json
+import time
+import fcntl
+import bisect
+import threading
+from contextlib import contextmanager
+
+from flask import g, request
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label used for requests that matched no route (404s), to bound the label set
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+# Each worker writes its counters to the metrics directory at most once per this many seconds
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+_ARCHIVE = 'archive.json'
+_RESET = 'reset'
+_LOCK = '.lock'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class _RouteStats:
+    __slots__ = ('buckets', 'count', 'total', 'cpu', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.cpu = 0.0
+        self.statuses = {}
+
+    def to_json(self):
+        return [self.buckets, self.count, self.total, self.cpu, self.statuses]
+
+    def merge(self, data):
+        """Add counters saved by to_json() (status keys come back as strings)"""
+        buckets, count, total, cpu, statuses = data
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.count += count
+        self.total += total
+        self.cpu += cpu
+        for status, n in statuses.items():
+            self.statuses[int(status)] = self.statuses.get(int(status), 0) + n
+
+    def quantile(self, q):
+        """Estimate a latency quantile from the histogram (linear within a bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.buckets):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else lower
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return lower
+
+
+class Metrics:
+    """Request metrics, keyed by (endpoint, method)
+
+    Latency is wall-clock time from before_request to teardown; CPU is the
+    thread CPU time spent over the same span, which tells apart routes that
+    compute from routes that wait (database, Google, OpenAI).
+
+    Each process counts in memory. With a `directory`, it also writes its
+    counters there (worker-<pid>.json), and the reports add up every worker:
+    the counters of exited workers are folded into archive.json, their
+    in-flight requests dropped. Without one, the reports cover this process.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._routes = {}
+        self._in_flight = {}
+        self.started_at = time.time()
+        self._reset_at = time.time()
+        self._flushed_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g._metrics_start = (time.perf_counter(), time.thread_time())
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def _after_request(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start[0]
+        cpu = time.thread_time() - start[1]
+        status = g.pop('_metrics_status', 500)
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        self.observe(endpoint, request.method, status, duration, cpu)
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+        if self.directory and time.monotonic() - self._flushed_at >= METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def observe(self, endpoint, method, status, duration, cpu=0.0):
+        """Record one finished request"""
+        with self._lock:
+            stats = self._routes.get((endpoint, method))
+            if stats is None:
+                stats = self._routes[(endpoint, method)] = _RouteStats()
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            stats.count += 1
+            stats.total += duration
+            stats.cpu += cpu
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def reset_process(self):
+        """Forget the counters of this process (a forked worker starts from zero)"""
+        with self._lock:
+            self._routes = {}
+            self.started_at = self._reset_at = time.time()
+
+    def reset(self):
+        """Reset the counters of every worker"""
+        self.reset_process()
+        if not self.directory:
+            return
+        with self._directory_lock():
+            _write_json(os.path.join(self.directory, _RESET), self._reset_at)
+            for path in glob.glob(os.path.join(self.directory, 'worker-*.json')) + [self._path(_ARCHIVE)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _directory_lock(self):
+        with open(self._path(_LOCK), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self.started_at,
+                'cpu': time.process_time(),
+                'routes': [[endpoint, method, stats.to_json()]
+                           for (endpoint, method), stats in self._routes.items()],
+                'in_flight': dict(self._in_flight),
+            }
+
+    def flush(self):
+        """Write this process's counters to the metrics directory"""
+        if not self.directory or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            # Another worker reset the metrics since our last flush
+            reset_at = _read_json(self._path(_RESET))
+            if reset_at is not None and reset_at > self._reset_at:
+                self.reset_process()
+                self._reset_at = reset_at
+            _write_json(self._path(f'worker-{os.getpid()}.json'), self._snapshot())
+            self._flushed_at = time.monotonic()
+        except OSError as e:
+            print(f"[Metrics] Error writing {self.directory}: {e}")
+        finally:
+            self._flush_lock.release()
+
+    def _collect(self):
+        """Counters of every worker
+
+        Returns:
+            (routes {(endpoint, method): _RouteStats}, in_flight {endpoint: n},
+             cpu seconds, start time, live workers)
+        """
+        if not self.directory:
+            snapshots, archive = [self._snapshot()], None
+        else:
+            self.flush()
+            snapshots = []
+            with self._directory_lock():
+                archive = _read_json(self._path(_ARCHIVE)) or {'cpu': 0.0, 'started_at': None, 'routes': []}
+                archived = 0
+                for path in glob.glob(self._path('worker-*.json')):
+                    snapshot = _read_json(path)
+                    if snapshot is None:
+                        continue
+                    if snapshot['pid'] == os.getpid() or _process_alive(snapshot['pid']):
+                        snapshots.append(snapshot)
+                        continue
+                    # Exited worker: keep its counters, drop its in-flight requests
+                    archive['cpu'] += snapshot['cpu']
+                    archive['started_at'] = min(filter(None, (archive['started_at'], snapshot['started_at'])))
+                    archive['routes'] += snapshot['routes']
+                    os.remove(path)
+                    archived += 1
+                if archived:
+                    merged = {}
+                    for endpoint, method, data in archive['routes']:
+                        merged.setdefault((endpoint, method), _RouteStats()).merge(data)
+                    archive['routes'] = [[endpoint, method, stats.to_json()]
+                                         for (endpoint, method), stats in merged.items()]
+                    _write_json(self._path(_ARCHIVE), archive)
+
+        routes = {}
+        in_flight = {}
+        cpu = 0.0
+        started = []
+        for snapshot in snapshots + ([archive] if archive else []):
+            for endpoint, method, data in snapshot['routes']:
+                routes.setdefault((endpoint, method), _RouteStats()).merge(data)
+            for endpoint, count in snapshot.get('in_flight', {}).items():
+                in_flight[endpoint] = in_flight.get(endpoint, 0) + count
+            cpu += snapshot['cpu']
+            if snapshot['started_at']:
+                started.append(snapshot['started_at'])
+        return routes, in_flight, cpu, min(started, default=self.started_at), len(snapshots)
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        routes, in_flight, cpu, started_at, workers = self._collect()
+        routes = sorted(routes.items())
+        in_flight = sorted(in_flight.items())
+
+        lines = [
+            '# HELP locapp_http_request_duration_seconds Request latency by endpoint',
+            '# TYPE locapp_http_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), stats in routes:
+            cumulative = 0
+            for i, bucket_count in enumerate(stats.buckets):
+                cumulative += bucket_count
+                le = repr(LATENCY_BUCKETS[i]) if i < len(LATENCY_BUCKETS) else '+Inf'
+                lines.append('locapp_http_request_duration_seconds_bucket'
+                             f'{_labels(endpoint=endpoint, method=method, le=le)} {cumulative}')
+            lines.append('locapp_http_request_duration_seconds_sum'
+                         f'{_labels(endpoint=endpoint, method=method)} {stats.total:.6f}')
+            lines.append('locapp_http_request_duration_seconds_count'
+                         f'{_labels(endpoint=endpoint, method=method)} {stats.count}')
+
+        lines += [
+            '# HELP locapp_http_request_cpu_seconds_total CPU time spent handling requests by endpoint',
+            '# TYPE locapp_http_request_cpu_seconds_total counter',
+        ]
+        for (endpoint, method), stats in routes:
+            lines.append('locapp_http_request_cpu_seconds_total'
+                         f'{_labels(endpoint=endpoint, method=method)} {stats.cpu:.6f}')
+
+        lines += [
+            '# HELP locapp_http_requests_total Finished requests by endpoint and status',
+            '# TYPE locapp_http_requests_total counter',
+        ]
+        for (endpoint, method), stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append('locapp_http_requests_total'
+                             f'{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP locapp_http_requests_in_flight Requests being handled by endpoint',
+            '# TYPE locapp_http_requests_in_flight gauge',
+        ]
+        for endpoint, count in in_flight:
+            lines.append(f'locapp_http_requests_in_flight{_labels(endpoint=endpoint)} {count}')
+
+        lines += [
+            '# HELP process_cpu_seconds_total Total user and system CPU time of the worker processes',
+            '# TYPE process_cpu_seconds_total counter',
+            f'process_cpu_seconds_total {cpu:.6f}',
+            '# HELP process_start_time_seconds Start time of the metrics collection',
+            '# TYPE process_start_time_seconds gauge',
+            f'process_start_time_seconds {started_at:.3f}',
+            '# HELP locapp_workers Worker processes reporting metrics',
+            '# TYPE locapp_workers gauge',
+            f'locapp_workers {workers}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, limit=None, sort_by='cpu'):
+        """Per-route figures for the superadmin dashboard, most expensive first
+
+        Returns:
+            List of dicts (endpoint, method, count, errors, avg_ms, p50_ms, p95_ms,
+            p99_ms, total_s, cpu_s, cpu_share)
+        """
+        routes = list(self._collect()[0].items())
+        total_cpu = sum(stats.cpu for _, stats in routes) or 1.0
+        rows = [{
+            'endpoint': endpoint,
+            'method': method,
+            'count': stats.count,
+            'errors': sum(n for status, n in stats.statuses.items() if status >= 500),
+            'avg_ms': round(stats.total / stats.count * 1000, 1),
+            'p50_ms': round(stats.quantile(0.50) * 1000, 1),
+            'p95_ms': round(stats.quantile(0.95) * 1000, 1),
+            'p99_ms': round(stats.quantile(0.99) * 1000, 1),
+            'total_s': round(stats.total, 3),
+            'cpu_s': round(stats.cpu, 3),
+            'cpu_share': round(stats.cpu / total_cpu * 100, 1),
+        } for (endpoint, method), stats in routes]
+
+        rows.sort(key=lambda row: row['cpu_s' if sort_by == 'cpu' else 'total_s'], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def process_info(self):
+        """Totals of every worker (see _collect)"""
+        routes, _, cpu, started_at, workers = self._collect()
+        return {
+            'pid': os.getpid(),
+            'workers': workers,
+            'uptime_s': round(time.time() - started_at),
+            'cpu_s': round(cpu, 1),
+            'requests': sum(stats.count for stats in routes.values()),
+        }
@@ -0,0 +1,237 @@
+"""
+Profiling Module for LocApp
+On-demand profiling of live requests: a stack sampler (flame-graph folded
+stacks) or cProfile, enabled per route or per request. Armed routes and the
+last profiles are stored in the database, shared by the worker processes
+"""
+
+import io
+import os
+import sys
+import time
+import marshal
+import threading
+from collections import Counter
+
+from flask import g, request
+
+MODE_SAMPLE = 'sample'
+MODE_CPROFILE = 'cprofile'
+MODES = (MODE_SAMPLE, MODE_CPROFILE)
+
+# Request header asking for a profile of this request ("sample" or "cprofile")
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_HISTORY = int(os.environ.get('PROFILE_HISTORY', 20))
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 2)) / 1000
+
+# Seconds a worker keeps its copy of the armed routes before reading them again
+PROFILE_ROUTES_REFRESH = float(os.environ.get('PROFILE_ROUTES_REFRESH', 2))
+
+
+class _Sampler(threading.Thread):
+    """Samples the stack of one thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='locapp-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class Profiler:
+    """Profiles selected requests, with no work done for the others
+
+    A request is profiled when its endpoint was armed with enable_route() (for the
+    next `count` requests, whichever worker serves them), or when it carries the
+    X-Profile header and the `authorize` callback accepts it. Disabled, the cost
+    is one dict lookup and one header lookup per request, plus a read of the
+    armed routes every PROFILE_ROUTES_REFRESH seconds.
+    """
+
+    def __init__(self, db, history=PROFILE_HISTORY, interval=SAMPLE_INTERVAL):
+        self.db = db
+        self.history = history
+        self.interval = interval
+        self._routes = {}
+        self._routes_read_at = None
+        self._authorize = None
+
+    def init_app(self, app, authorize=None):
+        self._authorize = authorize
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    # ---- Configuration ----
+
+    def enable_route(self, endpoint, mode=MODE_SAMPLE, count=10):
+        """Profile the next `count` requests of an endpoint"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.db.set_profile_route(endpoint, mode, max(1, int(count)))
+        self._routes_read_at = None
+
+    def disable_route(self, endpoint):
+        self._routes_read_at = None
+        return self.db.delete_profile_route(endpoint)
+
+    def armed_routes(self):
+        return self.db.get_profile_routes()
+
+    # ---- Request hooks ----
+
+    def _armed(self):
+        """This worker's copy of the armed routes, read again when older than PROFILE_ROUTES_REFRESH"""
+        now = time.monotonic()
+        if self._routes_read_at is None or now - self._routes_read_at >= PROFILE_ROUTES_REFRESH:
+            self._routes_read_at = now
+            try:
+                self._routes = self.db.get_profile_routes()
+            except Exception as e:
+                print(f"[Profiler] Error reading the armed routes: {e}")
+        return self._routes
+
+    def _before_request(self):
+        mode = None
+        if request.endpoint in self._armed():
+            # The count is shared: another worker may have taken the last request
+            mode = self.db.take_profile_route(request.endpoint)
+            if mode is None:
+                self._routes_read_at = None
+        requested = request.headers.get(PROFILE_HEADER)
+        if mode is None and requested:
+            if requested in MODES and self._authorize is not None and self._authorize():
+                mode = requested
+        if mode is None:
+            return
+
+        if mode == MODE_CPROFILE:
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active on this thread
+                return
+        else:
+            profile = _Sampler(threading.get_ident(), self.interval)
+            profile.start()
+        g._profile = (mode, profile, time.perf_counter())
+
+    def _teardown_request(self, exc):
+        started = g.pop('_profile', None)
+        if started is None:
+            return
+        mode, profile, start = started
+        duration = time.perf_counter() - start
+
+        if mode == MODE_CPROFILE:
+            profile.disable()
+            profile.create_stats()
+            data = marshal.dumps(profile.stats)
+        else:
+            data = marshal.dumps(dict(profile.stop()))
+
+        entry = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'mode': mode,
+            'duration_ms': round(duration * 1000, 1),
+            'error': repr(exc) if exc else None,
+            'at': time.time(),
+            'pid': os.getpid(),
+            'data': data,
+        }
+        try:
+            profile_id = self.db.save_profile(entry, self.history)
+        except Exception as e:
+            print(f"[Profiler] Error saving the profile of {request.method} {request.path}: {e}")
+            return
+        print(f"[Profiler] Profile #{profile_id} ({mode}) of {request.method} {request.path}: "
+              f"{entry['duration_ms']} ms")
+
+    # ---- Stored profiles ----
+
+    def list_profiles(self):
+        """Stored profiles without their data, newest first"""
+        return self.db.list_profiles()
+
+    def get_profile(self, profile_id):
+        entry = self.db.get_profile(profile_id)
+        if entry and entry['mode'] == MODE_SAMPLE:
+            entry['data'] = Counter(marshal.loads(entry['data']))
+        return entry
+
+    def clear(self):
+        self.db.clear_profiles()
+
+
+def _frame_label(filename, line, name):
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def folded_stacks(entry):
+    """Profile as folded stacks ("frame;frame;frame count" lines), the input of
+    flamegraph.pl, speedscope and most flame-graph viewers"""
+    if entry['mode'] == MODE_SAMPLE:
+        stacks = entry['data']
+    else:
+        # cProfile only knows caller -> callee edges: two-frame stacks weighted in microseconds
+        stacks = Counter()
+        for (filename, line, name), (_, _, tottime, _, callers) in marshal.loads(entry['data']).items():
+            frame = _frame_label(filename, line, name)
+            if not callers:
+                stacks[frame] += int(tottime * 1_000_000)
+            for (c_filename, c_line, c_name), (_, _, c_tottime, _) in callers.items():
+                stacks[f"{_frame_label(c_filename, c_line, c_name)};{frame}"] += int(c_tottime * 1_000_000)
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()) if count)
+
+
+def text_report(entry, limit=40):
+    """Human readable report: pstats listing (cprofile) or hottest stacks (sample)"""
+    if entry['mode'] == MODE_CPROFILE:
+        import pstats
+        stream = io.StringIO()
+        stats = pstats.Stats(_StatsSource(marshal.loads(entry['data'])), stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    stacks = entry['data']
+    total = sum(stacks.values()) or 1
+    lines = [f"{total} samples, {entry['duration_ms']} ms"]
+    for stack, count in stacks.most_common(limit):
+        lines.append(f"{count * 100 / total:5.1f}%  {' < '.join(reversed(stack.split(';')[-4:]))}")
+    return '\n'.join(lines) + '\n'
+
+
+def pstats_dump(entry):
+    """Binary pstats file (cprofile mode), readable by pstats, snakeviz..."""
+    return entry['data'] if entry['mode'] == MODE_CPROFILE else None
+
+
+class _StatsSource:
+    """Minimal object pstats.Stats accepts in place of a profiler"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
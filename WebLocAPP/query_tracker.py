@@ -0,0 +1,185 @@
+"""
+Query Tracker Module for LocApp
+Times every SQL statement run through Database connections: per-request query
+count and database time, slow-query log with query plans, N+1 detection
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import contextvars
+from collections import Counter, deque
+
+# Statements slower than this (execute + fetch) are logged with their query plan
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# An identical statement run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
+SLOW_QUERY_LOG_SIZE = 50
+
+_current = contextvars.ContextVar('locapp_request_queries', default=None)
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_slow_queries_lock = threading.Lock()
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Statement text on one line, used to group identical statements"""
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class RequestQueries:
+    """Queries run while handling one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.statements = Counter()
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Statements run at least `threshold` times, most repeated first"""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def start_request():
+    """Start collecting the queries of the current request (or task)"""
+    queries = RequestQueries()
+    _current.set(queries)
+    return queries
+
+
+def end_request():
+    """Stop collecting and return what was collected (None if not started)"""
+    queries = _current.get()
+    _current.set(None)
+    return queries
+
+
+def current_request():
+    return _current.get()
+
+
+def slow_queries():
+    """Most recent slow queries, newest first"""
+    with _slow_queries_lock:
+        return list(reversed(_slow_queries))
+
+
+def _query_plan(connection, sql, parameters):
+    if not normalize_sql(sql).upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        # A plain cursor, so the EXPLAIN itself is not tracked
+        rows = sqlite3.Cursor(connection).execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+        return [row[-1] for row in rows]
+    except sqlite3.Error:
+        return None
+
+
+def _log_slow(connection, sql, parameters, duration):
+    entry = {
+        'sql': normalize_sql(sql),
+        'duration_ms': round(duration * 1000, 1),
+        'plan': _query_plan(connection, sql, parameters),
+        'at': time.time(),
+    }
+    with _slow_queries_lock:
+        _slow_queries.append(entry)
+    print(f"[SQL] Slow query ({entry['duration_ms']} ms): {entry['sql'][:300]}")
+    for step in entry['plan'] or ():
+        print(f"[SQL]   plan: {step}")
+
+
+class TrackedCursor(sqlite3.Cursor):
+    """Cursor timing its statements, including the time spent fetching rows"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._sql = None
+        self._parameters = ()
+        self._elapsed = 0.0
+        self._logged = False
+
+    def _begin(self, sql, parameters):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = 0.0
+        self._logged = False
+        queries = _current.get()
+        if queries is not None:
+            queries.count += 1
+            queries.statements[normalize_sql(sql)] += 1
+
+    def _spent(self, duration, finished=False):
+        self._elapsed += duration
+        queries = _current.get()
+        if queries is not None:
+            queries.total += duration
+        if (finished and not self._logged and self._sql is not None
+                and self._elapsed * 1000 >= SLOW_QUERY_MS):
+            self._logged = True
+            _log_slow(self.connection, self._sql, self._parameters, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            # Statements returning no rows are complete after execute
+            self._spent(time.perf_counter() - start, finished=self.description is None)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, ())
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._spent(time.perf_counter() - start, finished=True)
+
+    def executescript(self, sql_script):
+        self._begin(sql_script, ())
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._sql = None  # No query plan for scripts
+            self._spent(time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._spent(time.perf_counter() - start, finished=True)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._spent(time.perf_counter() - start, finished=not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._spent(time.perf_counter() - start, finished=True)
+        return rows
+
+
+class TrackedConnection(sqlite3.Connection):
+    """Connection whose cursors (including the conn.execute shortcuts) are TrackedCursor"""
+
+    def cursor(self, factory=TrackedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
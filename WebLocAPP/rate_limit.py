@@ -0,0 +1,260 @@
+"""
+Rate Limit Module for LocApp
+Sliding-window rate limiting of the login and access code endpoints, keyed by
+IP, user or code prefix, with counters in memory or shared by the worker
+processes (SQLite file)
+"""
+
+import os
+import time
+import random
+import sqlite3
+import threading
+from functools import wraps
+
+from flask import request, jsonify
+
+BACKEND_MEMORY = 'memory'
+BACKEND_SQLITE = 'sqlite'
+
+
+class Rule:
+    """At most `limit` hits per `window` seconds for each key returned by `key_func()`
+
+    `key_func` runs in the request context and returns None when the rule does
+    not apply to the request (no email in the body...). A `failures_only` rule
+    is checked like the others, but only the hits reported by the endpoint
+    with RateLimiter.record_failure() count.
+    """
+
+    def __init__(self, name, limit, window, key_func, failures_only=False):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.key_func = key_func
+        self.failures_only = failures_only
+
+
+def _estimate(previous, current, window, now):
+    """Sliding-window count: the previous fixed window weighted by its overlap with the last `window` seconds"""
+    elapsed = now % window
+    return previous * (window - elapsed) / window + current
+
+
+class MemoryBackend:
+    """Counters of this process only (each worker process limits on its own)"""
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, key, window, now):
+        """[window index, current count, previous count, window] of a key, moved to the current window"""
+        current_window = int(now // window)
+        counter = self._counters.get(key)
+        if counter is None or counter[0] < current_window - 1:
+            return [current_window, 0, 0, window]
+        if counter[0] == current_window - 1:
+            return [current_window, 0, counter[1], window]
+        return counter
+
+    def hit(self, key, window, now):
+        """Count one hit and return the sliding-window count, this hit included"""
+        with self._lock:
+            counter = self._counter(key, window, now)
+            counter[1] += 1
+            self._counters[key] = counter
+            if len(self._counters) > self.MAX_KEYS:
+                self._purge(now)
+            return _estimate(counter[2], counter[1], window, now)
+
+    def peek(self, key, window, now):
+        """Sliding-window count, without counting a hit"""
+        with self._lock:
+            counter = self._counter(key, window, now)
+        return _estimate(counter[2], counter[1], window, now)
+
+    def _purge(self, now):
+        # Drop the keys whose count no longer matters: idle for two of their own windows
+        for key in [k for k, c in self._counters.items() if (c[0] + 2) * c[3] <= now]:
+            del self._counters[key]
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class SQLiteBackend:
+    """Counters in a small SQLite file shared by the worker processes of a host
+
+    Kept apart from the application database so that throttled traffic never
+    touches it. One connection per thread (and per process after a fork).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limit_hits (
+                    key TEXT NOT NULL,
+                    window INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (key, window)
+                ) WITHOUT ROWID
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, window, now):
+        """Count one hit and return the sliding-window count, this hit included"""
+        current_window = int(now // window)
+        conn = self._connection()
+        current = conn.execute('''
+            INSERT INTO rate_limit_hits (key, window, count) VALUES (?, ?, 1)
+            ON CONFLICT(key, window) DO UPDATE SET count = count + 1
+            RETURNING count
+        ''', (key, current_window)).fetchone()[0]
+        previous = conn.execute('SELECT count FROM rate_limit_hits WHERE key=? AND window=?',
+                                (key, current_window - 1)).fetchone()
+        if random.random() < 0.001:
+            conn.execute('DELETE FROM rate_limit_hits WHERE window < ?', (current_window - 1,))
+        return _estimate(previous[0] if previous else 0, current, window, now)
+
+    def peek(self, key, window, now):
+        """Sliding-window count, without counting a hit"""
+        current_window = int(now // window)
+        counts = dict(self._connection().execute(
+            'SELECT window, count FROM rate_limit_hits WHERE key=? AND window IN (?, ?)',
+            (key, current_window - 1, current_window)
+        ).fetchall())
+        return _estimate(counts.get(current_window - 1, 0), counts.get(current_window, 0), window, now)
+
+    def reset(self):
+        self._connection().execute('DELETE FROM rate_limit_hits')
+
+
+def create_backend(name, path=None):
+    if name == BACKEND_MEMORY:
+        return MemoryBackend()
+    if name == BACKEND_SQLITE:
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+class RateLimiter:
+    """Applies rules to the requests of decorated endpoints
+
+    The check runs before the endpoint (and before the decorators listed below
+    @limiter.limit), so rejected requests cost no application database work.
+    Keys are prefixed with the rule name; windows are aligned on the epoch, so
+    the windows of two rules with different durations never share a key.
+    Limiting fails open: a backend error is logged and the request allowed.
+    """
+
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+
+    def check(self, rules):
+        """Count the request against `rules`
+
+        Returns:
+            (allowed, retry_after seconds)
+        """
+        if not self.enabled:
+            return True, 0
+        now = time.time()
+        for rule in rules:
+            key = rule.key_func()
+            if key is None:
+                continue
+            try:
+                if rule.failures_only:
+                    # This request is not counted (yet): rejected once the limit is reached
+                    exceeded = self.backend.peek(self._key(rule, key), rule.window, now) >= rule.limit
+                else:
+                    exceeded = self.backend.hit(self._key(rule, key), rule.window, now) > rule.limit
+            except Exception as e:
+                print(f"[Rate Limit] Backend error, {rule.name} not applied: {e}")
+                continue
+            if exceeded:
+                print(f"[Rate Limit] {rule.name} exceeded for {key} ({request.path})")
+                return False, int(rule.window - now % rule.window) + 1
+        return True, 0
+
+    def record_failure(self, *rules):
+        """Count a failed attempt (wrong code...) against `failures_only` rules"""
+        if not self.enabled:
+            return
+        now = time.time()
+        for rule in rules:
+            key = rule.key_func()
+            if key is None:
+                continue
+            try:
+                self.backend.hit(self._key(rule, key), rule.window, now)
+            except Exception as e:
+                print(f"[Rate Limit] Backend error, failure not counted for {rule.name}: {e}")
+
+    @staticmethod
+    def _key(rule, key):
+        return f"{rule.name}:{rule.window}:{key}"
+
+    def limit(self, *rules, methods=None, on_reject=None):
+        """Decorator applying `rules` (to the given HTTP methods only, if set)
+
+        `on_reject(retry_after)` builds the response of a rejected request,
+        JSON 429 by default.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if methods is None or request.method in methods:
+                    allowed, retry_after = self.check(rules)
+                    if not allowed:
+                        response = (on_reject or too_many_requests)(retry_after)
+                        response.headers['Retry-After'] = str(retry_after)
+                        return response
+                return f(*args, **kwargs)
+            return decorated
+        return decorator
+
+
+def too_many_requests(retry_after):
+    response = jsonify({'error': f'Trop de tentatives, réessayez dans {retry_after} secondes'})
+    response.status_code = 429
+    return response
+
+
+# ---- Keys ----
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def json_field(name, transform=None):
+    """Key function: a field of the JSON body (None when absent)"""
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+        if not isinstance(value, str) or not value.strip():
+            return None
+        value = value.strip()
+        return transform(value) if transform else value
+    return key
+
+
+def bearer_token():
+    """The caller's mobile session token (no database lookup)"""
+    auth_header = request.headers.get('Authorization', '')
+    return auth_header[7:27] if auth_header.startswith('Bearer ') else None
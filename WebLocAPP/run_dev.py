@@ -4,7 +4,7 @@ Script de lancement - Mode DEVELOPPEMENT
 Port: 6001
 """
 
-from app import app
+from app import create_app
 from config_dev import config
 
 if __name__ == '__main__':
@@ -14,7 +14,7 @@ if __name__ == '__main__':
     print("  Debug: ON")
     print("=" * 50)
 
-    app.config['TEMPLATES_AUTO_RELOAD'] = config.TEMPLATES_AUTO_RELOAD
+    app = create_app({'TEMPLATES_AUTO_RELOAD': config.TEMPLATES_AUTO_RELOAD})
 
     app.run(
         debug=config.DEBUG,
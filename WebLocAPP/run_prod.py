@@ -2,20 +2,33 @@
 """
 Script de lancement - Mode PRODUCTION
 Port: 5001
+
+Lance Gunicorn (plusieurs processus, plusieurs threads) avec gunicorn.conf.py.
+Équivalent à : gunicorn -c gunicorn.conf.py wsgi:application
 """
 
-from app import app
+import os
+import sys
+
 from config_prod import config
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 if __name__ == '__main__':
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        print("Gunicorn n'est pas installé : pip install -r requirements.txt")
+        sys.exit(1)
+
+    os.chdir(BASE_DIR)
+    os.environ.setdefault('LOCAPP_BIND', f"{config.HOST}:{config.PORT}")
+
     print("=" * 50)
-    print("  LocApp - Mode PRODUCTION")
+    print("  LocApp - Mode PRODUCTION (Gunicorn)")
     print(f"  URL: http://localhost:{config.PORT}")
     print("  Debug: OFF")
     print("=" * 50)
 
-    app.run(
-        debug=config.DEBUG,
-        host=config.HOST,
-        port=config.PORT
-    )
+    sys.argv = ['gunicorn', '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'), 'wsgi:application']
+    run()
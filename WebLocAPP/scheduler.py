@@ -0,0 +1,141 @@
+"""
+Scheduler Module for LocApp
+Periodic background jobs (reservation expiry...), run in a thread of each
+worker process; a lease in the job_locks table makes one process run each job
+"""
+
+import os
+import time
+import random
+import socket
+import threading
+
+# Seconds before the first run, so jobs don't compete with worker boot
+INITIAL_DELAY = float(os.environ.get('SCHEDULER_INITIAL_DELAY', 10))
+
+
+class _Job:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0
+        self.runs = 0
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self.last_duration_ms = None
+
+    def status(self):
+        return {
+            'name': self.name,
+            'interval_s': self.interval,
+            'runs': self.runs,
+            'last_run': self.last_run,
+            'last_duration_ms': self.last_duration_ms,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    """Runs registered jobs every `interval` seconds in a daemon thread
+
+    Every worker process starts its own thread (start() is a no-op when the
+    thread already runs in this process). Before a run, the process takes the
+    job's lease in the database for two intervals; the holder renews it at each
+    run, so the other processes skip the job until the holder stops or dies.
+    """
+
+    def __init__(self, db, enabled=True):
+        self.db = db
+        self.enabled = enabled
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def holder(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def add_job(self, name, interval, func):
+        """Register `func()` to run every `interval` seconds; its return value is kept as last_result"""
+        with self._lock:
+            self._jobs[name] = _Job(name, interval, func)
+
+    def start(self):
+        """Start the scheduler thread of this process (once per process)"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            first_run = time.monotonic() + INITIAL_DELAY
+            for job in self._jobs.values():
+                # Spread the processes' attempts over the first interval
+                job.next_run = first_run + random.uniform(0, min(job.interval, 60))
+            self._thread = threading.Thread(target=self._loop, name='locapp-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread and give up the leases held by this process"""
+        if self._pid != os.getpid():
+            return
+        self._pid = None
+        self._wakeup.set()
+        for name in list(self._jobs):
+            try:
+                self.db.release_job_lock(name, self.holder)
+            except Exception as e:
+                print(f"[Scheduler] Error releasing {name}: {e}")
+
+    def _loop(self):
+        wakeup = self._wakeup
+        while not wakeup.is_set():
+            now = time.monotonic()
+            for job in list(self._jobs.values()):
+                if job.next_run <= now:
+                    job.next_run = now + job.interval
+                    if self._take_lease(job):
+                        self._run(job)
+            next_run = min((job.next_run for job in self._jobs.values()), default=now + 60)
+            wakeup.wait(max(1.0, next_run - time.monotonic()))
+
+    def _take_lease(self, job):
+        try:
+            return self.db.acquire_job_lock(job.name, self.holder, job.interval * 2)
+        except Exception as e:
+            print(f"[Scheduler] Cannot take the lease of {job.name}: {e}")
+            return False
+
+    def _run(self, job):
+        start = time.perf_counter()
+        try:
+            job.last_result = job.func()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"[Scheduler] Job {job.name} failed: {e}")
+        job.runs += 1
+        job.last_run = time.time()
+        job.last_duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        return job.last_result
+
+    def run_now(self, name):
+        """Run a job immediately in the calling thread (superadmin), whatever the lease
+
+        Returns:
+            The job's status, None if there is no such job
+        """
+        job = self._jobs.get(name)
+        if job is None:
+            return None
+        self._run(job)
+        return job.status()
+
+    def status(self):
+        return [job.status() for job in self._jobs.values()]
@@ -0,0 +1,271 @@
+"""
+SQL Console Module for LocApp
+Read-only queries of the SuperAdmin console: a separate read-only connection
+that only authorizes reads, a time budget enforced by a progress handler, row
+caps with paging, and NDJSON / CSV exports streamed in chunks
+"""
+
+import os
+import csv
+import io
+import json
+import time
+import base64
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Seconds of SQLite work allowed to a console page / to an export
+QUERY_TIME_BUDGET = float(os.environ.get('SQL_CONSOLE_TIME_BUDGET', 5))
+EXPORT_TIME_BUDGET = float(os.environ.get('SQL_CONSOLE_EXPORT_TIME_BUDGET', 60))
+
+# Rows of a console page (default, max) and of an export (max)
+DEFAULT_PAGE_ROWS = 100
+MAX_PAGE_ROWS = 1000
+MAX_EXPORT_ROWS = int(os.environ.get('SQL_CONSOLE_EXPORT_MAX_ROWS', 100000))
+
+# The progress handler runs every this many SQLite VM instructions
+PROGRESS_STEPS = 10000
+
+# Rows fetched (and sent) per export chunk
+EXPORT_CHUNK_ROWS = 500
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+
+# Authorizer: what a console query may do
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Pragma table-valued functions allowed (schema introspection: pragma_table_info('users'))
+_ALLOWED_PRAGMAS = {'table_info', 'table_xinfo', 'index_list', 'index_info', 'index_xinfo', 'foreign_key_list'}
+
+
+class QueryError(Exception):
+    """Query refused or failed; the message is shown in the console"""
+
+
+class _Budget:
+    """Time budget of a query, spent only while SQLite works (not while a client reads an export)"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.remaining = seconds
+        self._deadline = None
+
+    @contextmanager
+    def running(self):
+        start = time.monotonic()
+        self._deadline = start + self.remaining
+        try:
+            yield
+        finally:
+            self._deadline = None
+            self.remaining -= time.monotonic() - start
+
+    def exceeded(self):
+        """Progress handler: a non-zero result interrupts the statement"""
+        return 1 if self._deadline is not None and time.monotonic() > self._deadline else 0
+
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and (arg1 or '').lower() in _ALLOWED_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    # Reported by SQLite while it sets up a pragma function; the connection can't write anyway
+    if action == sqlite3.SQLITE_UPDATE and arg1 == 'sqlite_master':
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _normalize(query):
+    """The query without trailing semicolons; only SELECT / WITH / VALUES statements"""
+    query = (query or '').strip().rstrip(';').strip()
+    if not query:
+        raise QueryError('Entrez une requête')
+    if query.split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'VALUES'):
+        raise QueryError('Seules les requêtes SELECT sont autorisées')
+    return query
+
+
+def _error_message(error, budget):
+    message = str(error)
+    if isinstance(error, sqlite3.OperationalError) and message == 'interrupted':
+        return f"Temps d'exécution dépassé ({budget.seconds:g} s)"
+    if 'not authorized' in message:
+        return 'Requête non autorisée (lecture seule)'
+    if isinstance(error, (sqlite3.ProgrammingError, sqlite3.Warning)) and 'one statement' in message:
+        return 'Une seule requête à la fois'
+    return message
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return f'<blob {len(value)} octets>'
+    return value
+
+
+def unique_columns(columns):
+    """Column names made unique for JSON objects: a repeated name gets a suffix (id, id:1, id:2)"""
+    seen = set(columns)
+    counts = {}
+    names = []
+    for column in columns:
+        if column in counts:
+            while True:
+                counts[column] += 1
+                name = f'{column}:{counts[column]}'
+                if name not in seen:
+                    break
+            seen.add(name)
+            names.append(name)
+        else:
+            counts[column] = 0
+            names.append(column)
+    return names
+
+
+def encode_page_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_page_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise QueryError('Curseur invalide') from e
+    if offset < 0:
+        raise QueryError('Curseur invalide')
+    return offset
+
+
+class SQLConsole:
+    """Runs console queries on a read-only connection to the database file `db_path`
+
+    Each query gets its own connection: mode=ro and query_only refuse writes,
+    the authorizer refuses anything but reads (ATTACH, pragmas...), and the
+    progress handler interrupts the query once its time budget is spent.
+    Queries are wrapped as `SELECT * FROM (<query>) LIMIT ...` (the query on its
+    own lines, so a trailing line comment stays valid), so a page or an export
+    never holds more rows than its cap.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self, budget):
+        uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=5)
+        conn.execute('PRAGMA query_only = ON')
+        conn.set_authorizer(_authorize)
+        conn.set_progress_handler(budget.exceeded, PROGRESS_STEPS)
+        return conn
+
+    def run(self, query, limit=DEFAULT_PAGE_ROWS, cursor=None):
+        """One page of the query's rows
+
+        Args:
+            cursor: 'next_cursor' of the previous page of the same query
+
+        Returns:
+            {'columns', 'rows' (lists of values), 'count', 'next_cursor', 'duration_ms'}
+
+        Raises:
+            QueryError: refused query, SQL error or time budget exceeded
+        """
+        query = _normalize(query)
+        limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+        offset = decode_page_cursor(cursor)
+        budget = _Budget(QUERY_TIME_BUDGET)
+        start = time.perf_counter()
+        conn = self._connect(budget)
+        try:
+            with budget.running():
+                result = conn.execute(f'SELECT * FROM (\n{query}\n) LIMIT ? OFFSET ?', (limit + 1, offset))
+                rows = result.fetchall()
+            columns = [column[0] for column in result.description]
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise QueryError(_error_message(e, budget)) from e
+        finally:
+            conn.close()
+
+        return {
+            'columns': columns,
+            'rows': [[_json_value(value) for value in row] for row in rows[:limit]],
+            'count': min(len(rows), limit),
+            'next_cursor': encode_page_cursor(offset + limit) if len(rows) > limit else None,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def explain(self, query):
+        """EXPLAIN QUERY PLAN of the query: [{'id', 'parent', 'detail'}]"""
+        query = _normalize(query)
+        budget = _Budget(QUERY_TIME_BUDGET)
+        conn = self._connect(budget)
+        try:
+            with budget.running():
+                rows = conn.execute(f'EXPLAIN QUERY PLAN {query}').fetchall()
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            raise QueryError(_error_message(e, budget)) from e
+        finally:
+            conn.close()
+        return [{'id': row[0], 'parent': row[1], 'detail': row[3]} for row in rows]
+
+    def export(self, query, fmt=FORMAT_CSV):
+        """Stream all the query's rows (up to MAX_EXPORT_ROWS)
+
+        The query is started before returning, so refused queries and SQL
+        errors raise QueryError here; an error while streaming (time budget)
+        ends the output with an error line.
+
+        Returns:
+            Generator of text chunks (CSV with a header line, or one JSON object per
+            line, keyed by unique_columns)
+        """
+        if fmt not in (FORMAT_CSV, FORMAT_NDJSON):
+            raise QueryError(f'Format inconnu: {fmt}')
+        query = _normalize(query)
+        budget = _Budget(EXPORT_TIME_BUDGET)
+        conn = self._connect(budget)
+        try:
+            with budget.running():
+                result = conn.execute(f'SELECT * FROM (\n{query}\n) LIMIT ?', (MAX_EXPORT_ROWS,))
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            conn.close()
+            raise QueryError(_error_message(e, budget)) from e
+        columns = [column[0] for column in result.description]
+        keys = unique_columns(columns)
+
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            try:
+                if fmt == FORMAT_CSV:
+                    writer.writerow(columns)
+                while True:
+                    with budget.running():
+                        rows = result.fetchmany(EXPORT_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    for row in rows:
+                        if fmt == FORMAT_CSV:
+                            writer.writerow([_json_value(value) for value in row])
+                        else:
+                            buffer.write(json.dumps(dict(zip(keys, map(_json_value, row))),
+                                                    ensure_ascii=False, default=str) + '\n')
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            except (sqlite3.Error, sqlite3.Warning) as e:
+                message = _error_message(e, budget)
+                print(f"[SQL Console] Export interrupted: {message}")
+                if fmt == FORMAT_CSV:
+                    writer.writerow([f'# Erreur: {message}'])
+                else:
+                    buffer.write(json.dumps({'error': message}, ensure_ascii=False) + '\n')
+                yield buffer.getvalue()
+            finally:
+                conn.close()
+
+        return generate()
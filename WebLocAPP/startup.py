@@ -0,0 +1,81 @@
+"""
+Startup Module for LocApp
+Per-phase startup timing and subsystems created on first use, so a worker
+only pays (imports, migrations) for what it actually serves
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Duration of each startup phase, in the order they ran"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._phases.append((name, seconds))
+
+    def phases(self):
+        """List of {'phase', 'ms'} dicts"""
+        with self._lock:
+            return [{'phase': name, 'ms': round(seconds * 1000, 1)} for name, seconds in self._phases]
+
+    def report(self):
+        """Print the phases recorded so far on one line"""
+        phases = self.phases()
+        total = sum(phase['ms'] for phase in phases)
+        details = ', '.join(f"{phase['phase']} {phase['ms']:.1f} ms" for phase in phases)
+        print(f"[Startup] {total:.1f} ms ({details})")
+
+
+class Lazy:
+    """Subsystem built by `factory` on first use, then shared
+
+    Attribute access is forwarded to the built object, so a Lazy can stand in
+    for it (db.get_property(...)). The build time is recorded in `timer`.
+    """
+
+    def __init__(self, name, factory, timer=None):
+        self._name = name
+        self._factory = factory
+        self._timer = timer
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    if self._timer is not None:
+                        self._timer.record(self._name, time.perf_counter() - start)
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"<Lazy {self._name} ({'loaded' if self.loaded else 'not loaded'})>"
@@ -0,0 +1,169 @@
+"""
+Outbox sender against an in-process SMTP server
+"""
+
+import os
+import sys
+import threading
+import socketserver
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mailer as mailer_module
+from database import Database
+from mailer import Mailer
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: replies are taken from server.rcpt_replies by recipient"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 test ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 test')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipient = line.split(':', 1)[1].strip('<> ')
+                reply = self.server.rcpt_replies.get(recipient, '250 OK')
+                if reply.startswith('250'):
+                    recipients.append(recipient)
+                self.reply(reply)
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (data_line := self.rfile.readline().decode()) not in ('.\r\n', ''):
+                    data.append(data_line)
+                self.server.received.extend((recipient, ''.join(data)) for recipient in recipients)
+                self.reply('250 OK')
+            elif command == 'RSET' or command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.received = []
+        self.rcpt_replies = {}
+        self.connections = 0
+
+
+@pytest.fixture
+def smtp_server():
+    server = _SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return Database(str(tmp_path / 'locapp.db'))
+
+
+@pytest.fixture
+def mailer(db, smtp_server, monkeypatch):
+    monkeypatch.setattr(mailer_module, 'MAIL_SMTP_STARTTLS', False)
+    config = {
+        'smtp_server': '127.0.0.1',
+        'smtp_port': smtp_server.server_address[1],
+        'sender_email': 'noreply@locapp.test',
+        'sender_password': '',
+    }
+    sender = Mailer(db, config)
+    yield sender
+    sender._disconnect()
+
+
+def _statuses(db):
+    conn = db.get_connection()
+    rows = conn.execute('SELECT recipient, status, attempts, claimed_by FROM email_outbox ORDER BY id').fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+
+def test_sends_queued_messages_over_one_connection(db, mailer, smtp_server):
+    for n in range(5):
+        mailer.enqueue(f'guest{n}@example.com', f'Sujet {n}', f'Message {n}', 'notification')
+
+    assert mailer.send_due() == 5
+
+    assert sorted(recipient for recipient, _ in smtp_server.received) == [f'guest{n}@example.com' for n in range(5)]
+    assert 'Subject: Sujet 3' in dict(smtp_server.received)['guest3@example.com']
+    assert smtp_server.connections == 1
+    assert all(status == 'sent' and claimed_by is None for _, status, _, claimed_by in _statuses(db))
+    assert mailer.send_due() == 0
+
+
+def test_temporary_failure_is_retried_and_permanent_failure_is_not(db, mailer, smtp_server):
+    smtp_server.rcpt_replies = {
+        'busy@example.com': '451 Try again later',
+        'unknown@example.com': '550 No such user',
+    }
+    mailer.enqueue('busy@example.com', 'Sujet', 'Message', 'notification')
+    mailer.enqueue('unknown@example.com', 'Sujet', 'Message', 'notification')
+    mailer.enqueue('guest@example.com', 'Sujet', 'Message', 'notification')
+
+    assert mailer.send_due() == 3
+
+    assert [recipient for recipient, _ in smtp_server.received] == ['guest@example.com']
+    assert _statuses(db) == [
+        ('busy@example.com', 'pending', 1, None),
+        ('unknown@example.com', 'failed', 1, None),
+        ('guest@example.com', 'sent', 1, None),
+    ]
+    # Not due before its retry delay
+    assert mailer.send_due() == 0
+
+
+def test_message_claimed_by_another_sender_is_not_sent(db, mailer, smtp_server):
+    mailer.enqueue('guest@example.com', 'Sujet', 'Message', 'notification')
+    # Another process took the message over (our lease ended while we stalled)
+    claimed = db.claim_due_emails('other-host:1', 10, 60)
+    assert [message['recipient'] for message in claimed] == ['guest@example.com']
+
+    assert mailer.send_due() == 0
+    assert db.mark_email_sent(claimed[0]['id'], mailer.holder) is False
+    assert smtp_server.received == []
+    assert _statuses(db) == [('guest@example.com', 'sending', 0, 'other-host:1')]
+
+
+def test_claims_are_renewed_during_a_batch(db, mailer, smtp_server, monkeypatch):
+    for n in range(3):
+        mailer.enqueue(f'guest{n}@example.com', 'Sujet', 'Message', 'notification')
+    renewals = []
+    renew = db.renew_email_claims
+    monkeypatch.setattr(db, 'renew_email_claims', lambda holder, lease: renewals.append(lease) or renew(holder, lease))
+
+    assert mailer.send_due() == 3
+
+    assert len(renewals) == 3
+    assert len(smtp_server.received) == 3
+
+
+def test_lease_covers_a_message_whatever_the_timeout():
+    assert mailer_module.MAIL_CLAIM_SECONDS >= 10 * mailer_module.MAIL_SMTP_TIMEOUT
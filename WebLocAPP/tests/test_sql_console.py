@@ -0,0 +1,127 @@
+"""
+SuperAdmin SQL console: read-only connection, authorizer and time budget
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_console as sql_console_module
+from sql_console import SQLConsole, QueryError, FORMAT_NDJSON
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'console.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT);
+        CREATE TABLE properties (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT);
+        INSERT INTO users (id, email) VALUES (1, 'a@example.com'), (2, 'b@example.com');
+        INSERT INTO properties (id, user_id, name) VALUES (10, 1, 'Mazet'), (11, 2, 'Chalet');
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def console(db_path):
+    return SQLConsole(db_path)
+
+
+def _count_users(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_select_pages(console):
+    page = console.run('SELECT id, email FROM users ORDER BY id', limit=1)
+    assert page['columns'] == ['id', 'email']
+    assert page['rows'] == [[1, 'a@example.com']]
+    assert page['next_cursor']
+
+    page = console.run('SELECT id, email FROM users ORDER BY id', limit=1, cursor=page['next_cursor'])
+    assert page['rows'] == [[2, 'b@example.com']]
+    assert page['next_cursor'] is None
+
+
+def test_trailing_line_comment(console):
+    page = console.run('SELECT id FROM users ORDER BY id -- comment')
+    assert page['rows'] == [[1], [2]]
+    chunks = ''.join(console.export('SELECT id FROM users -- comment'))
+    assert chunks.splitlines()[0] == 'id'
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO users (email) VALUES ('c@example.com')",
+    'DELETE FROM users',
+    "UPDATE users SET email = ''",
+    'DROP TABLE users',
+    "ATTACH DATABASE ':memory:' AS other",
+    'PRAGMA writable_schema = ON',
+])
+def test_statements_other_than_select_are_refused(console, db_path, query):
+    with pytest.raises(QueryError):
+        console.run(query)
+    assert _count_users(db_path) == 2
+
+
+def test_write_in_a_cte_is_refused(console, db_path):
+    with pytest.raises(QueryError, match='non autorisée'):
+        console.explain('WITH doomed AS (SELECT 1) DELETE FROM users')
+    assert _count_users(db_path) == 2
+
+
+@pytest.mark.parametrize('statement', [
+    "INSERT INTO users (email) VALUES ('c@example.com')",
+    'DELETE FROM users',
+    'CREATE TABLE evil (x)',
+    "ATTACH DATABASE ':memory:' AS other",
+    'PRAGMA query_only = OFF',
+])
+def test_connection_refuses_writes_and_attach(console, db_path, statement):
+    conn = console._connect(sql_console_module._Budget(5))
+    try:
+        with pytest.raises(sqlite3.DatabaseError):
+            conn.execute(statement)
+    finally:
+        conn.close()
+    assert _count_users(db_path) == 2
+
+
+def test_load_extension_is_refused(console):
+    with pytest.raises(QueryError):
+        console.run("SELECT load_extension('/tmp/evil.so')")
+
+
+def test_pragma_functions(console):
+    page = console.run("SELECT name FROM pragma_table_info('users')")
+    assert [row[0] for row in page['rows']] == ['id', 'email']
+
+    for pragma in ('pragma_database_list', 'pragma_compile_options', "pragma_journal_mode"):
+        with pytest.raises(QueryError):
+            console.run(f'SELECT * FROM {pragma}')
+
+
+def test_runaway_recursive_cte_is_interrupted(console, monkeypatch):
+    monkeypatch.setattr(sql_console_module, 'QUERY_TIME_BUDGET', 0.2)
+    query = 'WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n'
+    with pytest.raises(QueryError, match="Temps d'exécution dépassé"):
+        console.run(query)
+
+
+def test_ndjson_export_keeps_duplicate_columns(console):
+    output = ''.join(console.export(
+        'SELECT * FROM users u JOIN properties p ON p.user_id = u.id ORDER BY u.id', FORMAT_NDJSON))
+    rows = [json.loads(line) for line in output.splitlines()]
+    assert rows[0] == {'id': 1, 'email': 'a@example.com', 'id:1': 10, 'user_id': 1, 'name': 'Mazet'}
+    assert len(rows) == 2
@@ -0,0 +1,354 @@
+"""
+Upload Stream Module for LocApp
+Streams uploaded images to disk with content sniffing, size limits and hashing,
+and keeps the state of resumable (chunked) uploads
+"""
+
+import os
+import io
+import re
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import Conflict, RequestEntityTooLarge, UnsupportedMediaType
+
+# Bytes needed to recognise every supported format
+SNIFF_LENGTH = 12
+
+DEFAULT_MAX_IMAGE_SIZE = 16 * 1024 * 1024
+
+# Resumable uploads not completed within this delay are discarded
+RESUMABLE_TTL_SECONDS = 24 * 3600
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def sniff_image_type(header):
+    """Detect an image format from its first bytes
+
+    Returns:
+        File extension ('jpg', 'png', 'gif', 'webp') or None if not a supported image
+    """
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if len(header) >= 12 and header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _rejected_type():
+    return UnsupportedMediaType('Type de fichier non autorisé. Utilisez PNG, JPG, GIF ou WebP')
+
+
+def _too_large(max_size):
+    return RequestEntityTooLarge(f"Fichier trop volumineux (maximum {max_size // (1024 * 1024)} Mo)")
+
+
+class StreamedUpload(io.RawIOBase):
+    """Temp file receiving one multipart file part
+
+    The first bytes are checked against the supported image signatures and the
+    size limit is enforced on every write, so an invalid upload is rejected
+    before the rest of the body is read. The SHA-256 is computed as data arrives,
+    letting the blob store take the file without reading it again (see claim()).
+
+    With strict=False (batch uploads), an invalid part does not abort the request:
+    its data is dropped and `error` holds the exception that would have been raised.
+    """
+
+    def __init__(self, directory, max_size, strict=True):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self.max_size = max_size
+        self.strict = strict
+        self.size = 0
+        self.image_type = None
+        self.error = None
+        self._digest = hashlib.sha256()
+        self._header = b''
+        self._claimed = False
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        if self.error is not None:
+            return len(data)
+        self.size += len(data)
+        if self.size > self.max_size:
+            return self._reject(_too_large(self.max_size), len(data))
+        if self.image_type is None:
+            self._header += data[:SNIFF_LENGTH]
+            if len(self._header) >= SNIFF_LENGTH and not self._check_type():
+                return len(data)
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _reject(self, error, written=0):
+        if self.strict:
+            raise error
+        self.error = error
+        self._file.truncate(0)
+        return written
+
+    def _check_type(self):
+        self.image_type = sniff_image_type(self._header[:SNIFF_LENGTH])
+        if self.image_type is None:
+            self._reject(_rejected_type())
+            return False
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # The form parser rewinds the file once the part is complete
+        if self.image_type is None and self.error is None:
+            self._check_type()
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def claim(self):
+        """Take ownership of the temp file (it is no longer deleted on close)
+
+        Returns:
+            Tuple (path, sha256, size)
+        """
+        self._file.close()
+        self._claimed = True
+        return self.path, self.sha256, self.size
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self._claimed and os.path.exists(self.path):
+            os.remove(self.path)
+        super().close()
+
+
+class StreamingRequest(Request):
+    """Request class streaming multipart file parts through StreamedUpload
+
+    Uses the UPLOAD_TMP_FOLDER and MAX_IMAGE_SIZE settings. Temp files not
+    claimed by the view are removed when the request is closed, including the
+    ones of a request rejected half-way through. Endpoints listed in
+    MAX_CONTENT_LENGTH_BY_ENDPOINT (e.g. batch uploads) get their own body limit,
+    and invalid files sent to LENIENT_UPLOAD_ENDPOINTS are flagged instead of
+    failing the whole request.
+    """
+
+    @property
+    def max_content_length(self):
+        limits = current_app.config.get('MAX_CONTENT_LENGTH_BY_ENDPOINT') or {}
+        if self.endpoint in limits:
+            return limits[self.endpoint]
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        stream = StreamedUpload(
+            config.get('UPLOAD_TMP_FOLDER') or tempfile.gettempdir(),
+            config.get('MAX_IMAGE_SIZE', DEFAULT_MAX_IMAGE_SIZE),
+            strict=self.endpoint not in config.get('LENIENT_UPLOAD_ENDPOINTS', ()),
+        )
+        self.__dict__.setdefault('_upload_streams', []).append(stream)
+        return stream
+
+    def close(self):
+        super().close()
+        for stream in self.__dict__.pop('_upload_streams', []):
+            stream.close()
+
+
+def uploaded_image(file):
+    """Temp file of an uploaded image streamed by StreamingRequest, or None"""
+    stream = getattr(file, 'stream', None)
+    return stream if isinstance(stream, StreamedUpload) else None
+
+
+def parse_content_range(value):
+    """Parse a "bytes start-end/total" Content-Range header
+
+    Returns:
+        Tuple (start, end, total) with end inclusive, or None if malformed
+    """
+    match = CONTENT_RANGE_RE.match(value or '')
+    if not match:
+        return None
+    start, end, total = (int(g) for g in match.groups())
+    if end < start or end >= total:
+        return None
+    return start, end, total
+
+
+class ResumableUploads:
+    """Chunked uploads that survive dropped connections
+
+    Each upload is a "<id>.part" file plus a "<id>.json" description in a
+    directory. The offset to resume from is the size of the part file, so a
+    client that lost its connection asks for it and sends the remaining bytes.
+    The content is sniffed as soon as the first bytes arrive. A chunk is written
+    under an exclusive lock of the part file: a concurrent chunk of the same
+    upload (retry while the first request still runs) is refused.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_IMAGE_SIZE, ttl=RESUMABLE_TTL_SECONDS):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def part_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def create(self, size, **meta):
+        """Start an upload of `size` bytes; extra keyword arguments are stored with it
+
+        Returns:
+            Upload description (dict with 'id', 'size', 'offset' and the metadata)
+        """
+        if size <= 0:
+            raise ValueError('Taille de fichier invalide')
+        if size > self.max_size:
+            raise _too_large(self.max_size)
+
+        self.purge_expired()
+        os.makedirs(self.directory, exist_ok=True)
+        upload = dict(meta, id=uuid.uuid4().hex, size=size, created_at=time.time())
+        open(self.part_path(upload['id']), 'wb').close()
+        with open(self._meta_path(upload['id']), 'w') as f:
+            json.dump(upload, f)
+        return dict(upload, offset=0)
+
+    def get(self, upload_id):
+        """Upload description with its current offset, or None if unknown or expired"""
+        if not UPLOAD_ID_RE.match(upload_id or ''):
+            return None
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                upload = json.load(f)
+            upload['offset'] = os.path.getsize(self.part_path(upload_id))
+        except (OSError, ValueError):
+            return None
+        if upload['created_at'] < time.time() - self.ttl:
+            self.discard(upload_id)
+            return None
+        return upload
+
+    def append(self, upload, start, stream, chunk_size=64 * 1024):
+        """Append a chunk read from `stream`, starting at byte `start`
+
+        Returns:
+            The new offset, or None if `start` does not match the current offset
+            (the client must resume from the offset returned by get())
+
+        Raises:
+            Conflict: another request is writing a chunk of this upload
+        """
+        path = self.part_path(upload['id'])
+        try:
+            # Not created again if the upload was completed or discarded meanwhile
+            f = os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND), 'ab')
+        except FileNotFoundError:
+            return None
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise Conflict('Un autre envoi de ce fichier est en cours')
+            offset = f.seek(0, os.SEEK_END)
+            if start != offset:
+                return None
+            # The signature is checked once, when the first bytes arrive
+            header = None
+            if offset < SNIFF_LENGTH:
+                with open(path, 'rb') as existing:
+                    header = existing.read(offset)
+            try:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    if offset + len(chunk) > upload['size']:
+                        raise _too_large(upload['size'])
+                    if header is not None and len(header) < SNIFF_LENGTH:
+                        header += chunk[:SNIFF_LENGTH]
+                        if (len(header) >= min(SNIFF_LENGTH, upload['size'])
+                                and sniff_image_type(header[:SNIFF_LENGTH]) is None):
+                            raise _rejected_type()
+                    f.write(chunk)
+                    offset += len(chunk)
+            except Exception:
+                # Keep only what was there before this chunk, the client resends it
+                f.truncate(start)
+                raise
+        return offset
+
+    def complete(self, upload):
+        """Finish an upload whose bytes were all received
+
+        Returns:
+            Tuple (path, image_type): the caller moves the part file away
+        """
+        path = self.part_path(upload['id'])
+        with open(path, 'rb') as f:
+            image_type = sniff_image_type(f.read(SNIFF_LENGTH))
+        if image_type is None:
+            self.discard(upload['id'])
+            raise _rejected_type()
+        if os.path.exists(self._meta_path(upload['id'])):
+            os.remove(self._meta_path(upload['id']))
+        return path, image_type
+
+    def discard(self, upload_id):
+        for path in (self.part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def purge_expired(self):
+        """Remove uploads older than the TTL
+
+        Returns:
+            Number of uploads removed
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith(('.json', '.part')) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                if filename.endswith('.json'):
+                    removed += 1
+        return removed
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for LocApp (production)
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+With preloading (LOCAPP_PRELOAD, on by default), the database migrations and
+the heavy imports run once in the Gunicorn master, before the workers fork.
+"""
+
+import os
+
+from app import create_app
+
+application = create_app({
+    'PRELOAD_SUBSYSTEMS': os.environ.get('LOCAPP_PRELOAD', '1').lower() in ('1', 'true', 'yes'),
+})